@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import argparse
+import logging
 
 try:
     from functools import cached_property
@@ -9,6 +10,18 @@ except ImportError:
 
 import toml
 
+from auto_backup.backup_groups import BackupTaskGrouper
+from auto_backup.bandwidth import BandwidthLimiter
+from auto_backup.borg_verify import BorgVerifyCommand
+from auto_backup.cache_prewarm import BorgCachePrewarmer
+from auto_backup.compression_bench import (
+    CompressionBenchmark,
+    CompressionProfiles,
+    SourceSampler,
+    format_benchmark_report,
+    missing_codec_packages,
+    recommend,
+)
 from auto_backup.config import (
     ConfigValueInjector,
     MergingTaskFactory,
@@ -16,15 +29,35 @@ from auto_backup.config import (
     TaskFactory,
     TaskList,
 )
+from auto_backup.durations import parse_duration
+from auto_backup.history import RunHistory
 from auto_backup.notifications import NotificationFormat, Notifications
+from auto_backup.outcomes import RunOutcomes
+from auto_backup.passwords import PasswordResolver
+from auto_backup.planning import ExecutionPlan, format_plan
+from auto_backup.prescan import SourcePrescan
+from auto_backup.profiles import BackupProfiles
+from auto_backup.rclone_rc import RcloneDaemons
+from auto_backup.rclone_verify import RcloneVerifyCommand
+from auto_backup.restore_test import RestoreTestCommand
+from auto_backup.run_lock import RunLock
+from auto_backup.runner import TaskRunner
+from auto_backup.scheduling import BackupWindow, TaskOrdering
+from auto_backup.sizes import parse_size
+from auto_backup.ssh import SshMultiplexer
+from auto_backup.state import DEFAULT_STATE_DIR, StateDirectory
+from auto_backup.structured_log import create_json_log_handler, new_run_id, set_run_id
 from auto_backup.tasks import (
     BackupCommand,
+    BorgEnvironments,
     CheckBackupsCommand,
+    CompactCommand,
     PruneBackupsCommand,
     RcloneCommand,
     Task,
     TestFailTask,
 )
+from auto_backup.watch import ChangeWatcher
 from auto_backup.xmpp_notifications import XMPPnotifications
 
 
@@ -35,15 +68,137 @@ class ProgramSetup(object):
         "backup": BackupCommand,
         "prune": PruneBackupsCommand,
         "check": CheckBackupsCommand,
+        "compact": CompactCommand,
+        "rclone_verify": RcloneVerifyCommand,
+        "verify": BorgVerifyCommand,
+        "restore_test": RestoreTestCommand,
     }
 
     NOTIFICATION_KEY = "XMPP"
+    GENERAL_KEY = "general"
+    LOGGING_KEY = "logging"
+    STATE_DIR_KEY = "state_dir"
+    PREWARM_KEY = "prewarm_caches"
+    PRESCAN_KEY = "prescan"
+    PRESCAN_WORKERS_KEY = "prescan_workers"
+    JOBS_KEY = "jobs"
+    ORDER_KEY = "order"
+    LOCK_KEY = "lock"
+    LOCK_TIMEOUT_KEY = "lock_timeout"
+    LOCK_PER_TAGS_KEY = "lock_per_tags"
+    WATCH_DEBOUNCE_KEY = "watch_debounce"
+    WATCH_MIN_INTERVAL_KEY = "watch_min_interval"
+    DEADLINE_KEY = "deadline"
+    BACKUP_WINDOW_KEY = "backup_window"
+    SSH_MULTIPLEXING_KEY = "ssh_multiplexing"
+    RCLONE_RCD_KEY = "rclone_rcd"
+    BANDWIDTH_KEY = "bandwidth"
+    ACCUMULATED_KEYS = ("excludes", "exclude_from", "exclude_if_present")
     COMMAND_TYPE_KEY = "type"
     TASKS_KEY = "tasks"
 
     def __init__(self, config):
         self.config = config
 
+    @cached_property
+    def general_config(self):
+        return self.config.get(self.GENERAL_KEY, {})
+
+    @cached_property
+    def state(self):
+        path = self.general_config.get(self.STATE_DIR_KEY, DEFAULT_STATE_DIR)
+        return StateDirectory(path)
+
+    @cached_property
+    def logging_config(self):
+        return self.config.get(self.LOGGING_KEY, {})
+
+    @cached_property
+    def json_log_handler(self):
+        path = self.logging_config.get("file")
+        if not path:
+            return None
+        max_bytes = parse_size(str(self.logging_config.get("max_size", "10MB")))
+        backup_count = self.logging_config.get("backup_count", 5)
+        return create_json_log_handler(path, int(max_bytes), backup_count)
+
+    @cached_property
+    def history(self):
+        return RunHistory(self.state)
+
+    @cached_property
+    def cache_prewarmer(self):
+        if not self.general_config.get(self.PREWARM_KEY, False):
+            return None
+        return BorgCachePrewarmer()
+
+    @cached_property
+    def prescan(self):
+        if not self.general_config.get(self.PRESCAN_KEY, False):
+            return None
+        workers = self.general_config.get(self.PRESCAN_WORKERS_KEY, 8)
+        return SourcePrescan(self.state, workers)
+
+    @cached_property
+    def ssh_multiplexer(self):
+        if not self.general_config.get(self.SSH_MULTIPLEXING_KEY, False):
+            return None
+        return SshMultiplexer()
+
+    @cached_property
+    def passwords(self):
+        return PasswordResolver()
+
+    @cached_property
+    def borg_environments(self):
+        return BorgEnvironments()
+
+    @cached_property
+    def rclone_daemons(self):
+        if not self.general_config.get(self.RCLONE_RCD_KEY, False):
+            return None
+        return RcloneDaemons(self.bandwidth_limiter)
+
+    @cached_property
+    def jobs(self):
+        jobs = self.general_config.get(self.JOBS_KEY, 1)
+        if isinstance(jobs, bool) or not isinstance(jobs, int) or jobs < 1:
+            raise ValueError("jobs must be a positive number")
+        return jobs
+
+    @cached_property
+    def task_ordering(self):
+        policy = self.general_config.get(self.ORDER_KEY, "file")
+        return TaskOrdering(policy, self.history, self.prescan)
+
+    @cached_property
+    def backup_window(self):
+        return self.create_backup_window()
+
+    def create_backup_window(self):
+        deadline = self.general_config.get(self.DEADLINE_KEY)
+        if not deadline:
+            return None
+        length = self.general_config.get(self.BACKUP_WINDOW_KEY, "12h")
+        return BackupWindow(deadline, length=length)
+
+    def create_task_runner(self, outcomes=None):
+        return TaskRunner(
+            self.jobs,
+            self.history,
+            self.create_backup_window(),
+            outcomes,
+            self.prescan,
+        )
+
+    @cached_property
+    def bandwidth_limiter(self):
+        if self.BANDWIDTH_KEY not in self.config:
+            return None
+        injector = ConfigValueInjector(BandwidthLimiter)
+        injector.provide_values(jobs=self.jobs)
+        return injector.build(self.config[self.BANDWIDTH_KEY])
+
     @cached_property
     def notify(self):
         formatter = NotificationFormat()
@@ -64,7 +219,19 @@ class ProgramSetup(object):
 
     def _create_value_injector(self, factory):
         injector = ConfigValueInjector(factory)
-        injector.provide_values(config=self.config, notify=self.notify)
+        injector.provide_values(
+            config=self.config,
+            notify=self.notify,
+            state=self.state,
+            cache_prewarmer=self.cache_prewarmer,
+            bandwidth=self.bandwidth_limiter,
+            ssh_multiplexer=self.ssh_multiplexer,
+            passwords=self.passwords,
+            borg_environments=self.borg_environments,
+            rclone_daemons=self.rclone_daemons,
+            find_task=self.find_task,
+            log_json=self.logging_config.get("borg_log_json", False),
+        )
         return injector
 
     @cached_property
@@ -84,7 +251,7 @@ class ProgramSetup(object):
         return task_from_config
 
     def _task_config_merger(self):
-        config_merger = TaskConfigMerger(self.config)
+        config_merger = TaskConfigMerger(self.config, self.ACCUMULATED_KEYS)
 
         def merge_task_config_with_section_from_config(task_config):
             section = task_config[self.COMMAND_TYPE_KEY]
@@ -94,29 +261,254 @@ class ProgramSetup(object):
 
     @cached_property
     def task_list(self):
+        task_list = self._create_task_list()
+        task_list.order_tasks_with(self.task_ordering.order)
+        return task_list
+
+    def _create_task_list(self):
         tasks = self.config.get(self.TASKS_KEY, [])
-        return TaskList(self.task_factory.create, tasks)
+        task_list = TaskList(self.task_factory.create, tasks)
+        task_list.combine_tasks_with(BackupTaskGrouper().group)
+        return task_list
+
+    @cached_property
+    def backup_profiles(self):
+        return BackupProfiles.from_config(self.config)
+
+    def create_run_lock(self, tags):
+        per_tags = self.general_config.get(self.LOCK_PER_TAGS_KEY, False)
+        return RunLock(
+            self.state,
+            self.general_config.get(self.LOCK_KEY, "skip"),
+            self.general_config.get(self.LOCK_TIMEOUT_KEY, "1h"),
+            tags if per_tags else None,
+        )
 
+    def create_run_outcomes(self, tags):
+        return RunOutcomes(self.state, tags)
 
-def execute_tasks(task_list, tags):
+    def create_change_watcher(self, tasks):
+        debounce = self.general_config.get(self.WATCH_DEBOUNCE_KEY, "10s")
+        min_interval = self.general_config.get(self.WATCH_MIN_INTERVAL_KEY, "5m")
+        return ChangeWatcher(
+            tasks,
+            parse_duration(debounce).total_seconds(),
+            parse_duration(min_interval).total_seconds(),
+        )
+
+    def validate(self):
+        self.jobs
+        self.create_run_lock(None)
+        self.task_ordering
+        self.backup_window
+        self.backup_profiles
+        self.bandwidth_limiter
+        self.json_log_handler
+        self._validate_watched_tasks(self._create_task_list())
+
+    def _validate_watched_tasks(self, task_list):
+        for task in task_list:
+            commands = getattr(task.command, "commands", [task.command])
+            if task.watch and not all(isinstance(c, BackupCommand) for c in commands):
+                raise ValueError(
+                    f"Task '{task}' can't be watched, watch = true is only "
+                    "supported for backup tasks"
+                )
+
+    def start_logging(self):
+        set_run_id(new_run_id())
+        if self.json_log_handler:
+            logging.getLogger().addHandler(self.json_log_handler)
+
+    def close(self):
+        if self.rclone_daemons:
+            self.rclone_daemons.shutdown()
+        if self.ssh_multiplexer:
+            self.ssh_multiplexer.shutdown()
+
+    def find_task(self, name):
+        for task_config in self.config.get(self.TASKS_KEY, []):
+            if task_config.get("name") == name:
+                return self.task_factory.create(task_config)
+        raise KeyError(f"No task named '{name}'")
+
+
+def execute_tasks(task_list, tags, cache_prewarmer=None, runner=None, prescan=None):
     if tags:
         task_list.filter_by_tags(tags)
 
-    for task in task_list:
-        task.safe_execute()
+    tasks = list(task_list)
+    if prescan:
+        prescan.run(tasks)
+    if cache_prewarmer:
+        cache_prewarmer.start(tasks)
 
+    try:
+        (runner or TaskRunner()).run(tasks)
+    finally:
+        if cache_prewarmer:
+            cache_prewarmer.shutdown()
 
-def main():
+
+def plan_tasks(task_list, tags, history, jobs=1, backup_window=None):
+    if tags:
+        task_list.filter_by_tags(tags)
+
+    plan = ExecutionPlan(list(task_list), history, jobs, backup_window)
+    print(format_plan(plan))
+
+
+def watch_tasks(setup, tags):
+    if tags:
+        setup.task_list.filter_by_tags(tags)
+    tasks = [task for task in setup.task_list if task.watch]
+    if not tasks:
+        raise ValueError("No task to watch, set watch = true for backup tasks")
+
+    watcher = setup.create_change_watcher(tasks)
+    try:
+        for batch in watcher.batches():
+            _run_watched_tasks(setup, tags, watcher, batch)
+    finally:
+        watcher.close()
+
+
+def _run_watched_tasks(setup, tags, watcher, tasks):
+    run_lock = setup.create_run_lock(tags)
+    if not run_lock.acquire():
+        watcher.postpone(tasks)
+        return
+    try:
+        results = setup.create_task_runner().run(tasks)
+        executed = [task for task, result in zip(tasks, results) if result is not None]
+        watcher.mark_run(executed)
+        watcher.retry_later([task for task in tasks if task not in executed])
+    finally:
+        run_lock.release()
+
+
+def benchmark_compression(setup, task_name, uplink_mbit, min_throughput, persist):
+    source = _find_backup_source(setup, task_name)
+    blocks = SourceSampler(source).sample_blocks()
+    if not blocks:
+        raise ValueError(f"No readable data found in {source}")
+
+    uplink = uplink_mbit * 125000 if uplink_mbit else None
+    results = CompressionBenchmark().run(blocks)
+    recommendation = recommend(results, uplink, min_throughput * 1e6)
+    missing = missing_codec_packages()
+    print(
+        format_benchmark_report(
+            source, blocks, results, recommendation, uplink, missing
+        )
+    )
+
+    if persist:
+        CompressionProfiles(setup.state).save(source, recommendation.name)
+
+
+def _find_backup_source(setup, task_name):
+    try:
+        command = setup.find_task(task_name).command
+    except KeyError as error:
+        raise ValueError(error.args[0])
+    if not isinstance(command, BackupCommand):
+        raise ValueError(f"Task '{task_name}' is not a backup task")
+    return command.source
+
+
+def run_tasks(setup, tags, selection=None):
+    setup.start_logging()
+    run_lock = setup.create_run_lock(tags)
+    if not run_lock.acquire():
+        return
+    try:
+        outcomes = setup.create_run_outcomes(tags)
+        if selection:
+            setup.task_list.select_by_names(outcomes.select(selection))
+        runner = setup.create_task_runner(outcomes)
+        execute_tasks(
+            setup.task_list, tags, setup.cache_prewarmer, runner, setup.prescan
+        )
+    finally:
+        setup.close()
+        run_lock.release()
+
+
+def run_watch_mode(setup, tags):
+    setup.start_logging()
+    try:
+        watch_tasks(setup, tags)
+    finally:
+        setup.close()
+
+
+def run_benchmark_mode(parser, setup, args):
+    try:
+        benchmark_compression(
+            setup,
+            args.bench_compression,
+            args.uplink,
+            args.min_throughput,
+            args.persist,
+        )
+    except ValueError as error:
+        parser.error(str(error))
+
+
+def create_argument_parser():
     parser = argparse.ArgumentParser(description="Execute backup tasks")
     parser.add_argument("--tag", dest="tags", action="append")
+    parser.add_argument("--bench-compression", metavar="TASK")
+    parser.add_argument("--uplink", metavar="MBIT", type=float)
+    parser.add_argument("--min-throughput", metavar="MB/S", type=float, default=50)
+    parser.add_argument("--persist", action="store_true")
+    parser.add_argument("--jobs", type=int)
+    parser.add_argument("--plan", action="store_true")
+    parser.add_argument("--watch", action="store_true")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument(
+        "--rerun-failed", dest="selection", action="store_const", const="failed"
+    )
+    selection.add_argument(
+        "--resume", dest="selection", action="store_const", const="unfinished"
+    )
     parser.add_argument("config", nargs=1)
+    return parser
+
 
+def main():
+    parser = create_argument_parser()
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
     config = toml.load(args.config)
-    task_list = ProgramSetup(config).task_list
+    if args.jobs is not None:
+        config.setdefault(ProgramSetup.GENERAL_KEY, {})["jobs"] = args.jobs
+    setup = ProgramSetup(config)
 
-    execute_tasks(task_list, args.tags)
+    try:
+        setup.validate()
+    except (KeyError, ValueError) as error:
+        parser.error(f"Invalid configuration: {error}")
+
+    if args.bench_compression:
+        run_benchmark_mode(parser, setup, args)
+    elif args.plan:
+        plan_tasks(
+            setup.task_list,
+            args.tags,
+            setup.history,
+            setup.jobs,
+            setup.backup_window,
+        )
+    elif args.watch:
+        try:
+            run_watch_mode(setup, args.tags)
+        except (RuntimeError, ValueError) as error:
+            parser.error(str(error))
+    else:
+        run_tasks(setup, args.tags, args.selection)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import contextlib
+import itertools
+import json
+import os
+import time
+
+from auto_backup.json_stream import JsonStreamReader
+
+ARCHIVE_KEYS = ("name", "id", "start")
+RECENT_ARCHIVES = 20
+FULL_LIST_EVERY = 7 * 24 * 3600
+
+
+class BorgArchiveList(object):
+    def __init__(self, url, env, stream_subprocess, timeout=None):
+        self.url = url
+        self.env = env
+        self.stream_subprocess = stream_subprocess
+        self.timeout = timeout
+
+    def for_each_archive(self, handler):
+        self._list(("borg", "list", "--json", self.url), handler)
+
+    def recent_archives(self, count):
+        archives = []
+        args = ("borg", "list", "--json", "--last", str(count), self.url)
+        members = self._list(args, archives.append)
+        return members["repository"]["last_modified"], archives
+
+    def _list(self, args, handler):
+        with self.stream_subprocess(args, env=self.env, timeout=self.timeout) as output:
+            return JsonStreamReader(output).read_object({"archives": handler})
+
+
+class ArchiveCache(object):
+    def __init__(self, state, repository_name):
+        self.state = state
+        self.file_name = os.path.join("archives", f"{repository_name}.jsonl")
+
+    def is_current(self, last_modified):
+        return self._read_header().get("last_modified") == last_modified
+
+    def listed_at(self):
+        return self._read_header().get("listed")
+
+    def _read_header(self):
+        if not self.state.exists(self.file_name):
+            return {}
+        with self.state.open_for_reading(self.file_name) as cache_file:
+            return json.loads(cache_file.readline() or "{}")
+
+    def for_each_archive(self, handler, limit=None):
+        with self.state.open_for_reading(self.file_name) as cache_file:
+            cache_file.readline()
+            for line in itertools.islice(cache_file, limit):
+                handler(json.loads(line))
+
+    def position_of(self, archive_id):
+        if not self.state.exists(self.file_name):
+            return None
+        with self.state.open_for_reading(self.file_name) as cache_file:
+            cache_file.readline()
+            for position, line in enumerate(cache_file):
+                if json.loads(line).get("id") == archive_id:
+                    return position
+        return None
+
+    def invalidate(self):
+        self.state.remove(self.file_name)
+
+    @contextlib.contextmanager
+    def writer(self, last_modified, listed):
+        header = {"last_modified": last_modified, "listed": listed}
+        with self.state.open_for_writing(self.file_name) as cache_file:
+            self._write_record(cache_file, header)
+            yield lambda archive: self._write_archive(cache_file, archive)
+
+    def _write_archive(self, cache_file, archive):
+        record = {key: archive.get(key) for key in ARCHIVE_KEYS}
+        self._write_record(cache_file, record)
+        return record
+
+    def _write_record(self, cache_file, record):
+        cache_file.write(json.dumps(record))
+        cache_file.write("\n")
+
+
+class CachedArchiveList(object):
+    def __init__(
+        self,
+        archive_list,
+        cache,
+        recent=RECENT_ARCHIVES,
+        full_list_every=FULL_LIST_EVERY,
+        clock=time.time,
+    ):
+        self.archive_list = archive_list
+        self.cache = cache
+        self.recent = recent
+        self.full_list_every = full_list_every
+        self.clock = clock
+
+    def for_each_archive(self, handler):
+        last_modified, archives = self.archive_list.recent_archives(self.recent)
+        if self._is_full_listing_due():
+            self._refresh_cache(last_modified, handler)
+        elif self.cache.is_current(last_modified):
+            self.cache.for_each_archive(handler)
+        else:
+            self._update_cache(last_modified, archives, handler)
+
+    def _is_full_listing_due(self):
+        listed = self.cache.listed_at()
+        return listed is None or self.clock() - listed >= self.full_list_every
+
+    def _update_cache(self, last_modified, archives, handler):
+        older = self._count_older_archives(archives)
+        if older is None:
+            self._refresh_cache(last_modified, handler)
+        else:
+            self._merge_recent_archives(last_modified, older, archives, handler)
+
+    def _count_older_archives(self, archives):
+        if len(archives) < self.recent:
+            return 0
+        return self.cache.position_of(archives[0].get("id"))
+
+    def _refresh_cache(self, last_modified, handler):
+        with self.cache.writer(last_modified, self.clock()) as write:
+            self.archive_list.for_each_archive(lambda a: handler(write(a)))
+
+    def _merge_recent_archives(self, last_modified, older, archives, handler):
+        listed = self.cache.listed_at()
+        with self.cache.writer(last_modified, listed) as write:
+            if older:
+                self.cache.for_each_archive(lambda a: handler(write(a)), older)
+            for archive in archives:
+                handler(write(archive))
@@ -0,0 +1,134 @@
+import logging
+import os
+
+from auto_backup.patterns import PATTERN_STYLE
+from auto_backup.tasks import BackupCommand, Task
+
+logger = logging.getLogger(__name__)
+
+
+def scope_exclude_pattern(pattern, directory):
+    match = PATTERN_STYLE.match(pattern)
+    style, body = (match.group(0), pattern[match.end() :]) if match else ("", pattern)
+    if style == "re:":
+        return pattern
+    prefix = os.path.abspath(directory).strip("/")
+    return f"{style}{prefix}/{body}" if prefix else pattern
+
+
+class BackupTaskGrouper(object):
+    def group(self, tasks):
+        slots = []
+        groups = dict()
+        for task in tasks:
+            key = self._get_group_key(task)
+            if key is None:
+                slots.append(task)
+            elif key in groups:
+                groups[key].append(task)
+            else:
+                groups[key] = [task]
+                slots.append(groups[key])
+        return [self._create_group(s) if isinstance(s, list) else s for s in slots]
+
+    def _get_group_key(self, task):
+        command = getattr(task, "command", None)
+        if isinstance(command, BackupCommand) and command.group:
+            return command.group_key()
+        return None
+
+    def _create_group(self, tasks):
+        if len(tasks) == 1:
+            return tasks[0]
+        command = GroupedBackupCommand([t.command for t in tasks])
+        return TaskGroup(tasks, command)
+
+
+class GroupedBackupCommand(object):
+    def __init__(self, commands):
+        self.commands = commands
+        self.leader = commands[0]
+        self.failed_commands = []
+
+    @property
+    def group(self):
+        return self.leader.group
+
+    def cache_prewarm_target(self):
+        return self.leader.cache_prewarm_target()
+
+    def execute(self):
+        self.failed_commands = self._get_commands_with_missing_source()
+        included = [c for c in self.commands if c not in self.failed_commands]
+        try:
+            self._create_combined_archive(included)
+        except Exception:
+            self.failed_commands = list(self.commands)
+            raise
+        if self.failed_commands:
+            raise RuntimeError(f"Backup group '{self.group}' is incomplete")
+
+    def _get_commands_with_missing_source(self):
+        return [c for c in self.commands if not os.path.isdir(c.source)]
+
+    def _create_combined_archive(self, commands):
+        if not commands:
+            return
+        paths = [os.path.abspath(c.source) for c in commands]
+        excludes = self._merge_excludes(commands)
+        markers = self._merge_exclude_markers(commands)
+        archive = self.leader.create_archive(excludes, markers, paths, cwd="/")
+        for command in commands:
+            command.record_archive(archive)
+
+    def _merge_excludes(self, commands):
+        excludes = dict()
+        for command in commands:
+            for pattern in command.exclude_patterns():
+                excludes[scope_exclude_pattern(pattern, command.source)] = None
+        return list(excludes)
+
+    def _merge_exclude_markers(self, commands):
+        markers = dict()
+        for command in commands:
+            markers.update(dict.fromkeys(command.exclude_if_present))
+        return list(markers)
+
+
+class TaskGroup(Task):
+    def __init__(self, tasks, command):
+        tags = set().union(*(t.tags for t in tasks))
+        name = f"{command.group} ({', '.join(t.name for t in tasks)})"
+        priority = max(t.priority for t in tasks)
+        watch = any(t.watch for t in tasks)
+        super().__init__(name, tags, command, tasks[0].notify, priority, watch)
+        self.tasks = tasks
+
+    def safe_execute(self):
+        try:
+            self.command.execute()
+        except Exception:
+            logger.exception("Backup group %s failed", self.command.group)
+        return self._report_member_results()
+
+    def members(self):
+        return self.tasks
+
+    def failed_members(self):
+        return [self._task_for(c) for c in self.command.failed_commands]
+
+    def _report_member_results(self):
+        failed = self.failed_members()
+        for task in self.tasks:
+            self._report_member_result(task, task in failed)
+        return 1 if failed else 0
+
+    def _report_member_result(self, task, failed):
+        if failed:
+            logger.info("Backup of %s in group %s failed", task, self.command.group)
+            task.notify.task_failed(task)
+        else:
+            logger.info("Backup of %s in group %s succeeded", task, self.command.group)
+
+    def _task_for(self, command):
+        return self.tasks[self.command.commands.index(command)]
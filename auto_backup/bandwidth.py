@@ -0,0 +1,132 @@
+import re
+
+RATE_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([bkmgtp]?)$", re.IGNORECASE)
+RATE_FACTORS = {
+    "b": 1 / 1024,
+    "": 1,
+    "k": 1,
+    "m": 1024,
+    "g": 1024**2,
+    "t": 1024**3,
+    "p": 1024**4,
+}
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+MINUTES_PER_DAY = 24 * 60
+ENTRY_PATTERN = re.compile(r"^(?:([a-z]{3})-)?(\d{1,2}):(\d{2}),(.+)$", re.IGNORECASE)
+
+
+def parse_rate(text):
+    text = str(text).strip()
+    if text.lower() == "off":
+        return None
+    match = RATE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid bandwidth '{text}'")
+    return float(match.group(1)) * RATE_FACTORS[match.group(2).lower()]
+
+
+def format_rate(kib_per_second):
+    return f"{int(kib_per_second)}k"
+
+
+class BandwidthRate(object):
+    def __init__(self, text):
+        self.text = text
+        parts = str(text).split(":")
+        if len(parts) > 2:
+            raise ValueError(f"Invalid bandwidth '{text}'")
+        self.upload = parse_rate(parts[0])
+        self.download = parse_rate(parts[-1])
+
+    def clamped(self, cap):
+        upload = self._clamp(self.upload, cap)
+        download = self._clamp(self.download, cap)
+        if upload == download:
+            return BandwidthRate(format_rate(upload))
+        return BandwidthRate(f"{format_rate(upload)}:{format_rate(download)}")
+
+    def _clamp(self, rate, cap):
+        return cap if rate is None else min(rate, cap)
+
+
+class TimetableEntry(object):
+    def __init__(self, day, minute, rate, timed=True):
+        self.day = day
+        self.minute = minute
+        self.rate = rate
+        self.timed = timed
+
+    @classmethod
+    def parse(cls, text):
+        match = ENTRY_PATTERN.match(text)
+        if not match:
+            return cls(None, 0, BandwidthRate(text), timed=False)
+        day, hours, minutes, rate = match.groups()
+        if day is not None and day.lower() not in DAY_NAMES:
+            raise ValueError(f"Invalid day in bandwidth timetable entry '{text}'")
+        if int(hours) > 23 or int(minutes) > 59:
+            raise ValueError(f"Invalid time in bandwidth timetable entry '{text}'")
+        day = DAY_NAMES.index(day.lower()) if day else None
+        return cls(day, int(hours) * 60 + int(minutes), BandwidthRate(rate))
+
+    def weekly_minutes(self):
+        days = range(7) if self.day is None else (self.day,)
+        return [day * MINUTES_PER_DAY + self.minute for day in days]
+
+    def format(self, rate):
+        if not self.timed:
+            return rate.text
+        time = f"{self.minute // 60:02d}:{self.minute % 60:02d}"
+        day = "" if self.day is None else f"{DAY_NAMES[self.day].capitalize()}-"
+        return f"{day}{time},{rate.text}"
+
+
+class BandwidthTimetable(object):
+    def __init__(self, spec):
+        self.entries = [TimetableEntry.parse(e) for e in str(spec).split()]
+        if not self.entries:
+            raise ValueError("Empty bandwidth timetable")
+        self.schedule = sorted(
+            (minute, index)
+            for index, entry in enumerate(self.entries)
+            for minute in entry.weekly_minutes()
+        )
+
+    def rate_at(self, moment):
+        now = moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+        active = [index for minute, index in self.schedule if minute <= now]
+        index = active[-1] if active else self.schedule[-1][1]
+        return self.entries[index].rate
+
+    def format(self, cap=None):
+        return " ".join(self._format_entry(entry, cap) for entry in self.entries)
+
+    def _format_entry(self, entry, cap):
+        rate = entry.rate if cap is None else entry.rate.clamped(cap)
+        return entry.format(rate)
+
+
+class BandwidthLimiter(object):
+    def __init__(self, timetable=None, shared_cap=None, jobs=1):
+        self.timetable = BandwidthTimetable(timetable) if timetable else None
+        self.task_cap = self._split_shared_cap(shared_cap, jobs)
+
+    def _split_shared_cap(self, shared_cap, jobs):
+        if shared_cap is None:
+            return None
+        cap = parse_rate(shared_cap)
+        return None if cap is None else cap / max(1, jobs)
+
+    def rclone_bwlimit(self):
+        if self.timetable:
+            return self.timetable.format(self.task_cap)
+        if self.task_cap is not None:
+            return format_rate(self.task_cap)
+        return None
+
+    def borg_upload_ratelimit(self, moment):
+        limits = [self.task_cap]
+        if self.timetable:
+            limits.append(self.timetable.rate_at(moment).upload)
+        limits = [limit for limit in limits if limit is not None]
+        return max(1, int(min(limits))) if limits else None
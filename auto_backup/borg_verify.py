@@ -0,0 +1,132 @@
+import logging
+import os
+import subprocess
+import time
+
+from auto_backup.argument_assigner import assign_arguments_to_self
+from auto_backup.durations import format_duration, parse_duration
+from auto_backup.tasks import (
+    BorgSubprocessEnvironment,
+    repository_lock,
+    run_checked_subprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationProgress(object):
+    def __init__(self, state, repository_name):
+        self.state = state
+        self.file_name = os.path.join("verify", f"{repository_name}.json")
+        self.verified = self._load().get("verified", {})
+
+    def _load(self):
+        return self.state.load(self.file_name, {}) if self.state else {}
+
+    def due_archives(self, archives, period, now):
+        due = [a for a in archives if now - self.verified.get(a, 0) >= period]
+        return sorted(due, key=lambda archive: self.verified.get(archive, 0))
+
+    def mark_verified(self, archive, now):
+        self.verified[archive] = now
+        self._save()
+
+    def forget_missing(self, archives):
+        self.verified = {a: t for a, t in self.verified.items() if a in archives}
+        self._save()
+
+    def _save(self):
+        if self.state is not None:
+            self.state.save(self.file_name, {"verified": self.verified})
+
+
+class BorgVerifyCommand(object):
+    def __init__(
+        self,
+        repository,
+        config,
+        max_duration="1h",
+        verify_data=False,
+        data_budget="1h",
+        period="30d",
+        ssh_command=None,
+        ssh_multiplexer=None,
+        passwords=None,
+        borg_environments=None,
+        state=None,
+        run_subprocess=run_checked_subprocess,
+    ):
+        assign_arguments_to_self()
+
+        repoConf = config["repositories"][self.repository]
+        self.url = repoConf["url"]
+        self.subprocess_environment = BorgSubprocessEnvironment.for_repository(
+            repoConf, ssh_command, ssh_multiplexer, passwords, borg_environments
+        )
+        self.max_duration = int(parse_duration(max_duration).total_seconds())
+        self.data_budget = parse_duration(data_budget).total_seconds()
+        self.period = parse_duration(period).total_seconds()
+
+    def execute(self):
+        with repository_lock(self.url):
+            env = self.subprocess_environment.build()
+            self._check_repository(env)
+            if self.verify_data:
+                self._verify_archive_data(env)
+
+    def _check_repository(self, env):
+        started = time.monotonic()
+        args = ("borg", "--verbose", "check", "--repository-only")
+        args += ("--max-duration", str(self.max_duration), self.url)
+        self.run_subprocess(args, env=env)
+        duration = format_duration(time.monotonic() - started)
+        logger.info("Partial repository check of %s took %s", self.repository, duration)
+
+    def _verify_archive_data(self, env):
+        archives = self._list_archives(env)
+        progress = VerificationProgress(self.state, self.repository)
+        progress.forget_missing(archives)
+        due = progress.due_archives(archives, self.period, time.time())
+        verified = self._verify_due_archives(env, progress, due)
+        self._report_coverage(len(archives), len(due), verified)
+
+    def _list_archives(self, env):
+        args = ("borg", "list", "--short", self.url)
+        result = self.run_subprocess(
+            args, env=env, stdout=subprocess.PIPE, universal_newlines=True
+        )
+        return [line for line in result.stdout.splitlines() if line]
+
+    def _verify_due_archives(self, env, progress, archives):
+        deadline = time.monotonic() + self.data_budget
+        verified = 0
+        for archive in archives:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.info("Data verification stopped at time budget")
+                break
+            if not self._verify_archive(env, archive, remaining):
+                break
+            progress.mark_verified(archive, time.time())
+            verified += 1
+        return verified
+
+    def _verify_archive(self, env, archive, timeout):
+        args = ("borg", "--verbose", "check", "--archives-only", "--verify-data")
+        args += (f"{self.url}::{archive}",)
+        try:
+            self.run_subprocess(args, env=env, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.info("Data verification of %s stopped at time budget", archive)
+            return False
+        return True
+
+    def _report_coverage(self, total, due, verified):
+        logger.info(
+            "Verified data of %d archive(s) of %s, %d of %d not verified within %s",
+            verified,
+            self.repository,
+            due - verified,
+            total,
+            format_duration(self.period),
+        )
@@ -0,0 +1,54 @@
+import logging
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auto_backup.tasks import repository_lock, run_checked_subprocess
+
+logger = logging.getLogger(__name__)
+
+
+class BorgCachePrewarmer(object):
+    def __init__(self, max_workers=4, run_subprocess=run_checked_subprocess):
+        self.max_workers = max_workers
+        self.run_subprocess = run_subprocess
+        self.executor = None
+        self.futures = dict()
+
+    def start(self, tasks):
+        targets = self._collect_targets(tasks)
+        if not targets:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        for url, environment in targets.items():
+            self.futures[url] = self.executor.submit(self._prewarm, url, environment)
+
+    def _collect_targets(self, tasks):
+        targets = dict()
+        for task in tasks:
+            get_target = getattr(task.command, "cache_prewarm_target", None)
+            if get_target:
+                url, environment = get_target()
+                targets.setdefault(url, environment)
+        return targets
+
+    def _prewarm(self, url, environment):
+        started = time.monotonic()
+        try:
+            args = ("borg", "info", url)
+            env = environment.build()
+            with repository_lock(url):
+                self.run_subprocess(args, env=env, stdout=subprocess.DEVNULL)
+            duration = time.monotonic() - started
+            logger.info("Borg cache of %s prepared in %.1fs", url, duration)
+        except Exception as error:
+            logger.warning("Preparing borg cache of %s failed: %s", url, error)
+
+    def wait_for(self, url):
+        future = self.futures.get(url)
+        if future:
+            future.result()
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
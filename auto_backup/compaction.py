@@ -0,0 +1,52 @@
+import os
+import re
+
+from auto_backup.sizes import parse_size
+
+FREED_PATTERN = re.compile(r"compaction freed about (-?[\d.]+ [kMGTPE]?B)")
+STATS_SIZE = r"\s+(-?[\d.]+ [kMGTPE]?B)"
+DELETED_PATTERN = re.compile(r"^Deleted data:" + 3 * STATS_SIZE, re.MULTILINE)
+ALL_ARCHIVES_PATTERN = re.compile(r"^All archives:" + 3 * STATS_SIZE, re.MULTILINE)
+
+
+def parse_compaction_freed_bytes(borg_output):
+    matches = FREED_PATTERN.findall(borg_output or "")
+    return parse_size(matches[-1]) if matches else None
+
+
+def parse_prune_stats(borg_output):
+    deleted = DELETED_PATTERN.search(borg_output or "")
+    total = ALL_ARCHIVES_PATTERN.search(borg_output or "")
+    if not deleted or not total:
+        return None
+    return abs(parse_size(deleted.group(3))), parse_size(total.group(3))
+
+
+class CompactionTracker(object):
+    def __init__(self, state, repository_name, threshold):
+        self.state = state
+        self.threshold = threshold
+        self.file_name = os.path.join("compaction", f"{repository_name}.json")
+        self.pending_bytes = 0
+
+    def record_freed(self, freed_bytes, repository_size):
+        self.pending_bytes = self._load_pending_bytes() + max(0, freed_bytes)
+        self._save_pending_bytes(self.pending_bytes)
+        self.ratio = self._pending_ratio(repository_size)
+        return self.ratio * 100 >= self.threshold
+
+    def reset(self):
+        self._save_pending_bytes(0)
+
+    def _pending_ratio(self, repository_size):
+        total = repository_size + self.pending_bytes
+        return self.pending_bytes / total if total else 0.0
+
+    def _load_pending_bytes(self):
+        if self.state is None:
+            return 0
+        return self.state.load(self.file_name, {}).get("pending_bytes", 0)
+
+    def _save_pending_bytes(self, pending_bytes):
+        if self.state is not None:
+            self.state.save(self.file_name, {"pending_bytes": pending_bytes})
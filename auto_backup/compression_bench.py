@@ -0,0 +1,214 @@
+import functools
+import lzma
+import os
+import random
+import time
+import zlib
+
+try:
+    import lz4.block as lz4_block
+except ImportError:
+    lz4_block = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from auto_backup.sizes import format_size
+
+BLOCK_SIZE = 2 * 1024 * 1024
+AUTO_RATIO_LIMIT = 0.97
+PROFILES_FILE = "compression.json"
+
+
+def _lz4_compress(data):
+    return lz4_block.compress(data, store_size=False)
+
+
+def _zstd_compressor(level):
+    compressor = zstandard.ZstdCompressor(level=level)
+    return compressor.compress
+
+
+def missing_codec_packages():
+    packages = [("lz4", lz4_block), ("zstandard", zstandard)]
+    return [name for name, module in packages if module is None]
+
+
+def available_codecs():
+    codecs = [("none", lambda data: data)]
+    if lz4_block:
+        codecs.append(("lz4", _lz4_compress))
+    if zstandard:
+        codecs.extend((f"zstd,{n}", _zstd_compressor(n)) for n in (1, 3, 6, 10))
+    codecs.extend(
+        (f"zlib,{n}", functools.partial(zlib.compress, level=n)) for n in (1, 6)
+    )
+    codecs.extend(
+        (f"lzma,{n}", functools.partial(lzma.compress, preset=n)) for n in (0, 6)
+    )
+    return codecs
+
+
+class SourceSampler(object):
+    def __init__(self, source, max_files=200, max_bytes=64 * 1024 * 1024, seed=None):
+        self.source = source
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.random = random.Random(seed)
+
+    def sample_blocks(self):
+        blocks = []
+        remaining = self.max_bytes
+        for path in self._sample_files():
+            for block in self._read_blocks(path, remaining):
+                blocks.append(block)
+                remaining -= len(block)
+            if remaining <= 0:
+                break
+        return blocks
+
+    def _sample_files(self):
+        sample = []
+        for seen, path in enumerate(self._iter_files()):
+            if len(sample) < self.max_files:
+                sample.append(path)
+            else:
+                index = self.random.randint(0, seen)
+                if index < self.max_files:
+                    sample[index] = path
+        self.random.shuffle(sample)
+        return sample
+
+    def _iter_files(self):
+        for directory, _, files in os.walk(self.source):
+            for name in files:
+                path = os.path.join(directory, name)
+                if os.path.isfile(path) and not os.path.islink(path):
+                    yield path
+
+    def _read_blocks(self, path, remaining):
+        try:
+            with open(path, "rb") as sample_file:
+                while remaining > 0:
+                    block = sample_file.read(min(BLOCK_SIZE, remaining))
+                    if not block:
+                        return
+                    remaining -= len(block)
+                    yield block
+        except OSError:
+            return
+
+
+class CodecResult(object):
+    def __init__(self, name, input_bytes, output_bytes, seconds):
+        self.name = name
+        self.input_bytes = input_bytes
+        self.output_bytes = output_bytes
+        self.seconds = seconds
+
+    @property
+    def ratio(self):
+        return self.output_bytes / self.input_bytes if self.input_bytes else 1.0
+
+    @property
+    def throughput(self):
+        return self.input_bytes / self.seconds if self.seconds else float("inf")
+
+    def effective_rate(self, uplink):
+        if not uplink:
+            return self.throughput
+        return min(self.throughput, uplink / max(self.ratio, 1e-9))
+
+
+class CompressionBenchmark(object):
+    def __init__(self, codecs=None, include_auto=True):
+        self.codecs = codecs if codecs is not None else available_codecs()
+        self.include_auto = include_auto
+
+    def run(self, blocks):
+        results = [self._measure(name, c, blocks) for name, c in self.codecs]
+        if self.include_auto:
+            results.extend(self._measure_auto_variants(blocks))
+        return results
+
+    def _measure(self, name, compress, blocks):
+        input_bytes = output_bytes = 0
+        started = time.perf_counter()
+        for block in blocks:
+            input_bytes += len(block)
+            output_bytes += len(compress(block))
+        seconds = time.perf_counter() - started
+        return CodecResult(name, input_bytes, output_bytes, seconds)
+
+    def _measure_auto_variants(self, blocks):
+        predictor = dict(self.codecs).get("lz4")
+        if predictor is None:
+            return []
+        expensive = [(n, c) for n, c in self.codecs if n not in ("none", "lz4")]
+        return [self._measure_auto(n, c, predictor, blocks) for n, c in expensive]
+
+    def _measure_auto(self, name, compress, predictor, blocks):
+        def auto_compress(block):
+            if len(predictor(block)) < AUTO_RATIO_LIMIT * len(block):
+                return compress(block)
+            return block
+
+        return self._measure(f"auto,{name}", auto_compress, blocks)
+
+
+def recommend(results, uplink=None, min_throughput=50e6, tolerance=0.1):
+    candidates = [r for r in results if r.throughput >= min_throughput]
+    candidates = candidates or [max(results, key=lambda r: r.throughput)]
+    if uplink:
+        candidates = _within_tolerance_of_best_rate(candidates, uplink, tolerance)
+    return min(candidates, key=lambda r: (r.ratio, -r.throughput))
+
+
+def _within_tolerance_of_best_rate(results, uplink, tolerance):
+    best_rate = max(r.effective_rate(uplink) for r in results)
+    limit = (1 - tolerance) * best_rate
+    return [r for r in results if r.effective_rate(uplink) >= limit]
+
+
+def format_benchmark_report(
+    source, blocks, results, recommendation, uplink, missing=()
+):
+    sampled = sum(len(b) for b in blocks)
+    lines = [
+        f"Compression benchmark for {source} ({format_size(sampled)} sampled)",
+        f"{'compression':<16}{'ratio':>8}{'MB/s':>10}{'effective MB/s':>16}",
+    ]
+    for result in results:
+        lines.append(_format_result_line(result, uplink))
+    if missing:
+        lines.append(
+            f"Not measured, Python packages missing: {', '.join(missing)} "
+            "(install the bench extra)"
+        )
+    lines.append(f'Recommended: compression = "{recommendation.name}"')
+    return "\n".join(lines)
+
+
+def _format_result_line(result, uplink):
+    speed = result.throughput / 1e6
+    effective = result.effective_rate(uplink) / 1e6
+    return f"{result.name:<16}{result.ratio:>8.3f}{speed:>10.1f}{effective:>16.1f}"
+
+
+class CompressionProfiles(object):
+    def __init__(self, state):
+        self.state = state
+
+    def load(self, source):
+        profiles = self.state.load(PROFILES_FILE, {})
+        return profiles.get(self._key(source), {}).get("compression")
+
+    def save(self, source, compression):
+        profiles = self.state.load(PROFILES_FILE, {})
+        profiles[self._key(source)] = {"compression": compression}
+        self.state.save(PROFILES_FILE, profiles)
+
+    def _key(self, source):
+        return os.path.abspath(os.path.expanduser(source))
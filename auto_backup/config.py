@@ -1,9 +1,14 @@
 import inspect
 
 
+def as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
 class TaskConfigMerger(object):
-    def __init__(self, config):
+    def __init__(self, config, accumulated_keys=()):
         self.config = config
+        self.accumulated_keys = accumulated_keys
 
     def merge_with_task_config(self, config_section, task_config):
         config_section = self._get_config_section(config_section)
@@ -11,8 +16,16 @@ class TaskConfigMerger(object):
         merged_config = dict()
         merged_config.update(config_section)
         merged_config.update(task_config)
+        for key in self.accumulated_keys:
+            if key in config_section and key in task_config:
+                merged_config[key] = self._accumulate(
+                    config_section[key], task_config[key]
+                )
         return merged_config
 
+    def _accumulate(self, section_value, task_value):
+        return list(dict.fromkeys(as_list(section_value) + as_list(task_value)))
+
     def _get_config_section(self, section):
         return self.config.get(section, {})
 
@@ -50,14 +63,29 @@ class TaskList(object):
         self.task_factory = task_factory
         self.config = config
         self.filter_func = lambda t: t
+        self.selection_func = lambda t: t
+        self.combine_func = lambda tasks: tasks
+        self.order_func = lambda tasks: tasks
 
     def __iter__(self):
         created_tasks = map(self.task_factory, self.config)
-        return filter(self.filter_func, created_tasks)
+        selected = filter(self.selection_func, created_tasks)
+        combined = self.combine_func(filter(self.filter_func, selected))
+        return iter(self.order_func(combined))
 
     def filter_by_tags(self, tags):
         self.filter_func = lambda t: t.is_active(tags)
 
+    def select_by_names(self, names):
+        names = set(names)
+        self.selection_func = lambda t: t.name in names
+
+    def combine_tasks_with(self, combine_func):
+        self.combine_func = combine_func
+
+    def order_tasks_with(self, order_func):
+        self.order_func = order_func
+
 
 class ConfigValueInjector(object):
     def __init__(self, factory):
@@ -0,0 +1,44 @@
+import datetime
+import re
+
+UNITS = {
+    "w": datetime.timedelta(weeks=1),
+    "d": datetime.timedelta(days=1),
+    "h": datetime.timedelta(hours=1),
+    "m": datetime.timedelta(minutes=1),
+    "s": datetime.timedelta(seconds=1),
+}
+DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?[wdhms])+$")
+PART_PATTERN = re.compile(r"(\d+(?:\.\d+)?)([wdhms])")
+
+
+def parse_duration(value):
+    if isinstance(value, datetime.timedelta):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.timedelta(seconds=value)
+    return _parse_duration_string(value)
+
+
+def _parse_duration_string(value):
+    text = str(value).replace(" ", "").lower()
+    if not DURATION_PATTERN.match(text):
+        raise ValueError(f"Invalid duration '{value}', use e.g. '90s', '1h30m', '7d'")
+    parts = PART_PATTERN.findall(text)
+    return sum((float(n) * UNITS[unit] for n, unit in parts), datetime.timedelta())
+
+
+def format_duration(duration):
+    seconds = max(0, int(round(_total_seconds(duration))))
+    parts = []
+    for unit in ("d", "h", "m", "s"):
+        amount, seconds = divmod(seconds, int(UNITS[unit].total_seconds()))
+        if amount or (unit == "s" and not parts):
+            parts.append(f"{amount}{unit}")
+    return " ".join(parts[:2])
+
+
+def _total_seconds(duration):
+    if isinstance(duration, datetime.timedelta):
+        return duration.total_seconds()
+    return duration
@@ -0,0 +1,11 @@
+import hashlib
+
+READ_SIZE = 1024 * 1024
+
+
+def hash_file(path, algorithm):
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as hashed_file:
+        for block in iter(lambda: hashed_file.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
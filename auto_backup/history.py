@@ -0,0 +1,25 @@
+import statistics
+import threading
+
+HISTORY_FILE = "history.json"
+
+
+class RunHistory(object):
+    def __init__(self, state, keep=10):
+        self.state = state
+        self.keep = keep
+        self.lock = threading.Lock()
+
+    def record(self, task_name, seconds):
+        with self.lock:
+            durations = self.state.load(HISTORY_FILE, {})
+            recent = durations.get(task_name, []) + [round(seconds, 1)]
+            durations[task_name] = recent[-self.keep :]
+            self.state.save(HISTORY_FILE, durations)
+
+    def durations(self, task_name):
+        return self.state.load(HISTORY_FILE, {}).get(task_name, [])
+
+    def estimate(self, task_name):
+        durations = self.durations(task_name)
+        return statistics.median(durations) if durations else None
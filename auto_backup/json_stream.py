@@ -0,0 +1,89 @@
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+
+class JsonStreamReader(object):
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.end_of_stream = False
+
+    def read_object(self, item_handlers):
+        members = dict()
+        self._expect("{")
+        while not self._consume_if("}"):
+            self._read_member(members, item_handlers)
+            self._consume_if(",")
+        return members
+
+    def _read_member(self, members, item_handlers):
+        key = self._decode_value()
+        self._expect(":")
+        if key in item_handlers:
+            self._read_array_items(item_handlers[key])
+        else:
+            members[key] = self._decode_value()
+
+    def _read_array_items(self, handler):
+        self._expect("[")
+        while not self._consume_if("]"):
+            handler(self._decode_value())
+            self._consume_if(",")
+
+    def _expect(self, character):
+        if not self._consume_if(character):
+            raise ValueError(f"Expected '{character}' at position {self.position}")
+
+    def _consume_if(self, character):
+        self._skip_whitespace()
+        if self.buffer[self.position : self.position + 1] == character:
+            self.position += 1
+            return True
+        return False
+
+    def _skip_whitespace(self):
+        while True:
+            while self._has_buffered_data() and self._current() in WHITESPACE:
+                self.position += 1
+            if self._has_buffered_data() or not self._read_chunk():
+                return
+
+    def _decode_value(self):
+        self._skip_whitespace()
+        while True:
+            value, end = self._try_decode()
+            if end is not None and (end < len(self.buffer) or self.end_of_stream):
+                self.position = end
+                return value
+            if not self._read_chunk():
+                raise ValueError(f"Truncated JSON value at position {self.position}")
+
+    def _try_decode(self):
+        try:
+            return self.decoder.raw_decode(self.buffer, self.position)
+        except ValueError:
+            return None, None
+
+    def _has_buffered_data(self):
+        return self.position < len(self.buffer)
+
+    def _current(self):
+        return self.buffer[self.position]
+
+    def _read_chunk(self):
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.end_of_stream = True
+            return False
+        self._drop_consumed_data()
+        self.buffer += chunk
+        return True
+
+    def _drop_consumed_data(self):
+        self.buffer = self.buffer[self.position :]
+        self.position = 0
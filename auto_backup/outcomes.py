@@ -0,0 +1,69 @@
+import hashlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+DEFERRED = "deferred"
+
+UNFINISHED = (PENDING, RUNNING, DEFERRED)
+
+
+class RunOutcomes(object):
+    SELECTIONS = ("failed", "unfinished")
+
+    def __init__(self, state, tags=None):
+        self.state = state
+        self.file_name = os.path.join("outcomes", f"{self._record_name(tags)}.json")
+        self.lock = threading.Lock()
+        self.previous = []
+        self.tasks = None
+
+    def _record_name(self, tags):
+        if not tags:
+            return "all"
+        key = ",".join(sorted(set(tags)))
+        return f"tags-{hashlib.sha1(key.encode()).hexdigest()[:12]}"
+
+    def load(self):
+        return self.state.load(self.file_name, {}).get("tasks", [])
+
+    def select(self, selection):
+        if selection not in self.SELECTIONS:
+            raise ValueError(f"Unknown selection '{selection}'")
+        self.previous = self.load()
+        names = [t["name"] for t in self.previous if self._selects(selection, t)]
+        if not names:
+            logger.info("No %s task in the last run", selection)
+        return names
+
+    def _selects(self, selection, task):
+        if selection == "failed":
+            return task["outcome"] != SUCCEEDED
+        return task["outcome"] in UNFINISHED
+
+    def start(self, names):
+        with self.lock:
+            self.tasks = [dict(t) for t in self.previous]
+            known = {t["name"]: t for t in self.tasks}
+            for name in names:
+                if name in known:
+                    known[name]["outcome"] = PENDING
+                else:
+                    self.tasks.append({"name": name, "outcome": PENDING})
+            self._save()
+
+    def record(self, name, outcome):
+        with self.lock:
+            for task in self.tasks or []:
+                if task["name"] == name:
+                    task["outcome"] = outcome
+                    self._save()
+
+    def _save(self):
+        self.state.save(self.file_name, {"tasks": self.tasks})
@@ -0,0 +1,55 @@
+import os
+import shlex
+import subprocess
+import threading
+
+PASSWORD_KEYS = ("password", "password_command", "password_file", "password_env")
+
+
+class PasswordResolver(object):
+    def __init__(self, run_subprocess=subprocess.run):
+        self.run_subprocess = run_subprocess
+        self.passwords = dict()
+        self.lock = threading.Lock()
+
+    def validate(self, repository_config):
+        self._get_password_key(repository_config)
+
+    def resolve(self, repository_config):
+        url = repository_config["url"]
+        with self.lock:
+            if url not in self.passwords:
+                self.passwords[url] = self._resolve(repository_config)
+            return self.passwords[url]
+
+    def _resolve(self, repository_config):
+        key = self._get_password_key(repository_config)
+        return getattr(self, f"_from_{key}")(repository_config[key])
+
+    def _get_password_key(self, repository_config):
+        keys = [key for key in PASSWORD_KEYS if key in repository_config]
+        if len(keys) != 1:
+            raise ValueError(
+                f"Repository {repository_config['url']} needs exactly one of "
+                + ", ".join(PASSWORD_KEYS)
+            )
+        return keys[0]
+
+    def _from_password(self, password):
+        return password
+
+    def _from_password_command(self, command):
+        args = shlex.split(command) if isinstance(command, str) else command
+        result = self.run_subprocess(
+            args, check=True, stdout=subprocess.PIPE, universal_newlines=True
+        )
+        return result.stdout.rstrip("\n")
+
+    def _from_password_file(self, path):
+        with open(os.path.expanduser(path)) as password_file:
+            return password_file.read().rstrip("\n")
+
+    def _from_password_env(self, name):
+        if name not in os.environ:
+            raise ValueError(f"Environment variable {name} is not set")
+        return os.environ[name]
@@ -0,0 +1,138 @@
+import contextlib
+import fnmatch
+import os
+import re
+import tempfile
+
+PATTERN_STYLE = re.compile(r"^(fm|sh|re|pp|pf):")
+
+
+def read_exclude_file(path):
+    with open(os.path.expanduser(path)) as exclude_file:
+        lines = (line.strip() for line in exclude_file)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def exclude_rule(pattern):
+    if PATTERN_STYLE.match(pattern):
+        return f"- {pattern}"
+    return f"- fm:{pattern}"
+
+
+@contextlib.contextmanager
+def patterns_file(excludes):
+    if not excludes:
+        yield None
+        return
+    with tempfile.NamedTemporaryFile(
+        "w", prefix="auto-backup-", suffix=".patterns"
+    ) as patterns:
+        patterns.writelines(f"{exclude_rule(e)}\n" for e in excludes)
+        patterns.flush()
+        yield patterns.name
+
+
+ANY_DIRECTORY = "(?:.*/)?"
+
+
+def _split_style(pattern):
+    match = PATTERN_STYLE.match(pattern)
+    if match:
+        return match.group(1), pattern[match.end() :]
+    return "fm", pattern
+
+
+def _translate_shell_pattern(pattern):
+    parts = []
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            parts.append(ANY_DIRECTORY)
+            index += 3
+        elif pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif pattern[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif pattern[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        else:
+            parts.append(re.escape(pattern[index]))
+            index += 1
+    return "".join(parts)
+
+
+def _translate_glob(style, body):
+    if style == "sh":
+        return _translate_shell_pattern(body)
+    expression = fnmatch.translate(body)
+    return expression[: -len(r"\Z")]
+
+
+def _compile_globs(expressions):
+    anywhere = [e[len(ANY_DIRECTORY) :] for e in expressions if _is_anywhere(e)]
+    anchored = [e for e in expressions if not _is_anywhere(e)]
+    alternatives = []
+    if anywhere:
+        alternatives.append(f"{ANY_DIRECTORY}(?:{'|'.join(anywhere)})")
+    alternatives.extend(anchored)
+    if not alternatives:
+        return None
+    return re.compile(f"(?:{'|'.join(alternatives)})(?:/.*)?\\Z").match
+
+
+def _is_anywhere(expression):
+    return expression.startswith(ANY_DIRECTORY)
+
+
+def _compile_searches(expressions):
+    if not expressions:
+        return None
+    try:
+        return re.compile("|".join(f"(?:{e})" for e in expressions)).search
+    except re.error:
+        searches = [re.compile(e).search for e in expressions]
+        return lambda path: any(search(path) for search in searches)
+
+
+class ExcludeMatcher(object):
+    def __init__(self, patterns=(), markers=()):
+        globs = []
+        searches = []
+        self.prefixes = set()
+        self.full_paths = set()
+        for pattern in patterns:
+            style, body = _split_style(pattern)
+            if style == "re":
+                searches.append(body)
+            elif style == "pp":
+                self.prefixes.add(body.strip("/"))
+            elif style == "pf":
+                self.full_paths.add(body.strip("/"))
+            else:
+                globs.append(_translate_glob(style, body.strip("/")))
+        self.glob = _compile_globs(globs)
+        self.search = _compile_searches(searches)
+        self.markers = set(markers)
+        self.empty = not patterns
+
+    def excludes(self, path):
+        if self.empty:
+            return False
+        if path in self.full_paths or self._has_excluded_prefix(path):
+            return True
+        if self.glob and self.glob(path):
+            return True
+        return bool(self.search and self.search(path))
+
+    def _has_excluded_prefix(self, path):
+        while path and self.prefixes:
+            if path in self.prefixes:
+                return True
+            path = path.rpartition("/")[0]
+        return False
+
+    def has_marker(self, names):
+        return bool(self.markers) and not self.markers.isdisjoint(names)
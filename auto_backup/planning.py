@@ -0,0 +1,80 @@
+from auto_backup.durations import format_duration
+
+
+class PlannedTask(object):
+    def __init__(self, task, lane, start, estimate, deferred=False):
+        self.task = task
+        self.lane = lane
+        self.start = start
+        self.estimate = estimate
+        self.deferred = deferred
+
+    @property
+    def end(self):
+        return self.start + (self.estimate or 0)
+
+
+class ExecutionPlan(object):
+    def __init__(self, tasks, history, jobs=1, backup_window=None):
+        self.jobs = jobs
+        self.backup_window = backup_window
+        self.entries = self._schedule(tasks, history)
+
+    def _schedule(self, tasks, history):
+        lanes = [0.0] * self.jobs
+        entries = []
+        for task in tasks:
+            lane = min(range(self.jobs), key=lanes.__getitem__)
+            entry = PlannedTask(task, lane, lanes[lane], history.estimate(task.name))
+            entry.deferred = not self._fits_into_window(entry)
+            if not entry.deferred:
+                lanes[lane] = entry.end
+            entries.append(entry)
+        return entries
+
+    def _fits_into_window(self, entry):
+        if self.backup_window is None:
+            return True
+        return self.backup_window.leaves_time_for(entry.estimate, entry.start)
+
+    @property
+    def scheduled(self):
+        return [entry for entry in self.entries if not entry.deferred]
+
+    @property
+    def deferred(self):
+        return [entry for entry in self.entries if entry.deferred]
+
+    @property
+    def total(self):
+        return max((entry.end for entry in self.scheduled), default=0)
+
+    @property
+    def unknown(self):
+        return [entry for entry in self.entries if entry.estimate is None]
+
+
+def format_plan(plan):
+    lines = [
+        f"Plan for {len(plan.entries)} task(s) with {plan.jobs} parallel job(s)",
+        f"{'lane':<6}{'start':<10}{'estimate':<10}task",
+    ]
+    lines.extend(_format_entry(entry) for entry in plan.entries)
+    lines.append(_format_total(plan))
+    return "\n".join(lines)
+
+
+def _format_entry(entry):
+    start = "deferred" if entry.deferred else format_duration(entry.start)
+    estimate = "unknown" if entry.estimate is None else format_duration(entry.estimate)
+    return f"{entry.lane + 1:<6}{start:<10}{estimate:<10}{entry.task}"
+
+
+def _format_total(plan):
+    total = f"Estimated total: {format_duration(plan.total)}"
+    if plan.unknown:
+        total += f" ({len(plan.unknown)} task(s) without history)"
+    if plan.deferred:
+        deadline = plan.backup_window.deadline
+        total += f", {len(plan.deferred)} task(s) deferred to finish by {deadline}"
+    return total
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from auto_backup.patterns import ExcludeMatcher
+from auto_backup.sizes import format_size
+
+logger = logging.getLogger(__name__)
+
+
+class SourceScan(object):
+    def __init__(self, total_bytes=0, files=0, changed_bytes=0, changed_files=0):
+        self.total_bytes = total_bytes
+        self.files = files
+        self.changed_bytes = changed_bytes
+        self.changed_files = changed_files
+        self.seconds = 0.0
+        self.snapshots = dict()
+
+    def add_file(self, size, changed):
+        self.total_bytes += size
+        self.files += 1
+        if changed:
+            self.changed_bytes += size
+            self.changed_files += 1
+
+    def add(self, other):
+        self.total_bytes += other.total_bytes
+        self.files += other.files
+        self.changed_bytes += other.changed_bytes
+        self.changed_files += other.changed_files
+        self.seconds = max(self.seconds, other.seconds)
+        self.snapshots.update(other.snapshots)
+
+    def as_dict(self):
+        return {
+            "total_bytes": self.total_bytes,
+            "files": self.files,
+            "changed_bytes": self.changed_bytes,
+            "changed_files": self.changed_files,
+        }
+
+
+def format_scan(scan):
+    return (
+        f"{format_size(scan.total_bytes)} in {scan.files} file(s), "
+        f"{format_size(scan.changed_bytes)} in {scan.changed_files} file(s) changed"
+    )
+
+
+class ParallelScanner(object):
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+
+    def scan(self, root, matcher, since):
+        result = SourceScan()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            def submit(path, relative):
+                return executor.submit(
+                    self._scan_directory, path, relative, matcher, since
+                )
+
+            pending = {submit(root, "")}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    counts, directories = future.result()
+                    result.add(counts)
+                    pending.update(submit(path, rel) for path, rel in directories)
+        result.seconds = time.monotonic() - started
+        return result
+
+    def _scan_directory(self, path, relative, matcher, since):
+        counts = SourceScan()
+        directories = []
+        try:
+            with os.scandir(path) as scanned:
+                entries = list(scanned)
+        except OSError as error:
+            logger.warning("Can't scan %s: %s", path, error)
+            return counts, directories
+        if matcher.has_marker(entry.name for entry in entries):
+            return counts, directories
+        prefix = f"{relative}/" if relative else ""
+        excludes = None if matcher.empty else matcher.excludes
+        for entry in entries:
+            entry_path = prefix + entry.name
+            if excludes and excludes(entry_path):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                directories.append((entry.path, entry_path))
+            elif entry.is_file(follow_symlinks=False):
+                self._count_file(entry, since, counts)
+        return counts, directories
+
+    def _count_file(self, entry, since, counts):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            return
+        changed = since is None or max(stat.st_mtime, stat.st_ctime) >= since
+        counts.add_file(stat.st_size, changed)
+
+
+class SourcePrescan(object):
+    def __init__(self, state, max_workers=8, scanner=None):
+        self.state = state
+        self.scanner = scanner or ParallelScanner(max_workers)
+
+    def run(self, tasks):
+        for task in tasks:
+            if task.scan is None:
+                task.scan = self._scan_task(task)
+
+    def _scan_task(self, task):
+        commands = getattr(task.command, "commands", [task.command])
+        commands = [c for c in commands if hasattr(c, "exclude_patterns")]
+        if not commands:
+            return None
+        scan = SourceScan()
+        for command in commands:
+            scan.add(self._scan_source(command))
+        logger.info("Scanned %s: %s", task, format_scan(scan))
+        return scan
+
+    def _scan_source(self, command):
+        source = os.path.abspath(command.source)
+        file_name = os.path.join("prescan", self._snapshot_name(source))
+        snapshot = self.state.load(file_name, {}) if self.state else {}
+        matcher = ExcludeMatcher(command.exclude_patterns(), command.exclude_if_present)
+        started = time.time()
+        scan = self.scanner.scan(source, matcher, snapshot.get("scanned"))
+        scan.snapshots[file_name] = dict(scan.as_dict(), scanned=started)
+        return scan
+
+    def commit(self, task):
+        if self.state is None or task.scan is None:
+            return
+        for file_name, snapshot in task.scan.snapshots.items():
+            self.state.save(file_name, snapshot)
+
+    def _snapshot_name(self, source):
+        return f"{hashlib.sha1(source.encode()).hexdigest()[:12]}.json"
@@ -0,0 +1,102 @@
+import re
+
+from auto_backup.durations import parse_duration
+
+FILES_CACHE_MODES = {"ctime", "mtime", "size", "inode", "rechunk", "disabled"}
+CHUNKER_PARAMS_PATTERN = re.compile(
+    r"^(default|(buzhash,)?\d+,\d+,\d+,\d+|fixed,\d+(,\d+)?)$"
+)
+
+
+def _files_cache_arguments(value):
+    modes = str(value).split(",")
+    unknown = set(modes) - FILES_CACHE_MODES
+    if unknown:
+        raise ValueError(f"unknown files cache mode(s) {', '.join(sorted(unknown))}")
+    return ["--files-cache", ",".join(modes)]
+
+
+def _chunker_params_arguments(value):
+    if not CHUNKER_PARAMS_PATTERN.match(str(value)):
+        raise ValueError(f"invalid chunker params '{value}'")
+    return ["--chunker-params", str(value)]
+
+
+def _checkpoint_interval_arguments(value):
+    seconds = int(parse_duration(value).total_seconds())
+    if seconds <= 0:
+        raise ValueError("checkpoint interval must be positive")
+    return ["--checkpoint-interval", str(seconds)]
+
+
+def _upload_ratelimit_arguments(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError("upload ratelimit must be a number of kiB/s")
+    return []
+
+
+def _flag(option):
+    def flag_arguments(value):
+        if not isinstance(value, bool):
+            raise ValueError(f"{option} must be true or false")
+        return [option] if value else []
+
+    return flag_arguments
+
+
+def _compression_arguments(value):
+    if not isinstance(value, str) or not value:
+        raise ValueError("compression must be a borg compression setting")
+    return []
+
+
+PROFILE_OPTIONS = {
+    "files_cache": _files_cache_arguments,
+    "chunker_params": _chunker_params_arguments,
+    "checkpoint_interval": _checkpoint_interval_arguments,
+    "one_file_system": _flag("--one-file-system"),
+    "noatime": _flag("--noatime"),
+    "upload_ratelimit": _upload_ratelimit_arguments,
+    "compression": _compression_arguments,
+}
+
+
+class BackupProfile(object):
+    def __init__(self, name, options):
+        self.name = name
+        self.compression = options.get("compression")
+        self.upload_ratelimit = options.get("upload_ratelimit")
+        self.arguments = self._build_arguments(options)
+
+    def _build_arguments(self, options):
+        arguments = []
+        for option, value in options.items():
+            arguments.extend(self._build_option_arguments(option, value))
+        return arguments
+
+    def _build_option_arguments(self, option, value):
+        if option not in PROFILE_OPTIONS:
+            raise ValueError(f"Backup profile '{self.name}': unknown option '{option}'")
+        try:
+            return PROFILE_OPTIONS[option](value)
+        except ValueError as error:
+            raise ValueError(f"Backup profile '{self.name}': {error}") from error
+
+
+class BackupProfiles(object):
+    CONFIG_KEY = "backup_profiles"
+
+    def __init__(self, profiles_config):
+        self.profiles = {
+            name: BackupProfile(name, options)
+            for name, options in profiles_config.items()
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get(cls.CONFIG_KEY, {}))
+
+    def get(self, name):
+        if name not in self.profiles:
+            raise ValueError(f"Unknown backup profile '{name}'")
+        return self.profiles[name]
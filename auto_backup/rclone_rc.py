@@ -0,0 +1,197 @@
+import base64
+import json
+import logging
+import os
+import secrets
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from auto_backup.sizes import format_size
+
+logger = logging.getLogger(__name__)
+
+
+class RcloneRcError(RuntimeError):
+    pass
+
+
+class RcloneRcClient(object):
+    def __init__(self, url, user=None, password=None, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json"}
+        if user is not None:
+            credentials = f"{user}:{password}".encode()
+            authorization = base64.b64encode(credentials).decode()
+            self.headers["Authorization"] = f"Basic {authorization}"
+        self.opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def call(self, method, **params):
+        request = urllib.request.Request(
+            f"{self.url}/{method}",
+            data=json.dumps(params).encode(),
+            headers=self.headers,
+            method="POST",
+        )
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as error:
+            raise RcloneRcError(self._get_error_message(method, error)) from error
+
+    def _get_error_message(self, method, error):
+        try:
+            message = json.load(error).get("error", error.reason)
+        except ValueError:
+            message = error.reason
+        return f"rclone rc {method} failed: {message}"
+
+
+class RcloneSyncJob(object):
+    def __init__(self, client, source, destination, poll_interval=1.0):
+        self.client = client
+        self.source = source
+        self.destination = destination
+        self.poll_interval = poll_interval
+        self.stats = {}
+
+    def run(self, method="sync/sync", **params):
+        started = time.monotonic()
+        job = self.client.call(
+            method, srcFs=self.source, dstFs=self.destination, _async=True, **params
+        )
+        status = self._wait_for_job(job["jobid"])
+        self._log_stats(time.monotonic() - started)
+        if not status.get("success"):
+            raise RcloneRcError(f"rclone {method} failed: {status.get('error')}")
+
+    def _wait_for_job(self, jobid):
+        while True:
+            status = self.client.call("job/status", jobid=jobid)
+            self.stats = self.client.call("core/stats", group=f"job/{jobid}")
+            if status.get("finished"):
+                return status
+            time.sleep(self.poll_interval)
+
+    def _log_stats(self, duration):
+        logger.info(
+            "Synced %s to %s: %s in %d file(s), %d check(s), %d error(s) in %.1fs",
+            self.source,
+            self.destination,
+            format_size(self.stats.get("bytes", 0)),
+            self.stats.get("transfers", 0),
+            self.stats.get("checks", 0),
+            self.stats.get("errors", 0),
+            duration,
+        )
+
+
+class RcloneDaemon(object):
+    def __init__(
+        self,
+        config_file,
+        bwlimit=None,
+        address=None,
+        startup_timeout=30,
+        poll_interval=1.0,
+        popen=subprocess.Popen,
+    ):
+        self.config_file = config_file
+        self.bwlimit = bwlimit
+        self.address = address or self._find_free_address()
+        self.startup_timeout = startup_timeout
+        self.poll_interval = poll_interval
+        self.popen = popen
+        self.user = "auto-backup"
+        self.password = secrets.token_hex(16)
+        self.process = None
+        self.client = None
+
+    def _find_free_address(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            return f"127.0.0.1:{probe.getsockname()[1]}"
+
+    def start(self):
+        started = time.monotonic()
+        self.process = self.popen(
+            self._build_arguments(), stdin=subprocess.DEVNULL, env=self._build_env()
+        )
+        self.client = RcloneRcClient(f"http://{self.address}", self.user, self.password)
+        self._wait_until_ready(started)
+        duration = time.monotonic() - started
+        logger.info("Started rclone rcd for %s in %.1fs", self.config_file, duration)
+
+    def _build_arguments(self):
+        args = ["rclone", "rcd", "--config", self.config_file]
+        args.extend(("--rc-addr", self.address))
+        args.extend(("--rc-user", self.user))
+        if self.bwlimit:
+            args.extend(("--bwlimit", self.bwlimit))
+        return args
+
+    def _build_env(self):
+        env = os.environ.copy()
+        env["RCLONE_RC_PASS"] = self.password
+        return env
+
+    def _wait_until_ready(self, started):
+        while True:
+            if self.process.poll() is not None:
+                raise RcloneRcError("rclone rcd exited during startup")
+            try:
+                self.client.call("rc/noop")
+                return
+            except (OSError, RcloneRcError):
+                if time.monotonic() - started > self.startup_timeout:
+                    self.shutdown()
+                    raise RcloneRcError("rclone rcd did not start in time")
+                time.sleep(min(self.poll_interval, 0.1))
+
+    def sync(self, source, destination):
+        RcloneSyncJob(self.client, source, destination, self.poll_interval).run()
+
+    def copy(self, source, destination, max_age):
+        job = RcloneSyncJob(self.client, source, destination, self.poll_interval)
+        job.run("sync/copy", _filter={"MaxAge": f"{max_age}s"})
+
+    def shutdown(self):
+        if self.process is None:
+            return
+        try:
+            self.client.call("core/quit")
+            self.process.wait(timeout=10)
+        except (OSError, RcloneRcError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+class RcloneDaemons(object):
+    def __init__(self, bandwidth=None, daemon_factory=RcloneDaemon):
+        self.bandwidth = bandwidth
+        self.daemon_factory = daemon_factory
+        self.daemons = dict()
+        self.lock = threading.Lock()
+
+    def get(self, config_file):
+        with self.lock:
+            if config_file not in self.daemons:
+                self.daemons[config_file] = self._start_daemon(config_file)
+            return self.daemons[config_file]
+
+    def _start_daemon(self, config_file):
+        bwlimit = self.bandwidth.rclone_bwlimit() if self.bandwidth else None
+        daemon = self.daemon_factory(config_file, bwlimit=bwlimit)
+        daemon.start()
+        return daemon
+
+    def shutdown(self):
+        with self.lock:
+            for daemon in self.daemons.values():
+                daemon.shutdown()
+            self.daemons.clear()
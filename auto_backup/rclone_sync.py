@@ -0,0 +1,30 @@
+import os
+
+from auto_backup.durations import parse_duration
+
+SYNC_STATE_DIR = "rclone"
+
+
+class RcloneSyncTracker(object):
+    def __init__(self, state, name, full_sync_every, margin=60):
+        self.state = state
+        self.file_name = os.path.join(SYNC_STATE_DIR, f"{name}.json")
+        self.full_sync_every = parse_duration(full_sync_every).total_seconds()
+        self.margin = margin
+
+    def top_up_max_age(self, now):
+        record = self.state.load(self.file_name, {})
+        last_sync = record.get("last_sync")
+        last_full_sync = record.get("last_full_sync")
+        if last_sync is None or last_full_sync is None:
+            return None
+        if now - last_full_sync >= self.full_sync_every:
+            return None
+        return int(now - last_sync + self.margin)
+
+    def record(self, started, full):
+        record = self.state.load(self.file_name, {})
+        record["last_sync"] = started
+        if full:
+            record["last_full_sync"] = started
+        self.state.save(self.file_name, record)
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import math
+import os
+import random
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auto_backup.argument_assigner import assign_arguments_to_self
+from auto_backup.durations import parse_duration
+from auto_backup.hashing import hash_file
+from auto_backup.tasks import run_checked_subprocess
+
+logger = logging.getLogger(__name__)
+
+RCLONE_HASH_NAMES = {"md5": "MD5", "sha1": "SHA-1"}
+
+
+def parse_hashsum_output(output):
+    hashes = dict()
+    for line in (output or "").splitlines():
+        parts = line.split("  ", 1)
+        if len(parts) == 2:
+            hashes[parts[1]] = parts[0].lower()
+    return hashes
+
+
+class VerificationSample(object):
+    def __init__(self, state, name, percentage):
+        self.state = state
+        self.file_name = os.path.join("rclone_verify", f"{name}.json")
+        self.percentage = percentage
+        self.record = state.load(self.file_name, {}) if state else {}
+        self.seed = self.record.get("seed", random.getrandbits(32))
+
+    def select(self, paths):
+        order = sorted(paths, key=self._rank)
+        if not order:
+            return []
+        size = min(len(order), max(1, math.ceil(len(order) * self.percentage / 100)))
+        start = self.record.get("cursor", 0) % len(order)
+        return [order[(start + i) % len(order)] for i in range(size)]
+
+    def _rank(self, path):
+        return hashlib.sha1(f"{self.seed}:{path}".encode()).hexdigest()
+
+    def advance(self, count, total):
+        if self.state is None or not total:
+            return
+        cursor = (self.record.get("cursor", 0) + count) % total
+        self.record = {"seed": self.seed, "cursor": cursor}
+        self.state.save(self.file_name, self.record)
+
+
+class RcloneVerifyCommand(object):
+    def __init__(
+        self,
+        config_file,
+        source,
+        destination,
+        notify,
+        percentage=5,
+        time_budget="30m",
+        hash="md5",
+        max_workers=4,
+        state=None,
+        run_subprocess=run_checked_subprocess,
+    ):
+        assign_arguments_to_self()
+
+        if self.hash not in RCLONE_HASH_NAMES:
+            raise ValueError(f"Unsupported hash '{self.hash}', use md5 or sha1")
+        self.time_budget = parse_duration(time_budget).total_seconds()
+
+    def execute(self):
+        paths = list(self._list_local_files())
+        sample = self._create_sample()
+        selected = sample.select(paths)
+        local_hashes = self._hash_local_files(selected)
+        remote_hashes = self._hash_remote_files(list(local_hashes))
+        mismatches = self._find_mismatches(local_hashes, remote_hashes)
+        sample.advance(len(local_hashes), len(paths))
+        self._report(len(paths), local_hashes, mismatches)
+
+    def _list_local_files(self):
+        for directory, _, files in os.walk(self.destination):
+            for name in files:
+                path = os.path.join(directory, name)
+                yield os.path.relpath(path, self.destination)
+
+    def _create_sample(self):
+        key = f"{self.source}\0{self.destination}".encode()
+        name = hashlib.sha1(key).hexdigest()
+        return VerificationSample(self.state, name, self.percentage)
+
+    def _hash_local_files(self, paths):
+        deadline = time.monotonic() + self.time_budget
+
+        def hash_within_budget(path):
+            if time.monotonic() > deadline:
+                return None
+            full_path = os.path.join(self.destination, path)
+            return hash_file(full_path, self.hash)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            hashes = list(executor.map(hash_within_budget, paths))
+        return self._leading_results(paths, hashes)
+
+    def _leading_results(self, paths, hashes):
+        results = dict()
+        for path, digest in zip(paths, hashes):
+            if digest is None:
+                break
+            results[path] = digest
+        return results
+
+    def _hash_remote_files(self, paths):
+        if not paths:
+            return {}
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as files_from:
+            files_from.write("\n".join(paths) + "\n")
+            files_from.flush()
+            return self._run_hashsum(files_from.name, paths)
+
+    def _run_hashsum(self, files_from, paths):
+        args = (
+            "rclone",
+            "--config",
+            self.config_file,
+            "hashsum",
+            RCLONE_HASH_NAMES[self.hash],
+            self.source,
+            "--files-from",
+            files_from,
+        )
+        try:
+            result = self.run_subprocess(
+                args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+            )
+            return parse_hashsum_output(result.stdout)
+        except subprocess.CalledProcessError as error:
+            return self._partial_hashes(error, paths)
+
+    def _partial_hashes(self, error, paths):
+        hashes = parse_hashsum_output(error.output)
+        missing = [path for path in paths if path not in hashes]
+        if not hashes or not self._reported_missing(missing, error.stderr):
+            logger.error("rclone hashsum failed: %s", (error.stderr or "").strip())
+            raise error
+        logger.warning("rclone hashsum reported %d missing file(s)", len(missing))
+        return hashes
+
+    def _reported_missing(self, paths, stderr):
+        lines = [line for line in (stderr or "").splitlines() if "not found" in line]
+        return bool(paths) and all(any(p in line for line in lines) for p in paths)
+
+    def _find_mismatches(self, local_hashes, remote_hashes):
+        return [p for p, h in local_hashes.items() if remote_hashes.get(p) != h]
+
+    def _report(self, total, checked, mismatches):
+        logger.info(
+            "Verified %d of %d file(s) of %s, %d mismatch(es)",
+            len(checked),
+            total,
+            self.destination,
+            len(mismatches),
+        )
+        if mismatches:
+            self.notify.message(self._format_mismatch_message(checked, mismatches))
+
+    def _format_mismatch_message(self, checked, mismatches):
+        return (
+            f"Verification of {self.destination} against {self.source}: "
+            f"{len(mismatches)} of {len(checked)} sampled file(s) differ: "
+            + ", ".join(sorted(mismatches))
+        )
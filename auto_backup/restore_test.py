@@ -0,0 +1,162 @@
+import datetime
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dateutil.parser import isoparse
+
+from auto_backup.argument_assigner import assign_arguments_to_self
+from auto_backup.hashing import hash_file
+from auto_backup.sizes import format_size
+from auto_backup.tasks import (
+    BackupCommand,
+    repository_lock,
+    run_checked_subprocess,
+    stream_checked_subprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+MTIME_TOLERANCE = datetime.timedelta(seconds=1)
+
+
+class ArchiveItemSampler(object):
+    def __init__(self, sample_size, seed=None):
+        self.sample_size = sample_size
+        self.random = random.Random(seed)
+        self.sample = []
+        self.seen = 0
+
+    def add(self, item):
+        if item.get("type") != "-":
+            return
+        if len(self.sample) < self.sample_size:
+            self.sample.append(item)
+        else:
+            index = self.random.randint(0, self.seen)
+            if index < self.sample_size:
+                self.sample[index] = item
+        self.seen += 1
+
+
+class RestoreTestResult(object):
+    def __init__(self):
+        self.compared = []
+        self.changed = []
+        self.mismatches = []
+        self.restored_files = 0
+        self.restored_bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def throughput(self):
+        return self.restored_bytes / self.seconds if self.seconds else 0.0
+
+
+class RestoreTestCommand(object):
+    def __init__(
+        self,
+        backup,
+        notify,
+        find_task,
+        sample_size=20,
+        hash="sha256",
+        max_workers=4,
+        run_subprocess=run_checked_subprocess,
+        stream_subprocess=stream_checked_subprocess,
+    ):
+        assign_arguments_to_self()
+
+        self.backup_command = find_task(backup).command
+        if not isinstance(self.backup_command, BackupCommand):
+            raise ValueError(f"Task '{backup}' is not a backup task")
+
+    def execute(self):
+        env = self.backup_command.subprocess_environment.build()
+        with repository_lock(self.backup_command.url):
+            archive = self._find_recorded_archive()
+            items = self._sample_archive_items(env, archive)
+            with tempfile.TemporaryDirectory(prefix="auto-backup-restore-") as target:
+                result = self._restore_and_compare(env, archive, items, target)
+        self._report(archive, result)
+
+    def _find_recorded_archive(self):
+        archive = self.backup_command.last_archive()
+        if not archive:
+            raise RuntimeError(f"No archive of backup '{self.backup}' recorded yet")
+        return archive
+
+    def _sample_archive_items(self, env, archive):
+        sampler = ArchiveItemSampler(self.sample_size)
+        args = ("borg", "list", "--json-lines", self._archive_location(archive))
+        with self.stream_subprocess(args, env=env) as output:
+            for line in output:
+                sampler.add(json.loads(line))
+        return sampler.sample
+
+    def _archive_location(self, archive):
+        return f"{self.backup_command.url}::{archive}"
+
+    def _restore_and_compare(self, env, archive, items, target):
+        result = RestoreTestResult()
+        if not items:
+            return result
+        started = time.monotonic()
+        self._extract(env, archive, items, target)
+        result.seconds = time.monotonic() - started
+        result.restored_files = len(items)
+        result.restored_bytes = sum(item.get("size", 0) for item in items)
+        self._compare(items, target, result)
+        return result
+
+    def _extract(self, env, archive, items, target):
+        args = ["borg", "extract", self._archive_location(archive)]
+        args.extend(item["path"] for item in items)
+        self.run_subprocess(args, env=env, cwd=target)
+
+    def _compare(self, items, target, result):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            outcomes = executor.map(lambda i: self._compare_item(i, target), items)
+            for item, outcome in zip(items, outcomes):
+                getattr(result, outcome).append(item["path"])
+
+    def _compare_item(self, item, target):
+        live_path = self._live_path(item["path"])
+        if self._changed_since_backup(item, live_path):
+            return "changed"
+        restored = hash_file(os.path.join(target, item["path"]), self.hash)
+        live = hash_file(live_path, self.hash)
+        return "compared" if restored == live else "mismatches"
+
+    def _live_path(self, archive_path):
+        relative = os.path.join(self.backup_command.source, archive_path)
+        if self.backup_command.group and not os.path.exists(relative):
+            return os.path.join("/", archive_path)
+        return relative
+
+    def _changed_since_backup(self, item, live_path):
+        try:
+            live_mtime = datetime.datetime.fromtimestamp(os.stat(live_path).st_mtime)
+        except FileNotFoundError:
+            return True
+        return abs(live_mtime - isoparse(item["mtime"])) > MTIME_TOLERANCE
+
+    def _report(self, archive, result):
+        summary = self._format_summary(archive, result)
+        logger.info(summary)
+        if result.mismatches:
+            mismatches = ", ".join(sorted(result.mismatches))
+            self.notify.message(f"{summary}, differing files: {mismatches}")
+
+    def _format_summary(self, archive, result):
+        return (
+            f"Restore test of {archive}: restored {result.restored_files} file(s) with "
+            f"{format_size(result.restored_bytes)} in {result.seconds:.1f}s "
+            f"({format_size(result.throughput)}/s), "
+            f"{len(result.mismatches)} mismatch(es), "
+            f"{len(result.changed)} changed since backup"
+        )
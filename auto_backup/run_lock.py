@@ -0,0 +1,99 @@
+import datetime
+import hashlib
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from auto_backup.durations import parse_duration
+
+logger = logging.getLogger(__name__)
+
+LOCK_STATE_FILE = "run_lock.json"
+
+
+class RunLock(object):
+    POLICIES = ("none", "skip", "wait", "queue")
+
+    def __init__(
+        self, state, policy="skip", timeout="1h", tags=None, poll_interval=1.0
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(
+                f"Unknown lock policy '{policy}', use one of {', '.join(self.POLICIES)}"
+            )
+        self.state = state
+        self.policy = policy
+        self.timeout = parse_duration(timeout).total_seconds()
+        self.name = self._lock_name(tags)
+        self.poll_interval = poll_interval
+        self.lock_file = None
+
+    def _lock_name(self, tags):
+        if not tags:
+            return "run"
+        key = ",".join(sorted(set(tags)))
+        return f"run-{hashlib.sha1(key.encode()).hexdigest()[:12]}"
+
+    def acquire(self):
+        if self.policy == "none":
+            return True
+        if fcntl is None:
+            logger.warning("File locking is not available, not taking %s", self.name)
+            return True
+        started = time.monotonic()
+        self.lock_file = self._open_lock_file()
+        acquired = self._lock()
+        self._record_outcome(acquired, time.monotonic() - started)
+        if not acquired:
+            self.lock_file.close()
+            self.lock_file = None
+        return acquired
+
+    def _open_lock_file(self):
+        path = self.state.file_path(f"{self.name}.lock")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, "a")
+
+    def _lock(self):
+        if self.policy == "queue":
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            return True
+        deadline = time.monotonic() + (self.timeout if self.policy == "wait" else 0)
+        while not self._try_lock():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def _try_lock(self):
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _record_outcome(self, acquired, waited):
+        outcome = "acquired" if acquired else "skipped"
+        if acquired:
+            logger.info("Acquired run lock %s after %.1fs", self.name, waited)
+        else:
+            logger.warning("Another run holds lock %s, skipping this run", self.name)
+        outcomes = self.state.load(LOCK_STATE_FILE, {})
+        outcomes[self.name] = {
+            "time": datetime.datetime.now().isoformat(),
+            "outcome": outcome,
+            "policy": self.policy,
+            "waited": round(waited, 1),
+        }
+        self.state.save(LOCK_STATE_FILE, outcomes)
+
+    def release(self):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
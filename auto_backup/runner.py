@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auto_backup.outcomes import DEFERRED, FAILED, RUNNING, SUCCEEDED
+from auto_backup.structured_log import task_context
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRunner(object):
+    def __init__(
+        self, jobs=1, history=None, backup_window=None, outcomes=None, prescan=None
+    ):
+        self.jobs = jobs
+        self.history = history
+        self.backup_window = backup_window
+        self.outcomes = outcomes
+        self.prescan = prescan
+        self.deferred = []
+        self.lock = threading.Lock()
+
+    def run(self, tasks):
+        self.deferred = []
+        if self.outcomes is not None:
+            self.outcomes.start([m.name for t in tasks for m in t.members()])
+        if self.jobs <= 1:
+            results = [self._run_task(task) for task in tasks]
+        else:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                results = list(executor.map(self._run_task, tasks))
+        self._report_deferred_tasks()
+        return results
+
+    def _run_task(self, task):
+        with task_context(task):
+            if self._must_defer(task):
+                self._defer(task)
+                return None
+            return self._execute_task(task)
+
+    def _execute_task(self, task):
+        logger.info("Starting %s", task, extra={"phase": "start"})
+        self._record_outcome(task.members(), RUNNING)
+        started = time.monotonic()
+        result = task.safe_execute()
+        duration = time.monotonic() - started
+        logger.info(
+            "Finished %s in %.1fs",
+            task,
+            duration,
+            extra={
+                "phase": "end",
+                "duration": duration,
+                "result": result,
+                "scan": task.scan.as_dict() if task.scan else None,
+            },
+        )
+        self._record_duration(task, result, duration)
+        self._commit_scan(task, result)
+        self._record_result(task, result)
+        return result
+
+    def _record_result(self, task, result):
+        if self.outcomes is None:
+            return
+        failed = task.failed_members() if result else []
+        for member in task.members():
+            self.outcomes.record(member.name, FAILED if member in failed else SUCCEEDED)
+
+    def _must_defer(self, task):
+        if self.backup_window is None or self.history is None:
+            return False
+        estimate = self.history.estimate(task.name)
+        return not self.backup_window.leaves_time_for(estimate)
+
+    def _defer(self, task):
+        logger.warning(
+            "Deferred %s, it is not expected to finish before %s",
+            task,
+            self.backup_window.deadline,
+            extra={"phase": "deferred"},
+        )
+        with self.lock:
+            self.deferred.append(task)
+        self._record_outcome(task.members(), DEFERRED)
+
+    def _record_outcome(self, tasks, outcome):
+        if self.outcomes is None:
+            return
+        for task in tasks:
+            self.outcomes.record(task.name, outcome)
+
+    def _record_duration(self, task, result, seconds):
+        if self.history is not None and result == 0:
+            self.history.record(task.name, seconds)
+
+    def _commit_scan(self, task, result):
+        if self.prescan is not None and result == 0:
+            self.prescan.commit(task)
+
+    def _report_deferred_tasks(self):
+        if not self.deferred:
+            return
+        names = ", ".join(str(task) for task in self.deferred)
+        deadline = self.backup_window.deadline
+        self.deferred[0].notify.message(f"Deferred to finish by {deadline}: {names}")
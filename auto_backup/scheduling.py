@@ -0,0 +1,84 @@
+import datetime
+import math
+import re
+
+from auto_backup.durations import parse_duration
+
+DEADLINE_PATTERN = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+
+class TaskOrdering(object):
+    POLICIES = (
+        "file",
+        "longest-first",
+        "shortest-first",
+        "priority",
+        "most-changed-first",
+    )
+
+    def __init__(self, policy, history, prescan=None):
+        if policy not in self.POLICIES:
+            raise ValueError(
+                f"Unknown task order '{policy}', use one of {', '.join(self.POLICIES)}"
+            )
+        if policy == "most-changed-first" and prescan is None:
+            raise ValueError("Task order 'most-changed-first' requires prescan")
+        self.policy = policy
+        self.history = history
+        self.prescan = prescan
+
+    def order(self, tasks):
+        tasks = list(tasks)
+        if self.policy == "longest-first":
+            return sorted(tasks, key=self._estimate, reverse=True)
+        if self.policy == "shortest-first":
+            return sorted(tasks, key=self._estimate)
+        if self.policy == "priority":
+            return sorted(tasks, key=lambda t: t.priority, reverse=True)
+        if self.policy == "most-changed-first":
+            self.prescan.run(tasks)
+            return sorted(tasks, key=self._changed_bytes, reverse=True)
+        return tasks
+
+    def _changed_bytes(self, task):
+        return task.scan.changed_bytes if task.scan else -1
+
+    def _estimate(self, task):
+        estimate = self.history.estimate(task.name)
+        return math.inf if estimate is None else estimate
+
+
+class BackupWindow(object):
+    def __init__(self, deadline, now=None, length="12h"):
+        self.deadline = deadline
+        self.end = self._next_occurrence(deadline, now or datetime.datetime.now())
+        self.start = self.end - self._parse_length(length)
+
+    def _next_occurrence(self, deadline, now):
+        match = DEADLINE_PATTERN.match(str(deadline))
+        if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+            raise ValueError(f"Invalid deadline '{deadline}', use e.g. '06:30'")
+        hour, minute = int(match.group(1)), int(match.group(2))
+        end = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return end if end > now else end + datetime.timedelta(days=1)
+
+    def _parse_length(self, length):
+        duration = parse_duration(length)
+        if not datetime.timedelta(0) < duration <= datetime.timedelta(days=1):
+            raise ValueError(f"Invalid backup window '{length}', use at most 24h")
+        return duration
+
+    def contains(self, now=None):
+        now = now or datetime.datetime.now()
+        return self.start <= now < self.end
+
+    def seconds_left(self, now=None):
+        now = now or datetime.datetime.now()
+        return (self.end - now).total_seconds()
+
+    def leaves_time_for(self, estimate, offset=0, now=None):
+        if not self.contains(now):
+            return False
+        if estimate is None:
+            return True
+        return offset + estimate <= self.seconds_left(now)
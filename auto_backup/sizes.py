@@ -0,0 +1,23 @@
+import re
+
+DECIMAL_UNITS = ("B", "kB", "MB", "GB", "TB", "PB", "EB")
+SIZE_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*([kMGTPE]?B)\s*$")
+
+
+def format_size(num_bytes):
+    size = float(num_bytes)
+    for unit in DECIMAL_UNITS[:-1]:
+        if abs(size) < 1000:
+            break
+        size /= 1000
+    else:
+        unit = DECIMAL_UNITS[-1]
+    return f"{int(size)} B" if unit == "B" else f"{size:.2f} {unit}"
+
+
+def parse_size(text):
+    match = SIZE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid size '{text}'")
+    exponent = DECIMAL_UNITS.index(match.group(2))
+    return int(round(float(match.group(1)) * 1000**exponent))
@@ -0,0 +1,157 @@
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from auto_backup.structured_log import current_task_name
+from auto_backup.tasks import run_checked_subprocess
+
+logger = logging.getLogger(__name__)
+
+SSH_URL_PATTERN = re.compile(r"^ssh://(?:([^@/]+)@)?([^:/]+)(?::(\d+))?/")
+SCP_URL_PATTERN = re.compile(r"^(?:([^@/:]+)@)?([^/:]+):(?!//)")
+
+
+class SshDestination(object):
+    def __init__(self, user, host, port):
+        self.user = user
+        self.host = host
+        self.port = port
+
+    @classmethod
+    def from_repository_url(cls, url):
+        match = SSH_URL_PATTERN.match(url)
+        if match:
+            return cls(*match.groups())
+        match = SCP_URL_PATTERN.match(url)
+        if match:
+            return cls(match.group(1), match.group(2), None)
+        return None
+
+    @property
+    def key(self):
+        return (self.user, self.host, self.port)
+
+    def arguments(self):
+        port = ["-p", self.port] if self.port else []
+        target = f"{self.user}@{self.host}" if self.user else self.host
+        return port + [target]
+
+    def __str__(self):
+        return self.arguments()[-1]
+
+
+class SshMultiplexer(object):
+    def __init__(self, persist="10m", run_subprocess=run_checked_subprocess):
+        self.persist = persist
+        self.run_subprocess = run_subprocess
+        self.control_dir = None
+        self.masters = dict()
+        self.host_locks = dict()
+        self.lock = threading.Lock()
+
+    def rsh_command(self, url, ssh_command):
+        destination = SshDestination.from_repository_url(url)
+        if destination is None:
+            return ssh_command
+        ssh = shlex.split(ssh_command or "ssh")
+        if not self._ensure_master(destination, ssh):
+            return ssh_command
+        options = [
+            "-o",
+            f"ControlPath={self._control_path()}",
+            "-o",
+            "ControlMaster=no",
+        ]
+        return " ".join(shlex.quote(arg) for arg in ssh + options)
+
+    def _ensure_master(self, destination, ssh):
+        key = (destination.key, tuple(ssh))
+        host_lock = self._get_host_lock(key)
+        self._acquire_host_lock(host_lock, destination)
+        try:
+            if key not in self.masters:
+                self.masters[key] = self._start_master(destination, ssh)
+            return self.masters[key] is not None
+        finally:
+            host_lock.release()
+
+    def _get_host_lock(self, key):
+        with self.lock:
+            self._control_path()
+            return self.host_locks.setdefault(key, threading.Lock())
+
+    def _acquire_host_lock(self, host_lock, destination):
+        if host_lock.acquire(blocking=False):
+            return
+        started = time.monotonic()
+        host_lock.acquire()
+        duration = time.monotonic() - started
+        logger.info(
+            "Waited %.1fs for SSH connection to %s",
+            duration,
+            destination,
+            extra={"phase": "ssh_wait", "duration": duration},
+        )
+
+    def _start_master(self, destination, ssh):
+        started = time.monotonic()
+        args = ssh + self._master_options() + destination.arguments()
+        try:
+            self.run_subprocess(args, stdin=subprocess.DEVNULL)
+        except Exception as error:
+            logger.warning("SSH connection to %s failed: %s", destination, error)
+            return None
+        duration = time.monotonic() - started
+        logger.info(
+            "SSH connection to %s set up in %.1fs by %s",
+            destination,
+            duration,
+            current_task_name() or "the run",
+            extra={"phase": "ssh_setup", "duration": duration},
+        )
+        return destination
+
+    def _master_options(self):
+        return [
+            "-f",
+            "-N",
+            "-o",
+            "ControlMaster=yes",
+            "-o",
+            f"ControlPersist={self.persist}",
+            "-o",
+            f"ControlPath={self._control_path()}",
+        ]
+
+    def _control_path(self):
+        if self.control_dir is None:
+            self.control_dir = tempfile.mkdtemp(prefix="auto-backup-ssh-")
+        return os.path.join(self.control_dir, "%C")
+
+    def shutdown(self):
+        for (_, ssh), destination in self.masters.items():
+            if destination is not None:
+                self._stop_master(destination, list(ssh))
+        self.masters.clear()
+        self.host_locks.clear()
+        if self.control_dir:
+            shutil.rmtree(self.control_dir, ignore_errors=True)
+            self.control_dir = None
+
+    def _stop_master(self, destination, ssh):
+        control_path = ["-o", f"ControlPath={self._control_path()}"]
+        args = ssh + control_path + ["-O", "exit"] + destination.arguments()
+        try:
+            self.run_subprocess(
+                args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        except Exception as error:
+            logger.warning(
+                "Closing SSH connection to %s failed: %s", destination, error
+            )
@@ -0,0 +1,51 @@
+import contextlib
+import json
+import os
+import tempfile
+
+DEFAULT_STATE_DIR = "~/.local/state/auto-backup"
+
+
+class StateDirectory(object):
+    def __init__(self, path=DEFAULT_STATE_DIR):
+        self.path = os.path.expanduser(path)
+
+    def file_path(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self, name):
+        return os.path.exists(self.file_path(name))
+
+    def load(self, name, default=None):
+        try:
+            with open(self.file_path(name)) as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return default
+
+    def save(self, name, value):
+        with self.open_for_writing(name) as state_file:
+            json.dump(value, state_file, indent=2, sort_keys=True)
+
+    def remove(self, name):
+        try:
+            os.remove(self.file_path(name))
+        except FileNotFoundError:
+            pass
+
+    def open_for_reading(self, name):
+        return open(self.file_path(name))
+
+    @contextlib.contextmanager
+    def open_for_writing(self, name):
+        target = self.file_path(name)
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "w") as state_file:
+                yield state_file
+            os.replace(temporary, target)
+        except BaseException:
+            os.unlink(temporary)
+            raise
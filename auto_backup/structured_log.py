@@ -0,0 +1,110 @@
+import contextlib
+import datetime
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger(__name__)
+borg_logger = logging.getLogger("auto_backup.borg")
+
+CONTEXT_FIELDS = ("run_id", "task", "type", "tags")
+EXTRA_FIELDS = ("phase", "duration", "result", "exit_code", "scan", "borg")
+
+_context = threading.local()
+_run = {"run_id": None}
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def set_run_id(run_id):
+    _run["run_id"] = run_id
+
+
+@contextlib.contextmanager
+def task_context(task):
+    previous = getattr(_context, "task", None)
+    _context.task = {
+        "task": str(task),
+        "type": type(task.command).__name__,
+        "tags": sorted(task.tags),
+    }
+    try:
+        yield
+    finally:
+        _context.task = previous
+
+
+def current_task_name():
+    return (getattr(_context, "task", None) or {}).get("task")
+
+
+class RunContextFilter(logging.Filter):
+    def filter(self, record):
+        record.run_id = _run["run_id"]
+        for key, value in (getattr(_context, "task", None) or {}).items():
+            setattr(record, key, value)
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS + EXTRA_FIELDS:
+            if getattr(record, field, None) is not None:
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _gzip_namer(name):
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source, destination):
+    with open(source, "rb") as plain, gzip.open(destination, "wb") as compressed:
+        shutil.copyfileobj(plain, compressed)
+    os.remove(source)
+
+
+def create_json_log_handler(path, max_bytes=10 * 1000 * 1000, backup_count=5):
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonLinesFormatter())
+    handler.addFilter(RunContextFilter())
+    return handler
+
+
+def log_borg_json_output(lines):
+    for line in lines:
+        if line.strip():
+            _log_borg_line(line.rstrip("\n"))
+
+
+def _log_borg_line(line):
+    try:
+        event = json.loads(line)
+    except ValueError:
+        borg_logger.info(line)
+        return
+    if event.get("type") == "log_message":
+        level = logging.getLevelName(event.get("levelname", "INFO"))
+        level = level if isinstance(level, int) else logging.INFO
+        borg_logger.log(level, event.get("message", ""), extra={"borg": event})
+    else:
+        borg_logger.debug(event.get("type", "event"), extra={"borg": event})
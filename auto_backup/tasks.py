@@ -1,20 +1,52 @@
+import bisect
+import collections
+import contextlib
 import datetime
+import hashlib
 import json
+import logging
 import os
 import subprocess
-import traceback
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 
 from dateutil.parser import isoparse
 
+from auto_backup.archive_cache import ArchiveCache, BorgArchiveList, CachedArchiveList
 from auto_backup.argument_assigner import assign_arguments_to_self
+from auto_backup.compaction import (
+    CompactionTracker,
+    parse_compaction_freed_bytes,
+    parse_prune_stats,
+)
+from auto_backup.compression_bench import CompressionProfiles
+from auto_backup.config import as_list
+from auto_backup.durations import format_duration, parse_duration
+from auto_backup.passwords import PasswordResolver
+from auto_backup.patterns import patterns_file, read_exclude_file
+from auto_backup.profiles import BackupProfiles
+from auto_backup.rclone_sync import RcloneSyncTracker
+from auto_backup.sizes import format_size
+from auto_backup.structured_log import log_borg_json_output
+
+logger = logging.getLogger(__name__)
+
+EXIT_GRACE_SECONDS = 1.0
 
 
 class Task(object):
-    def __init__(self, name, tags, command, notify):
+    def __init__(self, name, tags, command, notify, priority=0, watch=False):
         self.name = name
         self.tags = set(tags)
         self.command = command
         self.notify = notify
+        self.priority = priority
+        self.watch = watch
+        self.scan = None
 
     def __str__(self):
         return self.name
@@ -22,12 +54,18 @@ class Task(object):
     def is_active(self, activeTags):
         return not self.tags.isdisjoint(activeTags)
 
+    def members(self):
+        return [self]
+
+    def failed_members(self):
+        return [self]
+
     def safe_execute(self):
         try:
             self.command.execute()
             return 0
         except Exception:
-            traceback.print_exc()
+            logger.exception("Task %s failed", self)
             self.notify.task_failed(self)
             return 1
 
@@ -36,44 +74,245 @@ def run_checked_subprocess(args, **kwargs):
     return subprocess.run(args, check=True, **kwargs)
 
 
+def forward_to_stderr(output):
+    if output:
+        sys.stderr.write(output)
+
+
+_repository_locks = collections.defaultdict(threading.RLock)
+_repository_locks_guard = threading.Lock()
+
+
+def repository_lock(url):
+    with _repository_locks_guard:
+        return _repository_locks[url]
+
+
+class SubprocessWatchdog(object):
+    def __init__(self, process, timeout):
+        self.process = process
+        self.timeout = timeout
+        self.expired = False
+        self.timer = threading.Timer(timeout, self._kill) if timeout else None
+
+    def __enter__(self):
+        if self.timer:
+            self.timer.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timer:
+            self.timer.cancel()
+
+    def _kill(self):
+        self.expired = True
+        self.process.kill()
+
+    def raise_if_expired(self):
+        if self.expired:
+            raise subprocess.TimeoutExpired(self.process.args, self.timeout)
+
+
+def _wait_for_exit(process, grace=EXIT_GRACE_SECONDS):
+    try:
+        return process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        return None
+
+
+@contextlib.contextmanager
+def stream_checked_subprocess(args, timeout=None, stream="stdout", **kwargs):
+    kwargs[stream] = subprocess.PIPE
+    process = subprocess.Popen(args, universal_newlines=True, **kwargs)
+    with process, SubprocessWatchdog(process, timeout) as watchdog:
+        try:
+            yield getattr(process, stream)
+        except Exception as error:
+            returncode = _wait_for_exit(process)
+            if returncode is None:
+                process.kill()
+            watchdog.raise_if_expired()
+            if returncode:
+                raise subprocess.CalledProcessError(returncode, args) from error
+            raise
+        returncode = process.wait()
+    watchdog.raise_if_expired()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, args)
+
+
 class TestFailTask(object):
     def execute(self):
         raise RuntimeError("Task failed")
 
 
 class RcloneCommand(object):
+    MODES = ("sync", "topup")
+
     def __init__(
-        self, config_file, source, destination, run_subprocess=run_checked_subprocess
+        self,
+        config_file,
+        source,
+        destination,
+        mode="sync",
+        full_sync_every="7d",
+        bandwidth=None,
+        rclone_daemons=None,
+        state=None,
+        run_subprocess=run_checked_subprocess,
     ):
         assign_arguments_to_self()
 
-    def execute(self):
-        args = (
-            "rclone",
-            "--verbose",
-            "--config",
-            self.config_file,
-            "sync",
-            self.source,
-            self.destination,
-        )
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown rclone mode '{self.mode}'")
+        self.sync_tracker = self._create_sync_tracker()
 
-        self.run_subprocess(args)
+    def _create_sync_tracker(self):
+        if self.mode != "topup" or self.state is None:
+            return None
+        name = hashlib.sha1(f"{self.source}\0{self.destination}".encode()).hexdigest()
+        return RcloneSyncTracker(self.state, name, self.full_sync_every)
+
+    def execute(self):
+        started = time.time()
+        max_age = self._get_top_up_max_age(started)
+        self._transfer(max_age)
+        if self.sync_tracker:
+            self.sync_tracker.record(started, full=max_age is None)
+
+    def _get_top_up_max_age(self, now):
+        if self.sync_tracker is None:
+            return None
+        max_age = self.sync_tracker.top_up_max_age(now)
+        if max_age is None:
+            logger.info("Running full rclone sync of %s", self.source)
+        else:
+            logger.info("Copying files of %s newer than %ss", self.source, max_age)
+        return max_age
+
+    def _transfer(self, max_age):
+        if self.rclone_daemons:
+            self._transfer_with_daemon(max_age)
+        else:
+            self._run_rclone(max_age)
+
+    def _transfer_with_daemon(self, max_age):
+        daemon = self.rclone_daemons.get(self.config_file)
+        if max_age is None:
+            daemon.sync(self.source, self.destination)
+        else:
+            daemon.copy(self.source, self.destination, max_age)
+
+    def _run_rclone(self, max_age):
+        args = ["rclone", "--verbose", "--config", self.config_file]
+        self._append_bandwidth_limit(args)
+        if max_age is None:
+            args.append("sync")
+        else:
+            args.extend(("copy", "--max-age", f"{max_age}s"))
+        args.extend((self.source, self.destination))
+
+        self.run_subprocess(tuple(args))
+
+    def _append_bandwidth_limit(self, args):
+        bwlimit = self.bandwidth.rclone_bwlimit() if self.bandwidth else None
+        if bwlimit:
+            args.extend(("--bwlimit", bwlimit))
 
 
 class BorgSubprocessEnvironment:
-    def __init__(self, password, ssh_command):
+    def __init__(
+        self,
+        resolve_password,
+        ssh_command,
+        cache_dir=None,
+        security_dir=None,
+        url=None,
+        ssh_multiplexer=None,
+    ):
         assign_arguments_to_self()
+        self.environment = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_repository(
+        cls,
+        repository_config,
+        ssh_command,
+        ssh_multiplexer=None,
+        passwords=None,
+        environments=None,
+    ):
+        passwords = passwords or PasswordResolver()
+        passwords.validate(repository_config)
+        if environments is None:
+            return cls._create(
+                repository_config, ssh_command, ssh_multiplexer, passwords
+            )
+        key = (
+            repository_config["url"],
+            ssh_command,
+            repository_config.get("cache_dir"),
+            repository_config.get("security_dir"),
+        )
+        return environments.get(
+            key,
+            lambda: cls._create(
+                repository_config, ssh_command, ssh_multiplexer, passwords
+            ),
+        )
+
+    @classmethod
+    def _create(cls, repository_config, ssh_command, ssh_multiplexer, passwords):
+        return cls(
+            lambda: passwords.resolve(repository_config),
+            ssh_command,
+            cache_dir=repository_config.get("cache_dir"),
+            security_dir=repository_config.get("security_dir"),
+            url=repository_config["url"],
+            ssh_multiplexer=ssh_multiplexer,
+        )
 
     def build(self):
+        with self.lock:
+            if self.environment is None:
+                self.environment = self._build_environment()
+            return dict(self.environment)
+
+    def _build_environment(self):
         env = os.environ.copy()
-        env["BORG_PASSPHRASE"] = self.password
+        env["BORG_PASSPHRASE"] = self.resolve_password()
+
+        rsh_command = self._get_rsh_command()
+        if rsh_command:
+            env["BORG_RSH"] = rsh_command
 
-        if self.ssh_command:
-            env["BORG_RSH"] = self.ssh_command
+        self._set_optional_directory(env, "BORG_CACHE_DIR", self.cache_dir)
+        self._set_optional_directory(env, "BORG_SECURITY_DIR", self.security_dir)
 
         return env
 
+    def _get_rsh_command(self):
+        if self.ssh_multiplexer and self.url:
+            return self.ssh_multiplexer.rsh_command(self.url, self.ssh_command)
+        return self.ssh_command
+
+    def _set_optional_directory(self, env, key, directory):
+        if directory:
+            env[key] = os.path.expanduser(directory)
+
+
+class BorgEnvironments(object):
+    def __init__(self):
+        self.environments = dict()
+        self.lock = threading.Lock()
+
+    def get(self, key, create):
+        with self.lock:
+            if key not in self.environments:
+                self.environments[key] = create()
+            return self.environments[key]
+
 
 class BackupCommand(object):
     def __init__(
@@ -82,43 +321,191 @@ class BackupCommand(object):
         repository,
         config,
         excludes=[],
+        exclude_from=[],
+        exclude_if_present=[],
         ssh_command=None,
+        group=None,
+        compression=None,
+        profile=None,
+        cache_prewarmer=None,
+        bandwidth=None,
+        ssh_multiplexer=None,
+        passwords=None,
+        borg_environments=None,
+        log_json=False,
+        state=None,
         run_subprocess=run_checked_subprocess,
+        stream_subprocess=stream_checked_subprocess,
     ):
         assign_arguments_to_self()
 
         repoConf = config["repositories"][self.repository]
         self.url = repoConf["url"]
-        self.subprocess_environment = BorgSubprocessEnvironment(
-            repoConf["password"], ssh_command
+        self.subprocess_environment = BorgSubprocessEnvironment.for_repository(
+            repoConf, ssh_command, ssh_multiplexer, passwords, borg_environments
         )
+        self.backup_profile = self._load_backup_profile(config)
+        self.exclude_from = as_list(exclude_from)
+        self.exclude_if_present = as_list(exclude_if_present)
+
+    def _load_backup_profile(self, config):
+        if self.profile is None:
+            return None
+        return BackupProfiles.from_config(config).get(self.profile)
 
     def execute(self):
-        args = self._build_backup_command_call()
-        env = self.subprocess_environment.build()
-        self.run_subprocess(args, cwd=self.source, env=env)
+        excludes = self.exclude_patterns()
+        archive = self.create_archive(
+            excludes, self.exclude_if_present, ["."], cwd=self.source
+        )
+        self.record_archive(archive)
+
+    def exclude_patterns(self):
+        patterns = list(self.excludes)
+        for path in self.exclude_from:
+            patterns.extend(read_exclude_file(path))
+        return list(dict.fromkeys(patterns))
+
+    def create_archive(self, excludes, markers, paths, cwd):
+        logger.info("Excluding %d pattern(s) from %s", len(excludes), cwd)
+        with patterns_file(excludes) as patterns:
+            args = self.build_create_call(patterns, markers, paths)
+            return self._parse_archive_name(self.run_borg(args, cwd=cwd))
+
+    def _parse_archive_name(self, output):
+        try:
+            return json.loads(output)["archive"]["name"]
+        except (TypeError, ValueError, KeyError):
+            logger.warning("Can't read the archive name from the borg output")
+            return None
+
+    def record_archive(self, archive):
+        if self.state is not None and archive:
+            self.state.save(self._archive_file_name(), {"archive": archive})
+
+    def last_archive(self):
+        if self.state is None:
+            return None
+        return self.state.load(self._archive_file_name(), {}).get("archive")
+
+    def _archive_file_name(self):
+        key = f"{self.url}\0{os.path.abspath(self.source)}".encode()
+        return os.path.join("archives", f"{hashlib.sha1(key).hexdigest()[:12]}.json")
+
+    def group_key(self):
+        return (
+            self.group,
+            self.repository,
+            self.ssh_command,
+            self.compression,
+            self.profile,
+        )
 
-    def _build_backup_command_call(self):
+    def build_create_call(self, patterns, markers, paths):
         backup_call = self._get_backup_call_base_arguments()
-        self._append_exclude_options(backup_call)
+        self._append_profile_options(backup_call)
+        self._append_upload_ratelimit(backup_call)
+        self._append_compression(backup_call)
+        self._append_exclude_options(backup_call, patterns, markers)
+        backup_call.append("--json")
         self._append_archive(backup_call)
-        self._append_directory(backup_call)
+        backup_call.extend(paths)
         return tuple(backup_call)
 
+    def cache_prewarm_target(self):
+        return (self.url, self.subprocess_environment)
+
+    def run_borg(self, args, cwd):
+        if self.cache_prewarmer:
+            self.cache_prewarmer.wait_for(self.url)
+        if self.backup_profile:
+            logger.info("Using backup profile '%s' for %s", self.profile, cwd)
+        env = self.subprocess_environment.build()
+        with repository_lock(self.url):
+            return self._run_borg_subprocess(args, cwd, env)
+
+    def _run_borg_subprocess(self, args, cwd, env):
+        try:
+            output = self._run_borg_process(args, cwd, env)
+        except subprocess.CalledProcessError as error:
+            self._log_borg_exit_code(error.returncode)
+            raise
+        self._log_borg_exit_code(0)
+        return output
+
+    def _run_borg_process(self, args, cwd, env):
+        if not self.log_json:
+            result = self.run_subprocess(
+                args, cwd=cwd, env=env, stdout=subprocess.PIPE, universal_newlines=True
+            )
+            return result.stdout
+        with tempfile.TemporaryFile("w+") as output:
+            with self.stream_subprocess(
+                args, cwd=cwd, env=env, stream="stderr", stdout=output
+            ) as borg_log:
+                log_borg_json_output(borg_log)
+            output.seek(0)
+            return output.read()
+
+    def _log_borg_exit_code(self, returncode):
+        logger.info(
+            "Borg exited with code %d", returncode, extra={"exit_code": returncode}
+        )
+
     def _get_backup_call_base_arguments(self):
+        if self.log_json:
+            return ["borg", "--verbose", "--log-json", "create"]
         return ["borg", "--verbose", "create"]
 
-    def _append_exclude_options(self, backup_call):
-        for exclude in self.excludes:
-            backup_call.append("--exclude")
-            backup_call.append(exclude)
+    def _append_profile_options(self, backup_call):
+        if self.backup_profile:
+            backup_call.extend(self.backup_profile.arguments)
+
+    def _append_upload_ratelimit(self, backup_call):
+        limits = [self._get_profile_upload_ratelimit(), self._get_scheduled_ratelimit()]
+        limits = [limit for limit in limits if limit]
+        if limits:
+            backup_call.append("--upload-ratelimit")
+            backup_call.append(str(min(limits)))
+
+    def _get_profile_upload_ratelimit(self):
+        return self.backup_profile.upload_ratelimit if self.backup_profile else None
+
+    def _get_scheduled_ratelimit(self):
+        if self.bandwidth is None:
+            return None
+        return self.bandwidth.borg_upload_ratelimit(datetime.datetime.now())
+
+    def _append_compression(self, backup_call):
+        compression = self._resolve_compression()
+        if compression:
+            backup_call.append("--compression")
+            backup_call.append(compression)
+
+    def _resolve_compression(self):
+        compression = self._get_requested_compression()
+        if compression != "recommended":
+            return compression
+        if self.state is None:
+            return None
+        return CompressionProfiles(self.state).load(self.source)
+
+    def _get_requested_compression(self):
+        if self.compression or not self.backup_profile:
+            return self.compression
+        return self.backup_profile.compression
+
+    def _append_exclude_options(self, backup_call, patterns, markers):
+        if patterns:
+            backup_call.append("--patterns-from")
+            backup_call.append(patterns)
+        for marker in markers:
+            backup_call.append("--exclude-if-present")
+            backup_call.append(marker)
 
     def _append_archive(self, backup_call):
         backup_call.append(f"{self.url}::{{hostname}}-{{now}}")
 
-    def _append_directory(self, backup_call):
-        backup_call.append(".")
-
 
 class PruneBackupsCommand(object):
     def __init__(
@@ -131,20 +518,83 @@ class PruneBackupsCommand(object):
         monthly=None,
         dry_run=False,
         ssh_command=None,
+        compact_threshold=None,
+        ssh_multiplexer=None,
+        passwords=None,
+        borg_environments=None,
+        state=None,
         run_subprocess=run_checked_subprocess,
     ):
         assign_arguments_to_self()
 
         repoConf = config["repositories"][self.repository]
         self.url = repoConf["url"]
-        self.subprocess_environment = BorgSubprocessEnvironment(
-            repoConf["password"], ssh_command
+        self.subprocess_environment = BorgSubprocessEnvironment.for_repository(
+            repoConf, ssh_command, ssh_multiplexer, passwords, borg_environments
         )
 
     def execute(self):
+        with repository_lock(self.url):
+            self._prune_and_compact()
+
+    def _prune_and_compact(self):
+        output = self._run_prune()
+        if self._is_compaction_tracked():
+            self._compact_if_threshold_exceeded(output)
+
+    def _is_compaction_tracked(self):
+        return self.compact_threshold is not None and not self.dry_run
+
+    def _run_prune(self):
         args = self._build_prune_command_call()
         env = self.subprocess_environment.build()
-        self.run_subprocess(args, env=env)
+        try:
+            result = self.run_subprocess(
+                args, env=env, stderr=subprocess.PIPE, universal_newlines=True
+            )
+        except subprocess.CalledProcessError as error:
+            forward_to_stderr(error.stderr)
+            raise
+        forward_to_stderr(result.stderr)
+        self._invalidate_archive_cache()
+        return result.stderr
+
+    def _invalidate_archive_cache(self):
+        if self.state is not None and not self.dry_run:
+            ArchiveCache(self.state, self.repository).invalidate()
+
+    def _compact_if_threshold_exceeded(self, output):
+        stats = parse_prune_stats(output)
+        if stats is None:
+            logger.warning(
+                "No prune statistics for %s, not compacting", self.repository
+            )
+            return
+        tracker = CompactionTracker(self.state, self.repository, self.compact_threshold)
+        if tracker.record_freed(*stats):
+            self._create_compact_command().execute()
+        else:
+            self._report_skipped_compaction(tracker)
+
+    def _create_compact_command(self):
+        return CompactCommand(
+            self.repository,
+            self.config,
+            ssh_command=self.ssh_command,
+            ssh_multiplexer=self.ssh_multiplexer,
+            passwords=self.passwords,
+            state=self.state,
+            run_subprocess=self.run_subprocess,
+        )
+
+    def _report_skipped_compaction(self, tracker):
+        logger.info(
+            "Skipping compaction of %s: %s (%.1f%%) freeable, threshold is %s%%",
+            self.repository,
+            format_size(tracker.pending_bytes),
+            tracker.ratio * 100,
+            self.compact_threshold,
+        )
 
     def _build_prune_command_call(self):
         prune_call = self._get_prune_call_base_arguments()
@@ -170,6 +620,70 @@ class PruneBackupsCommand(object):
         prune_call.append(self.url)
 
 
+class CompactCommand(object):
+    def __init__(
+        self,
+        repository,
+        config,
+        threshold=None,
+        ssh_command=None,
+        ssh_multiplexer=None,
+        passwords=None,
+        borg_environments=None,
+        state=None,
+        run_subprocess=run_checked_subprocess,
+    ):
+        assign_arguments_to_self()
+
+        repoConf = config["repositories"][self.repository]
+        self.url = repoConf["url"]
+        self.subprocess_environment = BorgSubprocessEnvironment.for_repository(
+            repoConf, ssh_command, ssh_multiplexer, passwords, borg_environments
+        )
+
+    def execute(self):
+        with repository_lock(self.url):
+            freed_bytes = self._compact()
+        CompactionTracker(self.state, self.repository, self.threshold).reset()
+        return freed_bytes
+
+    def _compact(self):
+        started = time.monotonic()
+        output = self._run_compact()
+        freed_bytes = parse_compaction_freed_bytes(output)
+        self._report_result(freed_bytes, time.monotonic() - started)
+        return freed_bytes
+
+    def _run_compact(self):
+        args = self._build_compact_command_call()
+        env = self.subprocess_environment.build()
+        try:
+            result = self.run_subprocess(
+                args, env=env, stderr=subprocess.PIPE, universal_newlines=True
+            )
+        except subprocess.CalledProcessError as error:
+            forward_to_stderr(error.stderr)
+            raise
+        forward_to_stderr(result.stderr)
+        return result.stderr
+
+    def _build_compact_command_call(self):
+        compact_call = ["borg", "--verbose", "compact"]
+        if self.threshold is not None:
+            compact_call.extend(("--threshold", str(self.threshold)))
+        compact_call.append(self.url)
+        return tuple(compact_call)
+
+    def _report_result(self, freed_bytes, duration):
+        freed = "unknown space" if freed_bytes is None else format_size(freed_bytes)
+        logger.info(
+            "Compaction of %s reclaimed %s in %s",
+            self.repository,
+            freed,
+            format_duration(duration),
+        )
+
+
 class CheckBackupsCommand(object):
     def __init__(
         self,
@@ -177,7 +691,17 @@ class CheckBackupsCommand(object):
         config,
         notify,
         ssh_command=None,
-        run_subprocess=run_checked_subprocess,
+        windows=["24h"],
+        alerts={},
+        max_workers=4,
+        timeout=None,
+        cache_archives=True,
+        full_list_every="7d",
+        ssh_multiplexer=None,
+        passwords=None,
+        borg_environments=None,
+        state=None,
+        stream_subprocess=stream_checked_subprocess,
     ):
         assign_arguments_to_self()
 
@@ -185,50 +709,118 @@ class CheckBackupsCommand(object):
             dict(name=name, **config["repositories"][name])
             for name in self.repositories
         ]
+        self.windows = [(w, parse_duration(w)) for w in self.windows]
+        self.alerts = [(w, parse_duration(w), n) for w, n in self.alerts.items()]
+        self.full_list_every = parse_duration(full_list_every).total_seconds()
 
     def execute(self):
-        lines = [
-            self._get_message_line_for_repository(repo) for repo in self.repositories
-        ]
+        lines = self._get_message_lines_for_repositories()
         self.notify.message(self._format_final_message(lines))
 
+    def _get_message_lines_for_repositories(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            lines = executor.map(self._get_safe_message_line, self.repositories)
+            return list(lines)
+
+    def _get_safe_message_line(self, repository):
+        try:
+            return self._get_message_line_for_repository(repository)
+        except Exception as error:
+            return self._format_error_line(repository, error)
+
     def _get_message_line_for_repository(self, repository):
-        num_today, total = self._count_archives_for_repository(repository)
-        return self._format_message_line(repository, num_today, total)
+        timeline = self._collect_archive_timeline(repository)
+        return self._format_message_line(repository, timeline.sorted(), time.time())
+
+    def _collect_archive_timeline(self, repository):
+        timeline = ArchiveTimeline()
+        archive_list = self._get_archive_list_for_repository(repository)
+        with repository_lock(repository["url"]):
+            archive_list.for_each_archive(timeline.add)
+        return timeline
+
+    def _get_archive_list_for_repository(self, repository):
+        env = self._build_subprocess_environment(repository)
+        archive_list = BorgArchiveList(
+            repository["url"], env, self.stream_subprocess, self.timeout
+        )
+        if self.state is None or not self.cache_archives:
+            return archive_list
+        cache = ArchiveCache(self.state, repository["name"])
+        return CachedArchiveList(
+            archive_list, cache, full_list_every=self.full_list_every
+        )
+
+    def _build_subprocess_environment(self, repository):
+        return BorgSubprocessEnvironment.for_repository(
+            repository,
+            self.ssh_command,
+            self.ssh_multiplexer,
+            self.passwords,
+            self.borg_environments,
+        ).build()
+
+    def _format_message_line(self, repository, timeline, now):
+        parts = [f"{repository['name']}:"]
+        parts.extend(self._format_window_counts(timeline, now))
+        parts.append(f"{timeline.total} (total)")
+        parts.append(f"newest: {self._format_newest_age(timeline, now)}")
+        parts.extend(self._format_alerts(timeline, now))
+        return " ".join(parts)
+
+    def _format_window_counts(self, timeline, now):
+        for label, window in self.windows:
+            yield f"{timeline.count_within(window, now)} ({label})"
+
+    def _format_newest_age(self, timeline, now):
+        if timeline.newest is None:
+            return "never"
+        return f"{format_duration(now - timeline.newest)} ago"
+
+    def _format_alerts(self, timeline, now):
+        for label, window, minimum in self.alerts:
+            count = timeline.count_within(window, now)
+            if count < minimum:
+                yield f"ALERT: {count} < {minimum} ({label})"
+
+    def _format_error_line(self, repository, error):
+        return f"{repository['name']}: error ({self._describe_error(error)})"
+
+    def _describe_error(self, error):
+        if isinstance(error, subprocess.TimeoutExpired):
+            return f"timed out after {error.timeout}s"
+        if isinstance(error, subprocess.CalledProcessError):
+            return f"borg exited with status {error.returncode}"
+        return str(error) or type(error).__name__
+
+    def _format_final_message(self, lines):
+        results = "\n".join(lines)
+        return f"Backup check results:\n{results}"
 
-    def _count_archives_for_repository(self, repository):
-        process_result = self._call_borg_list_for_repository(repository)
-        parsed_output = json.loads(process_result.stdout)
-        return self._sum_last_day_and_total(parsed_output)
 
-    def _call_borg_list_for_repository(self, repository):
-        args = self._build_list_command_call(repository["url"])
-        env = self._build_subprocess_environment(repository["password"])
-        return self.run_subprocess(args, env=env, capture_output=True)
+class ArchiveTimeline(object):
+    def __init__(self):
+        self.timestamps = array("d")
 
-    def _build_list_command_call(self, repository):
-        return ("borg", "list", "--json", repository)
+    def add(self, archive):
+        self.timestamps.append(isoparse(archive["start"]).timestamp())
 
-    def _build_subprocess_environment(self, password):
-        return BorgSubprocessEnvironment(password, self.ssh_command).build()
+    def sorted(self):
+        return SortedArchiveTimeline(sorted(self.timestamps))
 
-    def _sum_last_day_and_total(self, borg_list_output):
-        start_dates = self._get_archive_dates(borg_list_output)
-        num_today = self._archives_within_24h(start_dates)
-        return (num_today, len(start_dates))
 
-    def _get_archive_dates(self, borg_list_output):
-        start_dates_iso = map(lambda a: a["start"], borg_list_output["archives"])
-        return list(map(isoparse, start_dates_iso))
+class SortedArchiveTimeline(object):
+    def __init__(self, sorted_timestamps):
+        self.timestamps = sorted_timestamps
 
-    def _archives_within_24h(self, start_dates):
-        now = datetime.datetime.now()
-        one_day_delta = datetime.timedelta(days=1)
-        return sum(map(lambda d: 1 if now - d < one_day_delta else 0, start_dates))
+    @property
+    def total(self):
+        return len(self.timestamps)
 
-    def _format_message_line(self, repository, num_today, total):
-        return f"{repository['name']}: {num_today} (24h) {total} (total)"
+    @property
+    def newest(self):
+        return self.timestamps[-1] if self.timestamps else None
 
-    def _format_final_message(self, lines):
-        results = "\n".join(lines)
-        return f"Backup check results:\n{results}"
+    def count_within(self, window, now):
+        start = now - window.total_seconds()
+        return self.total - bisect.bisect_right(self.timestamps, start)
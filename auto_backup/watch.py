@@ -0,0 +1,230 @@
+import ctypes
+import ctypes.util
+import logging
+import math
+import os
+import select
+import struct
+import time
+
+from auto_backup.patterns import ExcludeMatcher
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+MAX_WAIT = 60
+
+
+def _load_libc():
+    name = ctypes.util.find_library("c")
+    libc = ctypes.CDLL(name, use_errno=True) if name else None
+    if libc is None or not hasattr(libc, "inotify_init1"):
+        return None
+    return libc
+
+
+def _raise_errno(path=None):
+    errno = ctypes.get_errno()
+    raise OSError(errno, os.strerror(errno), path)
+
+
+class Inotify(object):
+    def __init__(self):
+        self.libc = _load_libc()
+        if self.libc is None:
+            raise RuntimeError("inotify is not available on this system")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            _raise_errno()
+        self.paths = dict()
+
+    def add_tree(self, root):
+        for directory, _, _ in os.walk(root):
+            try:
+                self._add_watch(directory)
+            except OSError as error:
+                logger.warning("Can't watch %s: %s", directory, error)
+
+    def _add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            _raise_errno(path)
+        self.paths[wd] = path
+
+    def read_changed_paths(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+        return list(self._parse_events(data))
+
+    def _parse_events(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            yield self._handle_event(wd, mask, os.fsdecode(name))
+
+    def _handle_event(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            return None
+        directory = self.paths.get(wd, "")
+        path = os.path.join(directory, name) if name else directory
+        if mask & (IN_CREATE | IN_MOVED_TO) and mask & IN_ISDIR:
+            self.add_tree(path)
+        if mask & (IN_IGNORED | IN_DELETE_SELF):
+            self.paths.pop(wd, None)
+        return path
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DebouncedTrigger(object):
+    def __init__(self, debounce, min_interval):
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.last_event = dict()
+        self.last_run = dict()
+
+    def record(self, task, now):
+        self.last_event[task] = now
+
+    def due(self, now):
+        return [task for task in self.last_event if self._due_at(task) <= now]
+
+    def _due_at(self, task):
+        quiet = self.last_event[task] + self.debounce
+        allowed = self.last_run.get(task, -math.inf) + self.min_interval
+        return max(quiet, allowed)
+
+    def seconds_until_due(self, now):
+        if not self.last_event:
+            return None
+        return max(0, min(self._due_at(task) for task in self.last_event) - now)
+
+    def mark_run(self, tasks, now):
+        for task in tasks:
+            self.last_run[task] = now
+            self.last_event.pop(task, None)
+
+    def retry_later(self, tasks, now):
+        for task in tasks:
+            self.last_run[task] = now
+
+
+class WatchedSource(object):
+    def __init__(self, command, task):
+        self.path = os.path.abspath(command.source)
+        self.matcher = ExcludeMatcher(
+            command.exclude_patterns(), command.exclude_if_present
+        )
+        self.task = task
+
+    def contains(self, path):
+        if path != self.path and not path.startswith(self.path + "/"):
+            return False
+        relative = path[len(self.path) + 1 :]
+        return not relative or not self._excludes(relative)
+
+    def _excludes(self, relative):
+        return self.matcher.excludes(relative) or self._has_marker(relative)
+
+    def _has_marker(self, relative):
+        markers = self.matcher.markers
+        directory = relative
+        while markers:
+            if any(
+                os.path.exists(os.path.join(self.path, directory, m)) for m in markers
+            ):
+                return True
+            if not directory:
+                return False
+            directory = os.path.dirname(directory)
+        return False
+
+
+class ChangeWatcher(object):
+    def __init__(
+        self,
+        tasks,
+        debounce=10,
+        min_interval=300,
+        inotify_factory=Inotify,
+        clock=time.monotonic,
+    ):
+        self.sources = self._collect_sources(tasks)
+        self.trigger = DebouncedTrigger(debounce, min_interval)
+        self.inotify = inotify_factory()
+        self.clock = clock
+        for path in {source.path for source in self.sources}:
+            self.inotify.add_tree(path)
+
+    def _collect_sources(self, tasks):
+        sources = []
+        for task in tasks:
+            commands = getattr(task.command, "commands", [task.command])
+            sources.extend(WatchedSource(c, task) for c in commands)
+        return sources
+
+    def batches(self):
+        while True:
+            due = self.trigger.due(self.clock())
+            if due:
+                yield due
+            else:
+                self._wait_for_changes()
+
+    def _wait_for_changes(self):
+        timeout = self.trigger.seconds_until_due(self.clock())
+        timeout = MAX_WAIT if timeout is None else min(timeout, MAX_WAIT)
+        for path in self.inotify.read_changed_paths(timeout):
+            for task in self._tasks_for(path):
+                self.trigger.record(task, self.clock())
+
+    def _tasks_for(self, path):
+        if path is None:
+            return [source.task for source in self.sources]
+        return [source.task for source in self.sources if source.contains(path)]
+
+    def mark_run(self, tasks):
+        self.trigger.mark_run(tasks, self.clock())
+
+    def retry_later(self, tasks):
+        self.trigger.retry_later(tasks, self.clock())
+
+    def postpone(self, tasks):
+        for task in tasks:
+            self.trigger.record(task, self.clock())
+
+    def close(self):
+        self.inotify.close()
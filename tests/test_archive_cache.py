@@ -0,0 +1,201 @@
+import contextlib
+import io
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.archive_cache import ArchiveCache, BorgArchiveList, CachedArchiveList
+from auto_backup.state import StateDirectory
+
+
+@pytest.fixture
+def repository():
+    return {
+        "last_modified": "2020-01-02T10:00:00.000000",
+        "archives": [
+            {"name": "a1", "id": "1", "start": "2020-01-01T10:00:00", "extra": 1},
+            {"name": "a2", "id": "2", "start": "2020-01-02T10:00:00", "extra": 2},
+        ],
+    }
+
+
+@pytest.fixture
+def stream_subprocess(repository):
+    @contextlib.contextmanager
+    def borg_list(args, **kwargs):
+        archives = repository["archives"]
+        if "--last" in args:
+            archives = archives[-int(args[args.index("--last") + 1]) :]
+        output = {
+            "archives": archives,
+            "repository": {"last_modified": repository["last_modified"]},
+        }
+        yield io.StringIO(json.dumps(output))
+
+    return MagicMock(side_effect=borg_list)
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path))
+
+
+@pytest.fixture
+def clock():
+    return MagicMock(return_value=1000.0)
+
+
+@pytest.fixture
+def cached_list(state, stream_subprocess, clock):
+    borg_list = BorgArchiveList("my-url", {}, stream_subprocess)
+    cache = ArchiveCache(state, "my-repo")
+    return CachedArchiveList(
+        borg_list, cache, recent=2, full_list_every=100, clock=clock
+    )
+
+
+def collect(archive_list):
+    archives = []
+    archive_list.for_each_archive(archives.append)
+    return archives
+
+
+def full_listing_calls(stream_subprocess):
+    calls = stream_subprocess.call_args_list
+    return [c for c in calls if c[0][0] == ("borg", "list", "--json", "my-url")]
+
+
+def test_first_check_lists_all_archives(cached_list, stream_subprocess):
+    archives = collect(cached_list)
+
+    assert [a["name"] for a in archives] == ["a1", "a2"]
+    assert len(full_listing_calls(stream_subprocess)) == 1
+
+
+def test_cached_records_contain_name_id_and_start(cached_list):
+    collect(cached_list)
+
+    assert collect(cached_list)[0] == {
+        "name": "a1",
+        "id": "1",
+        "start": "2020-01-01T10:00:00",
+    }
+
+
+def test_unchanged_repository_is_served_from_cache(cached_list, stream_subprocess):
+    collect(cached_list)
+
+    archives = collect(cached_list)
+
+    assert [a["name"] for a in archives] == ["a1", "a2"]
+    assert len(full_listing_calls(stream_subprocess)) == 1
+
+
+def add_archive(repository, number):
+    repository["last_modified"] = f"2020-01-0{number}T10:00:00.000000"
+    archive = {"name": f"a{number}", "id": str(number), "start": f"2020-01-0{number}"}
+    repository["archives"].append(archive)
+
+
+def test_new_archives_are_merged_into_cache(cached_list, repository, stream_subprocess):
+    collect(cached_list)
+    add_archive(repository, 3)
+
+    archives = collect(cached_list)
+
+    assert [a["name"] for a in archives] == ["a1", "a2", "a3"]
+    assert [a["name"] for a in collect(cached_list)] == ["a1", "a2", "a3"]
+    assert len(full_listing_calls(stream_subprocess)) == 1
+
+
+def test_deleted_recent_archive_is_removed_from_cache(
+    cached_list, repository, stream_subprocess
+):
+    add_archive(repository, 3)
+    collect(cached_list)
+    del repository["archives"][1]
+    repository["last_modified"] = "2020-01-04T10:00:00.000000"
+
+    archives = collect(cached_list)
+
+    assert [a["name"] for a in archives] == ["a1", "a3"]
+    assert len(full_listing_calls(stream_subprocess)) == 1
+
+
+def test_missing_overlap_lists_all_archives_again(
+    cached_list, repository, stream_subprocess
+):
+    collect(cached_list)
+    add_archive(repository, 3)
+    add_archive(repository, 4)
+
+    archives = collect(cached_list)
+
+    assert [a["name"] for a in archives] == ["a1", "a2", "a3", "a4"]
+    assert len(full_listing_calls(stream_subprocess)) == 2
+
+
+def test_invalidated_cache_lists_all_archives_again(
+    cached_list, state, stream_subprocess
+):
+    collect(cached_list)
+    ArchiveCache(state, "my-repo").invalidate()
+
+    collect(cached_list)
+
+    assert len(full_listing_calls(stream_subprocess)) == 2
+
+
+def test_failed_listing_keeps_previous_cache(
+    cached_list, repository, stream_subprocess, state
+):
+    collect(cached_list)
+    repository["last_modified"] = "changed"
+
+    def failing_handler(archive):
+        raise RuntimeError()
+
+    with pytest.raises(RuntimeError):
+        cached_list.for_each_archive(failing_handler)
+
+    assert not ArchiveCache(state, "my-repo").is_current("changed")
+
+
+def test_old_full_listing_lists_all_archives_again(
+    cached_list, stream_subprocess, clock
+):
+    collect(cached_list)
+    clock.return_value = 1100.0
+
+    collect(cached_list)
+
+    assert len(full_listing_calls(stream_subprocess)) == 2
+
+
+def test_merging_keeps_time_of_last_full_listing(
+    cached_list, repository, stream_subprocess, clock
+):
+    collect(cached_list)
+    clock.return_value = 1050.0
+    add_archive(repository, 3)
+    collect(cached_list)
+    clock.return_value = 1100.0
+
+    collect(cached_list)
+
+    assert len(full_listing_calls(stream_subprocess)) == 2
+
+
+def test_full_listing_drops_archives_deleted_outside_recent_window(
+    cached_list, repository, stream_subprocess, clock
+):
+    add_archive(repository, 3)
+    collect(cached_list)
+    del repository["archives"][0]
+    clock.return_value = 1100.0
+
+    archives = collect(cached_list)
+
+    assert [a["name"] for a in archives] == ["a2", "a3"]
+    assert [a["name"] for a in collect(cached_list)] == ["a2", "a3"]
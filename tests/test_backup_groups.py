@@ -0,0 +1,220 @@
+import subprocess
+from unittest.mock import MagicMock, call
+
+import pytest
+
+from auto_backup.backup_groups import (
+    BackupTaskGrouper,
+    GroupedBackupCommand,
+    TaskGroup,
+    scope_exclude_pattern,
+)
+from auto_backup.state import StateDirectory
+from auto_backup.tasks import BackupCommand, Task
+
+
+@pytest.fixture
+def config():
+    return {
+        "repositories": {
+            "repo": {"url": "my-url", "password": "my-password"},
+            "other-repo": {"url": "other-url", "password": "other-password"},
+        }
+    }
+
+
+@pytest.fixture
+def run_subprocess():
+    return MagicMock()
+
+
+@pytest.fixture
+def notify():
+    return MagicMock()
+
+
+@pytest.fixture
+def sources(tmp_path):
+    paths = [tmp_path / "first", tmp_path / "second"]
+    for path in paths:
+        path.mkdir()
+    return [str(p) for p in paths]
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path / "state"))
+
+
+@pytest.fixture
+def make_task(config, run_subprocess, notify, state):
+    def make(name, source, repository="repo", group="nightly", excludes=[]):
+        command = BackupCommand(
+            source,
+            repository,
+            config,
+            excludes=excludes,
+            group=group,
+            state=state,
+            run_subprocess=run_subprocess,
+        )
+        return Task(name, [name], command, notify)
+
+    return make
+
+
+def group(*tasks):
+    return BackupTaskGrouper().group(tasks)
+
+
+def test_tasks_of_same_group_and_repository_are_combined(make_task, sources):
+    tasks = group(make_task("a", sources[0]), make_task("b", sources[1]))
+
+    assert len(tasks) == 1
+    assert isinstance(tasks[0], TaskGroup)
+
+
+def test_group_takes_position_of_first_member(make_task, sources):
+    other = MagicMock()
+
+    tasks = group(other, make_task("a", sources[0]), make_task("b", sources[1]))
+
+    assert tasks[0] is other
+    assert [t.name for t in tasks[1].tasks] == ["a", "b"]
+
+
+def test_tasks_without_group_are_not_combined(make_task, sources):
+    tasks = group(
+        make_task("a", sources[0], group=None), make_task("b", sources[1], group=None)
+    )
+
+    assert [t.name for t in tasks] == ["a", "b"]
+
+
+def test_tasks_for_different_repositories_are_not_combined(make_task, sources):
+    tasks = group(
+        make_task("a", sources[0]), make_task("b", sources[1], repository="other-repo")
+    )
+
+    assert [t.name for t in tasks] == ["a", "b"]
+
+
+def test_group_has_tags_of_all_members(make_task, sources):
+    tasks = group(make_task("a", sources[0]), make_task("b", sources[1]))
+
+    assert tasks[0].tags == {"a", "b"}
+
+
+def test_group_runs_one_borg_create_with_all_sources(
+    make_task, sources, run_subprocess
+):
+    tasks = group(make_task("a", sources[0]), make_task("b", sources[1]))
+
+    tasks[0].safe_execute()
+
+    reference = (
+        "borg",
+        "--verbose",
+        "create",
+        "--json",
+        "my-url::{hostname}-{now}",
+        *sources,
+    )
+    assert run_subprocess.call_count == 1
+    assert run_subprocess.call_args[0][0] == reference
+    assert run_subprocess.call_args[1]["cwd"] == "/"
+
+
+def test_group_archive_is_recorded_for_every_member(make_task, sources, run_subprocess):
+    run_subprocess.return_value.stdout = '{"archive": {"name": "host-2024-01-01"}}'
+    members = [make_task("a", sources[0]), make_task("b", sources[1])]
+
+    group(*members)[0].safe_execute()
+
+    assert [m.command.last_archive() for m in members] == ["host-2024-01-01"] * 2
+
+
+def read_patterns_file(args):
+    with open(args[args.index("--patterns-from") + 1]) as patterns:
+        return patterns.read().splitlines()
+
+
+def test_group_merges_and_scopes_excludes(make_task, sources, run_subprocess):
+    patterns = []
+    run_subprocess.side_effect = lambda args, **kwargs: patterns.extend(
+        read_patterns_file(args)
+    ) or MagicMock(stdout="{}")
+    tasks = group(
+        make_task("a", sources[0], excludes=["*.tmp", "re:cache$"]),
+        make_task("b", sources[1], excludes=["*.tmp", "re:cache$"]),
+    )
+
+    tasks[0].safe_execute()
+
+    first, second = (s.strip("/") for s in sources)
+    assert patterns == [
+        f"- fm:{first}/*.tmp",
+        "- re:cache$",
+        f"- fm:{second}/*.tmp",
+    ]
+
+
+def test_missing_source_is_reported_and_skipped(
+    make_task, sources, run_subprocess, notify
+):
+    missing = make_task("missing", sources[0] + "-missing")
+    tasks = group(missing, make_task("b", sources[1]))
+
+    assert tasks[0].safe_execute() == 1
+
+    assert run_subprocess.call_args[0][0][-1] == sources[1]
+    assert notify.task_failed.call_args_list == [call(missing)]
+
+
+def test_group_reports_failed_members(make_task, sources):
+    missing = make_task("missing", sources[0] + "-missing")
+    tasks = group(missing, make_task("b", sources[1]))
+
+    tasks[0].safe_execute()
+
+    assert tasks[0].failed_members() == [missing]
+    assert [t.name for t in tasks[0].members()] == ["missing", "b"]
+
+
+def test_failing_borg_call_reports_every_member(
+    make_task, sources, run_subprocess, notify
+):
+    run_subprocess.side_effect = subprocess.CalledProcessError(2, "borg")
+    members = [make_task("a", sources[0]), make_task("b", sources[1])]
+    tasks = group(*members)
+
+    assert tasks[0].safe_execute() == 1
+
+    assert notify.task_failed.call_args_list == [call(m) for m in members]
+
+
+def test_successful_group_sends_no_notification(make_task, sources, notify):
+    tasks = group(make_task("a", sources[0]), make_task("b", sources[1]))
+
+    assert tasks[0].safe_execute() == 0
+
+    assert notify.task_failed.call_count == 0
+
+
+@pytest.mark.parametrize(
+    "pattern,scoped",
+    [
+        ("*.tmp", "src/dir/*.tmp"),
+        ("sh:**/.git", "sh:src/dir/**/.git"),
+        ("pp:build", "pp:src/dir/build"),
+        ("re:\\.tmp$", "re:\\.tmp$"),
+    ],
+)
+def test_scope_exclude_pattern(pattern, scoped):
+    assert scope_exclude_pattern(pattern, "/src/dir") == scoped
+
+
+def test_grouped_command_exposes_group_name(make_task, sources):
+    command = GroupedBackupCommand([make_task("a", sources[0]).command])
+
+    assert command.group == "nightly"
@@ -0,0 +1,104 @@
+import datetime
+
+import pytest
+
+from auto_backup.bandwidth import (
+    BandwidthLimiter,
+    BandwidthRate,
+    BandwidthTimetable,
+    parse_rate,
+)
+
+MONDAY_NOON = datetime.datetime(2024, 1, 1, 12, 0)
+SATURDAY_NOON = datetime.datetime(2024, 1, 6, 12, 0)
+MONDAY_EARLY = datetime.datetime(2024, 1, 1, 3, 0)
+
+
+@pytest.mark.parametrize(
+    "text,reference",
+    [
+        ("512", 512),
+        ("512k", 512),
+        ("2M", 2048),
+        ("1.5m", 1536),
+        ("1G", 1024**2),
+        ("2048B", 2),
+        ("off", None),
+    ],
+)
+def test_parse_rate(text, reference):
+    assert parse_rate(text) == reference
+
+
+@pytest.mark.parametrize("text", ["fast", "10x", "-1M", ""])
+def test_parse_invalid_rate_raises(text):
+    with pytest.raises(ValueError):
+        parse_rate(text)
+
+
+def test_rate_with_separate_upload_and_download():
+    rate = BandwidthRate("1M:off")
+
+    assert (rate.upload, rate.download) == (1024, None)
+
+
+def test_rate_clamped_to_cap():
+    assert BandwidthRate("10M:off").clamped(2048).text == "2048k"
+
+
+def test_timetable_uses_latest_entry_before_moment():
+    timetable = BandwidthTimetable("08:00,512k 19:00,10M")
+
+    assert timetable.rate_at(MONDAY_NOON).upload == 512
+
+
+def test_timetable_wraps_around_to_last_entry_of_week():
+    timetable = BandwidthTimetable("08:00,512k 19:00,10M")
+
+    assert timetable.rate_at(MONDAY_EARLY).upload == 10240
+
+
+def test_timetable_day_entries():
+    timetable = BandwidthTimetable("Mon-00:00,512k Sat-00:00,off")
+
+    assert timetable.rate_at(MONDAY_NOON).upload == 512
+    assert timetable.rate_at(SATURDAY_NOON).upload is None
+
+
+@pytest.mark.parametrize("spec", ["", "Xyz-08:00,1M", "25:00,1M", "08:00,fast"])
+def test_invalid_timetable_raises(spec):
+    with pytest.raises(ValueError):
+        BandwidthTimetable(spec)
+
+
+def test_limiter_without_limits():
+    limiter = BandwidthLimiter()
+
+    assert limiter.rclone_bwlimit() is None
+    assert limiter.borg_upload_ratelimit(MONDAY_NOON) is None
+
+
+def test_limiter_passes_timetable_to_rclone():
+    limiter = BandwidthLimiter(timetable="Mon-08:00,512k 19:00,off")
+
+    assert limiter.rclone_bwlimit() == "Mon-08:00,512k 19:00,off"
+
+
+def test_limiter_splits_shared_cap_between_jobs():
+    limiter = BandwidthLimiter(shared_cap="4M", jobs=2)
+
+    assert limiter.rclone_bwlimit() == "2048k"
+    assert limiter.borg_upload_ratelimit(MONDAY_NOON) == 2048
+
+
+def test_limiter_clamps_timetable_to_shared_cap():
+    limiter = BandwidthLimiter(timetable="08:00,512k 19:00,off", shared_cap="1M")
+
+    assert limiter.rclone_bwlimit() == "08:00,512k 19:00,1024k"
+
+
+def test_limiter_uses_current_timetable_slot_for_borg():
+    limiter = BandwidthLimiter(timetable="08:00,512k:off 19:00,off", shared_cap="1M")
+
+    assert limiter.borg_upload_ratelimit(MONDAY_NOON) == 512
+    assert limiter.borg_upload_ratelimit(MONDAY_EARLY) == 1024
@@ -0,0 +1,159 @@
+import subprocess
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.borg_verify import BorgVerifyCommand, VerificationProgress
+from auto_backup.state import StateDirectory
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def config():
+    return {"repositories": {"test-repo": {"url": "my-url", "password": "my-password"}}}
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path))
+
+
+@pytest.fixture
+def run_subprocess():
+    run_subprocess = MagicMock()
+    run_subprocess.return_value.stdout = "archive-1\narchive-2\narchive-3\n"
+    return run_subprocess
+
+
+@pytest.fixture
+def verify(config, state, run_subprocess):
+    def create_command(**kwargs):
+        return BorgVerifyCommand(
+            "test-repo", config, state=state, run_subprocess=run_subprocess, **kwargs
+        )
+
+    return create_command
+
+
+def called_args(run_subprocess):
+    return [c[0][0] for c in run_subprocess.call_args_list]
+
+
+def verified_archives(run_subprocess):
+    calls = called_args(run_subprocess)
+    return [args[-1] for args in calls if "--verify-data" in args]
+
+
+def test_partial_repository_check(verify, run_subprocess):
+    verify(max_duration="30m").execute()
+
+    reference = (
+        "borg",
+        "--verbose",
+        "check",
+        "--repository-only",
+        "--max-duration",
+        "1800",
+        "my-url",
+    )
+    assert called_args(run_subprocess) == [reference]
+    assert run_subprocess.call_args[1]["env"]["BORG_PASSPHRASE"] == "my-password"
+
+
+def test_verifies_data_of_all_due_archives(verify, run_subprocess):
+    verify(verify_data=True).execute()
+
+    assert verified_archives(run_subprocess) == [
+        "my-url::archive-1",
+        "my-url::archive-2",
+        "my-url::archive-3",
+    ]
+
+
+def test_recently_verified_archives_are_skipped(verify, run_subprocess):
+    verify(verify_data=True).execute()
+    run_subprocess.reset_mock()
+
+    verify(verify_data=True).execute()
+
+    assert verified_archives(run_subprocess) == []
+
+
+def test_stops_at_exhausted_data_budget(verify, run_subprocess):
+    verify(verify_data=True, data_budget=-1).execute()
+
+    assert verified_archives(run_subprocess) == []
+
+
+def test_data_verification_only_checks_archives(verify, run_subprocess):
+    verify(verify_data=True).execute()
+
+    calls = [args for args in called_args(run_subprocess) if "--verify-data" in args]
+    assert all("--archives-only" in args for args in calls)
+
+
+def test_archive_check_gets_remaining_budget(verify, run_subprocess):
+    verify(verify_data=True, data_budget="1h").execute()
+
+    timeouts = [c[1]["timeout"] for c in run_subprocess.call_args_list[2:]]
+    assert len(timeouts) == 3
+    assert all(0 < timeout <= 3600 for timeout in timeouts)
+
+
+def test_slow_archive_check_is_cut_off_at_budget(verify, run_subprocess):
+    def slow_second_archive(args, timeout=None, **kwargs):
+        if args[-1] == "my-url::archive-2":
+            raise subprocess.TimeoutExpired(args, timeout)
+        return MagicMock(stdout="archive-1\narchive-2\narchive-3\n")
+
+    run_subprocess.side_effect = slow_second_archive
+    verify(verify_data=True).execute()
+    run_subprocess.side_effect = None
+    run_subprocess.reset_mock()
+
+    verify(verify_data=True).execute()
+
+    assert verified_archives(run_subprocess) == [
+        "my-url::archive-2",
+        "my-url::archive-3",
+    ]
+
+
+def test_failed_archive_stops_and_is_verified_again_next_run(verify, run_subprocess):
+    def fail_second_archive(args, **kwargs):
+        if args[-1] == "my-url::archive-2":
+            raise subprocess.CalledProcessError(1, args)
+        return MagicMock(stdout="archive-1\narchive-2\narchive-3\n")
+
+    run_subprocess.side_effect = fail_second_archive
+    with pytest.raises(subprocess.CalledProcessError):
+        verify(verify_data=True).execute()
+    run_subprocess.side_effect = None
+    run_subprocess.reset_mock()
+
+    verify(verify_data=True).execute()
+
+    assert verified_archives(run_subprocess) == [
+        "my-url::archive-2",
+        "my-url::archive-3",
+    ]
+
+
+def test_progress_orders_due_archives_by_last_verification(state):
+    progress = VerificationProgress(state, "repo")
+    progress.mark_verified("old", 10 * DAY)
+    progress.mark_verified("recent", 40 * DAY)
+
+    due = progress.due_archives(["recent", "new", "old"], 30 * DAY, 41 * DAY)
+
+    assert due == ["new", "old"]
+
+
+def test_progress_forgets_pruned_archives(state):
+    progress = VerificationProgress(state, "repo")
+    progress.mark_verified("pruned", DAY)
+
+    progress.forget_missing(["kept"])
+
+    assert VerificationProgress(state, "repo").verified == {}
@@ -0,0 +1,85 @@
+import subprocess
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.cache_prewarm import BorgCachePrewarmer
+
+
+@pytest.fixture
+def run_subprocess():
+    return MagicMock()
+
+
+@pytest.fixture
+def prewarmer(run_subprocess):
+    return BorgCachePrewarmer(run_subprocess=run_subprocess)
+
+
+def make_task(url):
+    environment = MagicMock()
+    environment.build.return_value = {"BORG_PASSPHRASE": f"{url}-password"}
+    task = MagicMock()
+    task.command.cache_prewarm_target.return_value = (url, environment)
+    return task
+
+
+def run(prewarmer, tasks):
+    prewarmer.start(tasks)
+    prewarmer.shutdown()
+
+
+def test_runs_borg_info_once_per_repository(prewarmer, run_subprocess):
+    run(prewarmer, [make_task("url-1"), make_task("url-2"), make_task("url-1")])
+
+    calls = sorted(c[0][0] for c in run_subprocess.call_args_list)
+    assert calls == [("borg", "info", "url-1"), ("borg", "info", "url-2")]
+
+
+def test_uses_environment_of_repository(prewarmer, run_subprocess):
+    run(prewarmer, [make_task("url-1")])
+
+    assert run_subprocess.call_args[1]["env"] == {"BORG_PASSPHRASE": "url-1-password"}
+
+
+def test_discards_borg_info_output(prewarmer, run_subprocess):
+    run(prewarmer, [make_task("url-1")])
+
+    assert run_subprocess.call_args[1]["stdout"] == subprocess.DEVNULL
+
+
+def test_ignores_tasks_without_borg_cache(prewarmer, run_subprocess):
+    task = MagicMock()
+    task.command = object()
+
+    run(prewarmer, [task])
+
+    assert run_subprocess.call_count == 0
+
+
+def test_failed_prewarm_does_not_raise(prewarmer, run_subprocess):
+    run_subprocess.side_effect = subprocess.CalledProcessError(2, "borg")
+    prewarmer.start([make_task("url-1")])
+
+    prewarmer.wait_for("url-1")
+    prewarmer.shutdown()
+
+
+def test_wait_for_unknown_repository_returns_immediately(prewarmer):
+    prewarmer.wait_for("unknown-url")
+
+
+def test_wait_for_blocks_until_prewarm_is_done(prewarmer, run_subprocess):
+    release = threading.Event()
+    run_subprocess.side_effect = lambda *args, **kwargs: release.wait()
+    prewarmer.start([make_task("url-1")])
+
+    waiter = threading.Thread(target=prewarmer.wait_for, args=("url-1",))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+
+    release.set()
+    waiter.join()
+    prewarmer.shutdown()
@@ -1,11 +1,22 @@
+import contextlib
 import datetime
+import io
+import json
+import os
+import subprocess
 from unittest.mock import MagicMock, call
 
 import pytest
 
+from auto_backup.archive_cache import ArchiveCache
+from auto_backup.compaction import CompactionTracker
+from auto_backup.compression_bench import CompressionProfiles
+from auto_backup.passwords import PasswordResolver
+from auto_backup.state import StateDirectory
 from auto_backup.tasks import (
     BackupCommand,
     CheckBackupsCommand,
+    CompactCommand,
     PruneBackupsCommand,
     RcloneCommand,
 )
@@ -62,6 +73,8 @@ def check_result():
 
 @pytest.fixture
 def call_prune(config, run_subprocess):
+    run_subprocess.return_value.stderr = ""
+
     def call(**init_args):
         PruneBackupsCommand(
             "test-repo", config, run_subprocess=run_subprocess, **init_args
@@ -70,13 +83,22 @@ def call_prune(config, run_subprocess):
     return call
 
 
+@contextlib.contextmanager
+def streamed_output(result):
+    yield io.StringIO(result.stdout)
+
+
 @pytest.fixture
 def call_check(config, notify, check_result, run_subprocess):
-    run_subprocess.return_value = check_result
+    run_subprocess.side_effect = lambda args, **kwargs: streamed_output(check_result)
 
     def call(repositories=["test-repo"], **init_args):
         CheckBackupsCommand(
-            repositories, config, notify, run_subprocess=run_subprocess, **init_args
+            repositories,
+            config,
+            notify,
+            stream_subprocess=run_subprocess,
+            **init_args,
         ).execute()
 
     return call
@@ -101,6 +123,10 @@ def subprocess_call(run_subprocess):
         def env(self):
             return self._get_kwarg("env")
 
+        @property
+        def timeout(self):
+            return self._get_kwarg("timeout")
+
         def _get_kwarg(self, key):
             return run_subprocess.call_args[1].get(key)
 
@@ -122,13 +148,117 @@ def test_rclone_call(rclone, subprocess_call):
     assert subprocess_call.args == reference
 
 
+def test_rclone_call_with_bandwidth_limit(run_subprocess, subprocess_call):
+    bandwidth = MagicMock()
+    bandwidth.rclone_bwlimit.return_value = "08:00,512k 19:00,off"
+
+    RcloneCommand(
+        "/path/to/config",
+        "my-source",
+        "my-destination",
+        bandwidth=bandwidth,
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    assert subprocess_call.args[3:7] == (
+        "/path/to/config",
+        "--bwlimit",
+        "08:00,512k 19:00,off",
+        "sync",
+    )
+
+
+@pytest.fixture
+def topup(run_subprocess, tmp_path):
+    def create_command():
+        return RcloneCommand(
+            "/path/to/config",
+            "my-source",
+            "my-destination",
+            mode="topup",
+            full_sync_every="7d",
+            state=StateDirectory(str(tmp_path)),
+            run_subprocess=run_subprocess,
+        )
+
+    return create_command
+
+
+def test_rclone_topup_starts_with_full_sync(topup, subprocess_call):
+    topup().execute()
+
+    assert subprocess_call.args[4:] == ("sync", "my-source", "my-destination")
+
+
+def test_rclone_topup_copies_new_files_after_full_sync(topup, subprocess_call):
+    topup().execute()
+    topup().execute()
+
+    assert subprocess_call.args[4:6] == ("copy", "--max-age")
+    assert subprocess_call.args[-2:] == ("my-source", "my-destination")
+
+
+def test_rclone_failed_topup_is_not_recorded(topup, run_subprocess, subprocess_call):
+    run_subprocess.side_effect = subprocess.CalledProcessError(1, "rclone")
+    with pytest.raises(subprocess.CalledProcessError):
+        topup().execute()
+    run_subprocess.side_effect = None
+
+    topup().execute()
+
+    assert subprocess_call.args[4] == "sync"
+
+
+def test_rclone_unknown_mode_raises():
+    with pytest.raises(ValueError, match="Unknown rclone mode"):
+        RcloneCommand("/path/to/config", "src", "dst", mode="mirror")
+
+
+def test_rclone_sync_through_daemon(run_subprocess):
+    daemons = MagicMock()
+
+    RcloneCommand(
+        "/path/to/config",
+        "my-source",
+        "my-destination",
+        rclone_daemons=daemons,
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    assert daemons.get.call_args[0] == ("/path/to/config",)
+    assert daemons.get.return_value.sync.call_args[0] == ("my-source", "my-destination")
+    assert run_subprocess.call_count == 0
+
+
 def test_backup_call_without_excludes(backup, subprocess_call):
     backup.execute()
 
-    reference = ("borg", "--verbose", "create", "my-url::{hostname}-{now}", ".")
+    reference = (
+        "borg",
+        "--verbose",
+        "create",
+        "--json",
+        "my-url::{hostname}-{now}",
+        ".",
+    )
     assert subprocess_call.args == reference
 
 
+def test_backup_records_created_archive(config, run_subprocess, tmp_path):
+    run_subprocess.return_value.stdout = '{"archive": {"name": "host-2024-01-01"}}'
+    backup = BackupCommand(
+        "/my/source/dir",
+        "test-repo",
+        config,
+        state=StateDirectory(str(tmp_path)),
+        run_subprocess=run_subprocess,
+    )
+
+    backup.execute()
+
+    assert backup.last_archive() == "host-2024-01-01"
+
+
 def test_backup_call_executed_in_source_directory(backup, subprocess_call):
     backup.execute()
 
@@ -141,21 +271,54 @@ def test_backup_call_sets_password(backup, subprocess_call):
     assert subprocess_call.env["BORG_PASSPHRASE"] == "my-password"
 
 
-def test_backup_call_with_excludes(backup_with_ssh_and_excludes, subprocess_call):
+def read_patterns_file(args):
+    with open(args[args.index("--patterns-from") + 1]) as patterns:
+        return patterns.read().splitlines()
+
+
+def test_backup_call_with_excludes(
+    backup_with_ssh_and_excludes, run_subprocess, subprocess_call
+):
+    patterns = []
+    run_subprocess.side_effect = lambda args, **kwargs: patterns.extend(
+        read_patterns_file(args)
+    ) or MagicMock(stdout="{}")
+
     backup_with_ssh_and_excludes.execute()
 
-    reference = (
-        "borg",
-        "--verbose",
-        "create",
-        "--exclude",
-        ".my-exclude",
-        "--exclude",
-        ".my-other-exclude",
-        "my-url::{hostname}-{now}",
-        ".",
+    args = subprocess_call.args
+    assert args[:4] == ("borg", "--verbose", "create", "--patterns-from")
+    assert args[5:] == ("--json", "my-url::{hostname}-{now}", ".")
+    assert patterns == ["- fm:.my-exclude", "- fm:.my-other-exclude"]
+    assert not os.path.exists(args[4])
+
+
+def test_backup_merges_exclude_files_and_markers(config, run_subprocess, tmp_path):
+    exclude_file = tmp_path / "excludes"
+    exclude_file.write_text("# generated\n*.tmp\n\nsh:**/cache\n*.log\n")
+    patterns = []
+    run_subprocess.side_effect = lambda args, **kwargs: patterns.extend(
+        read_patterns_file(args)
+    ) or MagicMock(stdout="{}")
+
+    BackupCommand(
+        "/my/source/dir",
+        "test-repo",
+        config,
+        excludes=["*.log"],
+        exclude_from=str(exclude_file),
+        exclude_if_present=[".nobackup", "CACHEDIR.TAG"],
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    args = run_subprocess.call_args[0][0]
+    assert patterns == ["- fm:*.log", "- fm:*.tmp", "- sh:**/cache"]
+    assert args[5:9] == (
+        "--exclude-if-present",
+        ".nobackup",
+        "--exclude-if-present",
+        "CACHEDIR.TAG",
     )
-    assert subprocess_call.args == reference
 
 
 def test_backup_call_with_ssh_command(backup_with_ssh_and_excludes, subprocess_call):
@@ -164,6 +327,23 @@ def test_backup_call_with_ssh_command(backup_with_ssh_and_excludes, subprocess_c
     assert subprocess_call.env["BORG_RSH"] == "my-ssh"
 
 
+def test_backup_call_with_ssh_multiplexer(config, run_subprocess, subprocess_call):
+    multiplexer = MagicMock()
+    multiplexer.rsh_command.return_value = "my-ssh -o ControlPath=/tmp/%C"
+
+    BackupCommand(
+        "/src",
+        "test-repo",
+        config,
+        ssh_command="my-ssh",
+        ssh_multiplexer=multiplexer,
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    assert multiplexer.rsh_command.call_args[0] == ("my-url", "my-ssh")
+    assert subprocess_call.env["BORG_RSH"] == "my-ssh -o ControlPath=/tmp/%C"
+
+
 def test_prune_call_base_command(call_prune, subprocess_call):
     call_prune()
 
@@ -204,6 +384,17 @@ def test_prune_call_dry_run_command(call_prune, subprocess_call):
     assert subprocess_call.args == reference
 
 
+@pytest.mark.parametrize("dry_run,cached", [(False, False), (True, True)])
+def test_prune_invalidates_archive_cache(call_prune, tmp_path, dry_run, cached):
+    state = StateDirectory(str(tmp_path))
+    with ArchiveCache(state, "test-repo").writer("modified", 0):
+        pass
+
+    call_prune(state=state, dry_run=dry_run)
+
+    assert ArchiveCache(state, "test-repo").is_current("modified") == cached
+
+
 def prune_cmd_reference(*keep_options):
     return ("borg", "--verbose", "prune", "--list", "--stats", *keep_options, "my-url")
 
@@ -298,7 +489,7 @@ def test_check_runs_one_subprocess_per_repository(call_check, config, subprocess
 def test_check_sends_message(call_check, notify):
     call_check()
 
-    reference_msg = "Backup check results:\ntest-repo: 0 (24h) 0 (total)"
+    reference_msg = "Backup check results:\ntest-repo: 0 (24h) 0 (total) newest: never"
     assert notify.message.call_args == call(reference_msg)
 
 
@@ -310,21 +501,447 @@ def test_check_sends_one_message_for_all_repositories(call_check, config, notify
     call_check(["test-repo", "other-repo"])
 
     reference_msg = (
-        "Backup check results:\ntest-repo: 0 (24h) "
-        "0 (total)\nother-repo: 0 (24h) 0 (total)"
+        "Backup check results:\ntest-repo: 0 (24h) 0 (total) newest: never\n"
+        "other-repo: 0 (24h) 0 (total) newest: never"
     )
     assert notify.message.call_args == call(reference_msg)
 
 
 def test_check_message_contains_number_of_archives(call_check, check_result, notify):
-    now = datetime.datetime.now()
+    one_hour_ago = datetime.datetime.now() - datetime.timedelta(hours=1)
     check_result.stdout = f"""{{
 "archives": [
     {{"start": "2020-01-01"}},
-    {{"start": "{now}"}}
+    {{"start": "{one_hour_ago}"}}
 ]
 }}"""
     call_check()
 
-    reference_msg = "Backup check results:\ntest-repo: 1 (24h) 2 (total)"
+    reference_msg = "Backup check results:\ntest-repo: 1 (24h) 2 (total) newest: 1h ago"
+    assert notify.message.call_args == call(reference_msg)
+
+
+def test_check_passes_timeout_to_borg_list(call_check, subprocess_call):
+    call_check(timeout=30)
+
+    assert subprocess_call.timeout == 30
+
+
+def test_check_keeps_configured_order_of_repositories(call_check, config, notify):
+    for name in ("repo-a", "repo-b", "repo-c"):
+        config["repositories"][name] = {"url": name, "password": "pw"}
+
+    call_check(["repo-c", "repo-a", "repo-b"], max_workers=3)
+
+    lines = notify.message.call_args[0][0].splitlines()[1:]
+    assert [line.split(":")[0] for line in lines] == ["repo-c", "repo-a", "repo-b"]
+
+
+def test_check_reports_timed_out_repository_as_error_line(
+    call_check, config, run_subprocess, check_result, notify
+):
+    config["repositories"]["slow-repo"] = {"url": "slow-url", "password": "pw"}
+
+    def list_or_time_out(args, **kwargs):
+        if args[-1] == "slow-url":
+            raise subprocess.TimeoutExpired(args, 5)
+        return streamed_output(check_result)
+
+    run_subprocess.side_effect = list_or_time_out
+    call_check(["slow-repo", "test-repo"], timeout=5)
+
+    reference_msg = (
+        "Backup check results:\nslow-repo: error (timed out after 5s)\n"
+        "test-repo: 0 (24h) 0 (total) newest: never"
+    )
+    assert notify.message.call_args == call(reference_msg)
+
+
+def test_check_reports_failing_borg_call_as_error_line(
+    call_check, run_subprocess, notify
+):
+    run_subprocess.side_effect = subprocess.CalledProcessError(2, "borg")
+
+    call_check()
+
+    reference_msg = (
+        "Backup check results:\ntest-repo: error (borg exited with status 2)"
+    )
+    assert notify.message.call_args == call(reference_msg)
+
+
+def test_check_counts_archives_of_large_listing(call_check, check_result, notify):
+    now = datetime.datetime.now()
+    archives = ",".join(
+        f'{{"name": "archive-{i}", "start": "{now if i % 2 else "2020-01-01"}"}}'
+        for i in range(5000)
+    )
+    check_result.stdout = f'{{"archives": [{archives}], "repository": {{}}}}'
+
+    call_check()
+
+    reference_msg = "Backup check results:\ntest-repo: 2500 (24h) 5000 (total)"
+    assert notify.message.call_args[0][0].startswith(reference_msg)
+
+
+@pytest.fixture
+def archives_at(check_result):
+    def set_archive_ages(*ages):
+        now = datetime.datetime.now()
+        starts = [now - datetime.timedelta(hours=age) for age in ages]
+        archives = ", ".join(f'{{"start": "{start}"}}' for start in starts)
+        check_result.stdout = f'{{"archives": [{archives}]}}'
+
+    return set_archive_ages
+
+
+def test_check_counts_archives_for_each_configured_window(
+    call_check, archives_at, notify
+):
+    archives_at(0.5, 3, 30, 300, 2000)
+
+    call_check(windows=["1h", "24h", "7d", "30d"])
+
+    reference_line = "test-repo: 1 (1h) 2 (24h) 3 (7d) 4 (30d) 5 (total)"
+    assert reference_line in notify.message.call_args[0][0]
+
+
+def test_check_reports_age_of_newest_archive(call_check, archives_at, notify):
+    archives_at(50, 26.5)
+
+    call_check()
+
+    assert notify.message.call_args[0][0].endswith("newest: 1d 2h ago")
+
+
+def test_check_alerts_when_window_has_too_few_archives(call_check, archives_at, notify):
+    archives_at(30)
+
+    call_check(alerts={"24h": 1, "7d": 1})
+
+    reference_msg = (
+        "Backup check results:\ntest-repo: 0 (24h) 1 (total) newest: 1d 6h ago "
+        "ALERT: 0 < 1 (24h)"
+    )
     assert notify.message.call_args == call(reference_msg)
+
+
+def test_check_with_invalid_window_fails_on_creation(config, notify):
+    with pytest.raises(ValueError):
+        CheckBackupsCommand(["test-repo"], config, notify, windows=["daily"])
+
+
+def test_backup_call_sets_cache_and_security_directories(
+    config, run_subprocess, subprocess_call
+):
+    config["repositories"]["test-repo"]["cache_dir"] = "/fast/cache"
+    config["repositories"]["test-repo"]["security_dir"] = "/fast/security"
+    BackupCommand("/src", "test-repo", config, run_subprocess=run_subprocess).execute()
+
+    assert subprocess_call.env["BORG_CACHE_DIR"] == "/fast/cache"
+    assert subprocess_call.env["BORG_SECURITY_DIR"] == "/fast/security"
+
+
+def test_prune_call_sets_cache_directory(config, call_prune, subprocess_call):
+    config["repositories"]["test-repo"]["cache_dir"] = "/fast/cache"
+
+    call_prune()
+
+    assert subprocess_call.env["BORG_CACHE_DIR"] == "/fast/cache"
+
+
+def test_backup_waits_for_cache_prewarm_of_its_repository(config):
+    events = MagicMock()
+
+    BackupCommand(
+        "/src",
+        "test-repo",
+        config,
+        cache_prewarmer=events.prewarmer,
+        run_subprocess=events.run_subprocess,
+    ).execute()
+
+    names = [name for name, _, _ in events.mock_calls if not name.endswith("__")]
+    assert names == ["prewarmer.wait_for", "run_subprocess"]
+    assert events.prewarmer.wait_for.call_args == call("my-url")
+
+
+@pytest.fixture
+def call_compact(config, run_subprocess):
+    run_subprocess.return_value.stderr = "compaction freed about 2.50 MB repository.\n"
+
+    def call(**init_args):
+        return CompactCommand(
+            "test-repo", config, run_subprocess=run_subprocess, **init_args
+        ).execute()
+
+    return call
+
+
+def test_compact_call(call_compact, subprocess_call):
+    call_compact()
+
+    assert subprocess_call.args == ("borg", "--verbose", "compact", "my-url")
+
+
+def test_compact_call_with_segment_threshold(call_compact, subprocess_call):
+    call_compact(threshold=25)
+
+    reference = ("borg", "--verbose", "compact", "--threshold", "25", "my-url")
+    assert subprocess_call.args == reference
+
+
+def test_compact_returns_reclaimed_bytes(call_compact):
+    assert call_compact() == 2500000
+
+
+def prune_stats(deleted, total):
+    return (
+        "                       Original size      Compressed size    "
+        "Deduplicated size\n"
+        f"Deleted data:               -2.00 GB             -1.00 GB    {deleted:>16}\n"
+        f"All archives:               20.00 GB             10.00 GB    {total:>16}\n"
+    )
+
+
+@pytest.fixture
+def prune_with_stats(run_subprocess):
+    def set_stats(deleted, total):
+        def borg(args, **kwargs):
+            result = MagicMock()
+            result.stderr = prune_stats(deleted, total) if args[2] == "prune" else ""
+            return result
+
+        run_subprocess.side_effect = borg
+
+    return set_stats
+
+
+def called_borg_commands(run_subprocess):
+    return [c[0][0][1:3] for c in run_subprocess.call_args_list]
+
+
+def test_prune_compacts_when_freed_ratio_exceeds_threshold(
+    call_prune, run_subprocess, prune_with_stats
+):
+    prune_with_stats("-200 MB", "800 MB")
+
+    call_prune(compact_threshold=10)
+
+    assert called_borg_commands(run_subprocess) == [
+        ("--verbose", "prune"),
+        ("--verbose", "compact"),
+    ]
+
+
+def test_prune_skips_compaction_below_threshold(
+    call_prune, run_subprocess, prune_with_stats
+):
+    prune_with_stats("-10 MB", "990 MB")
+
+    call_prune(compact_threshold=10)
+
+    assert ("--verbose", "compact") not in called_borg_commands(run_subprocess)
+
+
+def test_prune_and_compact_resolve_password_once(
+    config, run_subprocess, prune_with_stats
+):
+    prune_with_stats("-200 MB", "800 MB")
+    password_command = MagicMock()
+    password_command.return_value.stdout = "secret\n"
+    config["repositories"]["test-repo"] = {
+        "url": "my-url",
+        "password_command": "pass show borg",
+    }
+
+    PruneBackupsCommand(
+        "test-repo",
+        config,
+        compact_threshold=10,
+        passwords=PasswordResolver(password_command),
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    assert ("--verbose", "compact") in called_borg_commands(run_subprocess)
+    assert password_command.call_count == 1
+    envs = [c[1]["env"]["BORG_PASSPHRASE"] for c in run_subprocess.call_args_list]
+    assert set(envs) == {"secret"}
+
+
+def test_prune_without_stats_does_not_compact(call_prune, run_subprocess):
+    run_subprocess.return_value.stderr = "Keeping archive: a1\n"
+
+    call_prune(compact_threshold=0)
+
+    assert called_borg_commands(run_subprocess) == [("--verbose", "prune")]
+
+
+def test_compact_task_resets_pending_bytes(call_compact, tmp_path):
+    state = StateDirectory(str(tmp_path))
+    CompactionTracker(state, "test-repo", 50).record_freed(100, 1000)
+
+    call_compact(state=state)
+
+    assert CompactionTracker(state, "test-repo", 50).record_freed(0, 1000) is False
+    assert state.load("compaction/test-repo.json") == {"pending_bytes": 0}
+
+
+def test_dry_run_prune_never_compacts(call_prune, run_subprocess):
+    call_prune(compact_threshold=0, dry_run=True)
+
+    assert called_borg_commands(run_subprocess) == [("--verbose", "prune")]
+
+
+def test_backup_call_with_compression(config, run_subprocess, subprocess_call):
+    BackupCommand(
+        "/src", "test-repo", config, compression="zstd,3", run_subprocess=run_subprocess
+    ).execute()
+
+    assert subprocess_call.args[3:5] == ("--compression", "zstd,3")
+
+
+def test_backup_call_with_recommended_compression(
+    config, run_subprocess, subprocess_call, tmp_path
+):
+    state = StateDirectory(str(tmp_path))
+    CompressionProfiles(state).save("/src", "auto,lzma,6")
+
+    BackupCommand(
+        "/src",
+        "test-repo",
+        config,
+        compression="recommended",
+        state=state,
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    assert subprocess_call.args[3:5] == ("--compression", "auto,lzma,6")
+
+
+def test_backup_without_benchmark_uses_borg_default(
+    config, run_subprocess, subprocess_call, tmp_path
+):
+    BackupCommand(
+        "/src",
+        "test-repo",
+        config,
+        compression="recommended",
+        state=StateDirectory(str(tmp_path)),
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    assert "--compression" not in subprocess_call.args
+
+
+@pytest.fixture
+def profile_config(config):
+    config["backup_profiles"] = {
+        "vm": {"files_cache": "ctime,size", "noatime": True, "compression": "lz4"}
+    }
+    return config
+
+
+def test_backup_call_with_profile(profile_config, run_subprocess, subprocess_call):
+    BackupCommand(
+        "/src", "test-repo", profile_config, profile="vm", run_subprocess=run_subprocess
+    ).execute()
+
+    reference = (
+        "borg",
+        "--verbose",
+        "create",
+        "--files-cache",
+        "ctime,size",
+        "--noatime",
+        "--compression",
+        "lz4",
+        "--json",
+        "my-url::{hostname}-{now}",
+        ".",
+    )
+    assert subprocess_call.args == reference
+
+
+def test_task_compression_overrides_profile(
+    profile_config, run_subprocess, subprocess_call
+):
+    BackupCommand(
+        "/src",
+        "test-repo",
+        profile_config,
+        profile="vm",
+        compression="zstd,6",
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    assert subprocess_call.args[6:8] == ("--compression", "zstd,6")
+
+
+def test_backup_with_unknown_profile_fails_on_creation(config):
+    with pytest.raises(ValueError):
+        BackupCommand("/src", "test-repo", config, profile="missing")
+
+
+def test_backup_call_with_scheduled_upload_ratelimit(
+    config, run_subprocess, subprocess_call
+):
+    bandwidth = MagicMock()
+    bandwidth.borg_upload_ratelimit.return_value = 512
+
+    BackupCommand(
+        "/src", "test-repo", config, bandwidth=bandwidth, run_subprocess=run_subprocess
+    ).execute()
+
+    assert subprocess_call.args[3:5] == ("--upload-ratelimit", "512")
+
+
+def test_backup_uses_lower_of_profile_and_scheduled_ratelimit(
+    config, run_subprocess, subprocess_call
+):
+    config["backup_profiles"] = {"slow": {"upload_ratelimit": 256}}
+    bandwidth = MagicMock()
+    bandwidth.borg_upload_ratelimit.return_value = 512
+
+    BackupCommand(
+        "/src",
+        "test-repo",
+        config,
+        profile="slow",
+        bandwidth=bandwidth,
+        run_subprocess=run_subprocess,
+    ).execute()
+
+    assert subprocess_call.args[3:5] == ("--upload-ratelimit", "256")
+
+
+def test_backup_with_log_json_streams_borg_events(config, caplog):
+    caplog.set_level("INFO")
+    event = {"type": "log_message", "levelname": "INFO", "message": "borg says hi"}
+    calls = []
+
+    @contextlib.contextmanager
+    def stream_subprocess(args, stream, stdout, **kwargs):
+        calls.append((args, stream))
+        stdout.write('{"archive": {"name": "src-1"}}')
+        yield io.StringIO(json.dumps(event) + "\n")
+
+    backup = BackupCommand(
+        "/src", "test-repo", config, log_json=True, stream_subprocess=stream_subprocess
+    )
+
+    assert backup.create_archive([], [], ["."], cwd="/src") == "src-1"
+    args, stream = calls[0]
+    assert args[:4] == ("borg", "--verbose", "--log-json", "create")
+    assert stream == "stderr"
+    assert "borg says hi" in caplog.text
+
+
+def test_backup_logs_borg_exit_code(backup, run_subprocess, caplog):
+    caplog.set_level("INFO")
+    run_subprocess.side_effect = subprocess.CalledProcessError(2, "borg")
+
+    with pytest.raises(subprocess.CalledProcessError):
+        backup.execute()
+
+    assert [r.exit_code for r in caplog.records if hasattr(r, "exit_code")] == [2]
@@ -0,0 +1,95 @@
+import pytest
+
+from auto_backup.compaction import (
+    CompactionTracker,
+    parse_compaction_freed_bytes,
+    parse_prune_stats,
+)
+from auto_backup.sizes import format_size, parse_size
+from auto_backup.state import StateDirectory
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path))
+
+
+@pytest.mark.parametrize(
+    "output,freed",
+    [
+        ("compaction freed about 1.23 GB repository space.\n", 1230000000),
+        ("Loading...\ncompaction freed about 512 B repository space.\n", 512),
+        ("nothing to do\n", None),
+        (None, None),
+    ],
+)
+def test_parse_compaction_freed_bytes(output, freed):
+    assert parse_compaction_freed_bytes(output) == freed
+
+
+def test_parse_prune_stats():
+    output = (
+        "Keeping archive: a2\n"
+        "                       Original size      Compressed size    "
+        "Deduplicated size\n"
+        "Deleted data:        -1.23 GB            -1.10 GB           -512.34 MB\n"
+        "All archives:        10.00 GB             8.00 GB              4.00 GB\n"
+    )
+
+    assert parse_prune_stats(output) == (512340000, 4000000000)
+
+
+@pytest.mark.parametrize("output", ["Keeping archive: a2\n", None])
+def test_parse_prune_stats_without_statistics(output):
+    assert parse_prune_stats(output) is None
+
+
+def test_tracker_compacts_when_ratio_reaches_threshold(state):
+    tracker = CompactionTracker(state, "repo", 10)
+
+    assert tracker.record_freed(100, 900)
+    assert tracker.ratio == pytest.approx(0.1)
+
+
+def test_tracker_accumulates_freed_bytes_between_runs(state):
+    assert not CompactionTracker(state, "repo", 10).record_freed(50, 950)
+
+    tracker = CompactionTracker(state, "repo", 10)
+
+    assert tracker.record_freed(50, 900)
+    assert tracker.pending_bytes == 100
+
+
+def test_tracker_reset_clears_pending_bytes(state):
+    tracker = CompactionTracker(state, "repo", 10)
+    tracker.record_freed(500, 500)
+    tracker.reset()
+
+    assert not CompactionTracker(state, "repo", 10).record_freed(0, 1000)
+
+
+def test_tracker_without_state_uses_current_run_only():
+    tracker = CompactionTracker(None, "repo", 10)
+
+    assert not tracker.record_freed(50, 950)
+    assert not tracker.record_freed(50, 950)
+
+
+def test_tracker_ignores_growing_repository(state):
+    tracker = CompactionTracker(state, "repo", 10)
+
+    assert not tracker.record_freed(-100, 1000)
+    assert tracker.pending_bytes == 0
+
+
+@pytest.mark.parametrize(
+    "num_bytes,text",
+    [(0, "0 B"), (999, "999 B"), (1500, "1.50 kB"), (2 * 10**9, "2.00 GB")],
+)
+def test_format_size(num_bytes, text):
+    assert format_size(num_bytes) == text
+
+
+def test_parse_size_rejects_unknown_units():
+    with pytest.raises(ValueError):
+        parse_size("12 XB")
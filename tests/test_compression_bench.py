@@ -0,0 +1,142 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup import benchmark_compression
+from auto_backup.compression_bench import (
+    CodecResult,
+    CompressionBenchmark,
+    CompressionProfiles,
+    SourceSampler,
+    available_codecs,
+    format_benchmark_report,
+    recommend,
+)
+from auto_backup.state import StateDirectory
+
+
+@pytest.fixture
+def source(tmp_path):
+    (tmp_path / "text.txt").write_bytes(b"compress me " * 10000)
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "random.bin").write_bytes(os.urandom(50000))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def codecs():
+    return [
+        ("none", lambda data: data),
+        ("lz4", lambda data: data[: len(data) // 2] if data[0:1] == b"c" else data),
+        ("strong", lambda data: data[: len(data) // 4]),
+    ]
+
+
+def test_sampler_reads_files_below_source(source):
+    blocks = SourceSampler(source, seed=1).sample_blocks()
+
+    assert sum(len(b) for b in blocks) == 120000 + 50000
+
+
+def test_sampler_stops_at_byte_limit(source):
+    blocks = SourceSampler(source, max_bytes=1000, seed=1).sample_blocks()
+
+    assert sum(len(b) for b in blocks) == 1000
+
+
+def test_sampler_limits_number_of_files(source):
+    blocks = SourceSampler(source, max_files=1, seed=1).sample_blocks()
+
+    assert sum(len(b) for b in blocks) in (120000, 50000)
+
+
+def test_benchmark_measures_ratio_of_each_codec(codecs):
+    results = CompressionBenchmark(codecs, include_auto=False).run([b"x" * 400])
+
+    assert [(r.name, r.ratio) for r in results] == [
+        ("none", 1.0),
+        ("lz4", 1.0),
+        ("strong", 0.25),
+    ]
+
+
+def test_auto_variant_skips_blocks_the_predictor_cant_compress(codecs):
+    results = CompressionBenchmark(codecs).run([b"c" * 400, b"x" * 400])
+
+    auto = {r.name: r for r in results}["auto,strong"]
+    assert auto.output_bytes == 100 + 400
+
+
+def test_stdlib_codecs_are_always_available():
+    names = [name for name, _ in available_codecs()]
+
+    assert {"none", "zlib,6", "lzma,6"} <= set(names)
+
+
+def make_result(name, ratio, throughput_mb):
+    return CodecResult(name, 10**6, int(ratio * 10**6), 1 / throughput_mb)
+
+
+@pytest.fixture
+def results():
+    return [
+        make_result("none", 1.0, 5000),
+        make_result("lz4", 0.6, 800),
+        make_result("zstd,3", 0.4, 200),
+        make_result("lzma,6", 0.3, 5),
+    ]
+
+
+def test_recommend_best_ratio_within_cpu_budget(results):
+    assert recommend(results, min_throughput=100e6).name == "zstd,3"
+
+
+def test_recommend_considers_uplink(results):
+    assert recommend(results, uplink=5e8, min_throughput=1e6).name == "lz4"
+
+
+def test_slow_uplink_favours_strong_compression(results):
+    assert recommend(results, uplink=1e6, min_throughput=1e6).name == "lzma,6"
+
+
+def test_recommend_fastest_when_no_codec_meets_cpu_budget(results):
+    assert recommend(results, min_throughput=1e12).name == "none"
+
+
+def test_report_contains_recommendation(results):
+    report = format_benchmark_report("/src", [b"x"], results, results[2], None)
+
+    assert report.splitlines()[-1] == 'Recommended: compression = "zstd,3"'
+
+
+def test_report_names_missing_codec_packages(results):
+    report = format_benchmark_report(
+        "/src", [b"x"], results, results[2], None, ["lz4", "zstandard"]
+    )
+
+    assert "Python packages missing: lz4, zstandard" in report
+
+
+def test_benchmark_of_unknown_task_raises_value_error():
+    setup = MagicMock()
+    setup.find_task.side_effect = KeyError("No task named 'missing'")
+
+    with pytest.raises(ValueError, match="No task named 'missing'"):
+        benchmark_compression(setup, "missing", None, 50, False)
+
+
+def test_benchmark_of_non_backup_task_raises_value_error():
+    setup = MagicMock()
+
+    with pytest.raises(ValueError, match="'prune' is not a backup task"):
+        benchmark_compression(setup, "prune", None, 50, False)
+
+
+def test_profiles_store_compression_per_source(tmp_path):
+    profiles = CompressionProfiles(StateDirectory(str(tmp_path)))
+
+    profiles.save("/data/source", "zstd,3")
+
+    assert profiles.load("/data/source") == "zstd,3"
+    assert profiles.load("/other/source") is None
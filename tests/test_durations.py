@@ -0,0 +1,45 @@
+import datetime
+
+import pytest
+
+from auto_backup.durations import format_duration, parse_duration
+
+
+@pytest.mark.parametrize(
+    "value,seconds",
+    [
+        (90, 90),
+        (1.5, 1.5),
+        ("45s", 45),
+        ("15m", 900),
+        ("1h30m", 5400),
+        ("24h", 86400),
+        ("7d", 604800),
+        ("2w", 1209600),
+        ("1.5h", 5400),
+        (datetime.timedelta(minutes=2), 120),
+    ],
+)
+def test_parse_duration(value, seconds):
+    assert parse_duration(value).total_seconds() == seconds
+
+
+@pytest.mark.parametrize("value", ["", "daily", "10", "5x", "h1", True])
+def test_parse_invalid_duration_raises(value):
+    with pytest.raises(ValueError):
+        parse_duration(value)
+
+
+@pytest.mark.parametrize(
+    "seconds,text",
+    [
+        (0, "0s"),
+        (59, "59s"),
+        (60, "1m"),
+        (3725, "1h 2m"),
+        (93600, "1d 2h"),
+        (-5, "0s"),
+    ],
+)
+def test_format_duration(seconds, text):
+    assert format_duration(datetime.timedelta(seconds=seconds)) == text
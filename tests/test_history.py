@@ -0,0 +1,35 @@
+import pytest
+
+from auto_backup.history import RunHistory
+from auto_backup.state import StateDirectory
+
+
+@pytest.fixture
+def history(tmp_path):
+    return RunHistory(StateDirectory(str(tmp_path)), keep=3)
+
+
+def test_unknown_task_has_no_estimate(history):
+    assert history.estimate("backup") is None
+
+
+def test_estimate_is_median_of_recorded_durations(history):
+    for seconds in (10, 300, 20):
+        history.record("backup", seconds)
+
+    assert history.estimate("backup") == 20
+
+
+def test_keeps_only_recent_durations(history):
+    for seconds in (1, 2, 3, 4):
+        history.record("backup", seconds)
+
+    assert history.durations("backup") == [2, 3, 4]
+
+
+def test_durations_are_kept_per_task(history):
+    history.record("backup", 10)
+    history.record("sync", 20)
+
+    assert history.estimate("backup") == 10
+    assert history.estimate("sync") == 20
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+
+from auto_backup.json_stream import JsonStreamReader
+
+
+@pytest.fixture
+def document():
+    return """{
+    "archives": [
+        {"name": "first", "start": "2020-01-01T10:00:00.000000"},
+        {"name": "second", "start": "2020-01-02T10:00:00.000000"}
+    ],
+    "encryption": {"mode": "repokey"},
+    "repository": {"id": "abc", "last_modified": 123456}
+}
+"""
+
+
+def read(document, chunk_size, item_handlers):
+    reader = JsonStreamReader(io.StringIO(document), chunk_size=chunk_size)
+    return reader.read_object(item_handlers)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1024])
+def test_streams_array_items_to_handler(document, chunk_size):
+    items = []
+
+    read(document, chunk_size, {"archives": items.append})
+
+    assert [i["name"] for i in items] == ["first", "second"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_returns_members_which_are_not_streamed(document, chunk_size):
+    members = read(document, chunk_size, {"archives": lambda item: None})
+
+    assert members == {
+        "encryption": {"mode": "repokey"},
+        "repository": {"id": "abc", "last_modified": 123456},
+    }
+
+
+def test_numbers_split_across_chunks_are_decoded_completely():
+    members = read('{"size": 1234567}', 3, {})
+
+    assert members == {"size": 1234567}
+
+
+def test_empty_array_calls_no_handler():
+    items = []
+
+    read('{"archives": []}', 4, {"archives": items.append})
+
+    assert items == []
+
+
+def test_truncated_document_raises_value_error():
+    with pytest.raises(ValueError):
+        read('{"archives": [{"name": "fir', 4, {"archives": lambda item: None})
+
+
+def test_document_must_be_an_object():
+    with pytest.raises(ValueError):
+        read("[1, 2]", 4, {})
@@ -0,0 +1,74 @@
+import pytest
+
+from auto_backup.outcomes import RunOutcomes
+from auto_backup.state import StateDirectory
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path))
+
+
+@pytest.fixture
+def last_run(state):
+    outcomes = RunOutcomes(state)
+    outcomes.start(["first", "second", "third", "fourth"])
+    outcomes.record("first", "failed")
+    outcomes.record("second", "succeeded")
+    outcomes.record("third", "running")
+    return outcomes
+
+
+def outcome_list(outcomes):
+    return [(t["name"], t["outcome"]) for t in outcomes.load()]
+
+
+def test_outcomes_are_persisted_in_run_order(state, last_run):
+    assert outcome_list(RunOutcomes(state)) == [
+        ("first", "failed"),
+        ("second", "succeeded"),
+        ("third", "running"),
+        ("fourth", "pending"),
+    ]
+
+
+def test_rerun_selects_failed_and_unfinished_tasks(state, last_run):
+    names = RunOutcomes(state).select("failed")
+
+    assert names == ["first", "third", "fourth"]
+
+
+def test_resume_selects_unfinished_tasks(state, last_run):
+    assert RunOutcomes(state).select("unfinished") == ["third", "fourth"]
+
+
+def test_selected_run_keeps_outcomes_of_other_tasks(state, last_run):
+    outcomes = RunOutcomes(state)
+    outcomes.select("unfinished")
+    outcomes.start(["third", "fourth"])
+    outcomes.record("third", "succeeded")
+
+    assert outcome_list(outcomes)[:3] == [
+        ("first", "failed"),
+        ("second", "succeeded"),
+        ("third", "succeeded"),
+    ]
+
+
+def test_new_run_replaces_last_run(state, last_run):
+    outcomes = RunOutcomes(state)
+    outcomes.start(["fifth"])
+
+    assert outcome_list(outcomes) == [("fifth", "pending")]
+
+
+def test_runs_with_other_tags_are_kept_separately(state, last_run):
+    assert RunOutcomes(state, ["nightly"]).select("failed") == []
+
+
+def test_unknown_tasks_are_not_recorded(state):
+    outcomes = RunOutcomes(state)
+    outcomes.start(["first"])
+    outcomes.record("other", "failed")
+
+    assert outcome_list(outcomes) == [("first", "pending")]
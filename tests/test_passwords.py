@@ -0,0 +1,111 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.passwords import PasswordResolver
+from auto_backup.tasks import BorgEnvironments, BorgSubprocessEnvironment
+
+
+@pytest.fixture
+def run_subprocess():
+    run_subprocess = MagicMock()
+    run_subprocess.return_value.stdout = "from-command\n"
+    return run_subprocess
+
+
+@pytest.fixture
+def passwords(run_subprocess):
+    return PasswordResolver(run_subprocess)
+
+
+def test_plain_password(passwords):
+    assert passwords.resolve({"url": "repo", "password": "secret"}) == "secret"
+
+
+def test_password_command_runs_once_per_repository(passwords, run_subprocess):
+    repository = {"url": "repo", "password_command": "pass show borg/repo"}
+
+    assert passwords.resolve(repository) == "from-command"
+    assert passwords.resolve(repository) == "from-command"
+
+    assert run_subprocess.call_count == 1
+    assert run_subprocess.call_args[0][0] == ["pass", "show", "borg/repo"]
+
+
+def test_password_file(passwords, tmp_path):
+    password_file = tmp_path / "password"
+    password_file.write_text("from-file\n")
+
+    repository = {"url": "repo", "password_file": str(password_file)}
+
+    assert passwords.resolve(repository) == "from-file"
+
+
+def test_password_env(passwords, monkeypatch):
+    monkeypatch.setenv("REPO_PASSWORD", "from-env")
+
+    assert passwords.resolve({"url": "repo", "password_env": "REPO_PASSWORD"}) == (
+        "from-env"
+    )
+
+
+def test_missing_environment_variable(passwords, monkeypatch):
+    monkeypatch.delenv("REPO_PASSWORD", raising=False)
+
+    with pytest.raises(ValueError):
+        passwords.resolve({"url": "repo", "password_env": "REPO_PASSWORD"})
+
+
+@pytest.mark.parametrize(
+    "repository",
+    [
+        {"url": "repo"},
+        {"url": "repo", "password": "secret", "password_env": "REPO_PASSWORD"},
+    ],
+)
+def test_validate_requires_exactly_one_password_source(passwords, repository):
+    with pytest.raises(ValueError):
+        passwords.validate(repository)
+
+
+def test_environment_is_built_once(passwords, run_subprocess):
+    repository = {"url": "repo", "password_command": "get-password"}
+    environment = BorgSubprocessEnvironment.for_repository(
+        repository, None, passwords=passwords
+    )
+
+    first = environment.build()
+    first["BORG_PASSPHRASE"] = "modified"
+
+    assert environment.build()["BORG_PASSPHRASE"] == "from-command"
+    assert run_subprocess.call_count == 1
+
+
+def test_shared_environments_resolve_password_once(run_subprocess):
+    repository = {"url": "repo", "password_command": "get-password"}
+    environments = BorgEnvironments()
+
+    for _ in range(2):
+        BorgSubprocessEnvironment.for_repository(
+            repository,
+            None,
+            passwords=PasswordResolver(run_subprocess),
+            environments=environments,
+        ).build()
+
+    assert run_subprocess.call_count == 1
+
+
+def test_environments_differ_per_ssh_command(passwords):
+    repository = {"url": "repo", "password": "secret"}
+    environments = BorgEnvironments()
+
+    first, second = (
+        BorgSubprocessEnvironment.for_repository(
+            repository, ssh, passwords=passwords, environments=environments
+        )
+        for ssh in ("ssh -i key1", "ssh -i key2")
+    )
+
+    assert first.build()["BORG_RSH"] == "ssh -i key1"
+    assert second.build()["BORG_RSH"] == "ssh -i key2"
@@ -0,0 +1,72 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.planning import ExecutionPlan, format_plan
+
+
+class FakeTask(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+@pytest.fixture
+def history():
+    estimates = {"a": 60, "b": 30, "c": 20}
+    history = MagicMock()
+    history.estimate.side_effect = estimates.get
+    return history
+
+
+def tasks(*names):
+    return [FakeTask(name) for name in names]
+
+
+def test_sequential_plan_sums_estimates(history):
+    plan = ExecutionPlan(tasks("a", "b", "c"), history)
+
+    assert [entry.start for entry in plan.entries] == [0, 60, 90]
+    assert plan.total == 110
+
+
+def test_parallel_plan_uses_first_free_lane(history):
+    plan = ExecutionPlan(tasks("a", "b", "c"), history, jobs=2)
+
+    assert [(e.lane, e.start) for e in plan.entries] == [(0, 0), (1, 0), (1, 30)]
+    assert plan.total == 60
+
+
+def test_tasks_without_history_are_reported(history):
+    plan = ExecutionPlan(tasks("a", "new"), history)
+
+    assert [entry.task.name for entry in plan.unknown] == ["new"]
+    assert plan.total == 60
+
+
+def test_empty_plan_has_no_duration(history):
+    assert ExecutionPlan([], history).total == 0
+
+
+def test_format_plan(history):
+    plan = ExecutionPlan(tasks("a", "new"), history, jobs=2)
+
+    lines = format_plan(plan).splitlines()
+
+    assert lines[0] == "Plan for 2 task(s) with 2 parallel job(s)"
+    assert lines[2].split() == ["1", "0s", "1m", "a"]
+    assert lines[3].split() == ["2", "0s", "unknown", "new"]
+    assert lines[-1] == "Estimated total: 1m (1 task(s) without history)"
+
+
+def test_plan_defers_tasks_after_deadline(history):
+    window = MagicMock(deadline="06:00")
+    window.leaves_time_for.side_effect = lambda estimate, start: start + estimate <= 80
+
+    plan = ExecutionPlan(tasks("a", "b", "c"), history, backup_window=window)
+
+    assert [e.task.name for e in plan.deferred] == ["b"]
+    assert plan.total == 80
+    assert "1 task(s) deferred to finish by 06:00" in format_plan(plan)
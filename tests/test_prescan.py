@@ -0,0 +1,182 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.patterns import ExcludeMatcher
+from auto_backup.prescan import ParallelScanner, SourcePrescan, format_scan
+from auto_backup.state import StateDirectory
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / "source"
+    for path, size in [
+        ("a.txt", 10),
+        ("b.tmp", 100),
+        ("docs/c.txt", 20),
+        ("docs/deep/d.txt", 30),
+        ("cache/e.bin", 1000),
+    ]:
+        target = source / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(b"x" * size)
+    (source / "cache" / "CACHEDIR.TAG").write_text("")
+    return source
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path / "state"))
+
+
+def make_task(name, source, excludes=[], markers=[]):
+    task = MagicMock()
+    task.name = name
+    task.scan = None
+    task.command = MagicMock(spec=["source", "exclude_patterns", "exclude_if_present"])
+    task.command.source = str(source)
+    task.command.exclude_patterns.return_value = excludes
+    task.command.exclude_if_present = markers
+    return task
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_scan_counts_all_files(source, workers):
+    scan = ParallelScanner(workers).scan(str(source), ExcludeMatcher(), None)
+
+    assert (scan.files, scan.total_bytes) == (6, 1160)
+    assert (scan.changed_files, scan.changed_bytes) == (6, 1160)
+
+
+class ConcurrentScanner(ParallelScanner):
+    def __init__(self, max_workers):
+        super().__init__(max_workers)
+        self.barrier = threading.Barrier(2, timeout=5)
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def _scan_directory(self, path, relative, matcher, since):
+        with self.lock:
+            self.waiting += 1
+            wait = relative and self.waiting <= 3
+        if wait:
+            self.barrier.wait()
+        return super()._scan_directory(path, relative, matcher, since)
+
+
+def test_wide_tree_is_scanned_concurrently(tmp_path):
+    for index in range(8):
+        (tmp_path / f"dir{index}").mkdir()
+        (tmp_path / f"dir{index}" / "file").write_bytes(b"x")
+
+    scan = ConcurrentScanner(4).scan(str(tmp_path), ExcludeMatcher(), None)
+
+    assert scan.files == 8
+
+
+def test_scan_honours_excludes_and_markers(source):
+    matcher = ExcludeMatcher(["*.tmp", "sh:**/deep"], ["CACHEDIR.TAG"])
+
+    scan = ParallelScanner().scan(str(source), matcher, None)
+
+    assert (scan.files, scan.total_bytes) == (2, 30)
+
+
+def test_scan_without_commit_writes_no_snapshot(source, state):
+    prescan = SourcePrescan(state)
+    prescan.run([make_task("backup", source)])
+    task = make_task("backup", source)
+
+    prescan.run([task])
+
+    assert not state.exists("prescan")
+    assert task.scan.changed_files == 6
+
+
+def test_changes_count_from_last_committed_scan(source, state):
+    prescan = SourcePrescan(state)
+    first = make_task("backup", source)
+    prescan.run([first])
+    prescan.commit(first)
+    time.sleep(0.1)
+    (source / "docs" / "c.txt").write_bytes(b"y" * 25)
+
+    task = make_task("backup", source)
+    prescan.run([task])
+
+    assert (task.scan.files, task.scan.total_bytes) == (6, 1165)
+    assert (task.scan.changed_files, task.scan.changed_bytes) == (1, 25)
+
+
+def test_tasks_without_source_are_not_scanned(state):
+    task = MagicMock(scan=None)
+    task.command = MagicMock(spec=["execute"])
+
+    SourcePrescan(state).run([task])
+
+    assert task.scan is None
+
+
+def test_group_scan_combines_member_sources(source, state):
+    docs = make_task("docs", source / "docs").command
+    cache = make_task("cache", source / "cache").command
+    group = MagicMock(scan=None)
+    group.command.commands = [docs, cache]
+
+    SourcePrescan(state).run([group])
+
+    assert (group.scan.files, group.scan.total_bytes) == (4, 1050)
+
+
+@pytest.mark.parametrize(
+    "pattern,path,excluded",
+    [
+        ("*.tmp", "dir/file.tmp", True),
+        ("docs", "docs/file", True),
+        ("docs", "other/docs", False),
+        ("sh:**/cache", "a/b/cache/file", True),
+        ("sh:*.log", "dir/file.log", False),
+        ("re:\\.log$", "dir/file.log", True),
+        ("pp:build", "build/out", True),
+        ("pp:build", "buildx", False),
+        ("pf:a/b", "a/b", True),
+    ],
+)
+def test_exclude_matcher(pattern, path, excluded):
+    assert ExcludeMatcher([pattern]).excludes(path) == excluded
+
+
+@pytest.mark.parametrize(
+    "path,excluded",
+    [
+        ("x/file.bak", True),
+        ("a/cache/file.tmp", True),
+        ("a/cache/file.dat", False),
+        ("build/deep/out", True),
+        ("a/b", True),
+        ("a/b/c", False),
+        ("dir/FILE.LOG", True),
+        ("dir/file.txt", False),
+    ],
+)
+def test_exclude_matcher_combines_patterns(path, excluded):
+    matcher = ExcludeMatcher(
+        [
+            "x/*.bak",
+            "sh:**/cache/*.tmp",
+            "pp:build",
+            "pf:a/b",
+            "re:\\.tmp$",
+            "re:(?i)\\.log$",
+        ]
+    )
+
+    assert matcher.excludes(path) == excluded
+
+
+def test_format_scan(source):
+    scan = ParallelScanner().scan(str(source), ExcludeMatcher(), None)
+
+    assert format_scan(scan) == "1.16 kB in 6 file(s), 1.16 kB in 6 file(s) changed"
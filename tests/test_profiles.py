@@ -0,0 +1,65 @@
+import pytest
+
+from auto_backup.profiles import BackupProfile, BackupProfiles
+
+
+def arguments(**options):
+    return BackupProfile("test", options).arguments
+
+
+@pytest.mark.parametrize(
+    "options,reference",
+    [
+        ({"files_cache": "ctime,size"}, ["--files-cache", "ctime,size"]),
+        (
+            {"chunker_params": "buzhash,19,23,21,4095"},
+            ["--chunker-params", "buzhash,19,23,21,4095"],
+        ),
+        ({"chunker_params": "fixed,4194304"}, ["--chunker-params", "fixed,4194304"]),
+        ({"checkpoint_interval": 600}, ["--checkpoint-interval", "600"]),
+        ({"checkpoint_interval": "15m"}, ["--checkpoint-interval", "900"]),
+        ({"one_file_system": True}, ["--one-file-system"]),
+        ({"one_file_system": False}, []),
+        ({"noatime": True}, ["--noatime"]),
+        ({"upload_ratelimit": 2048}, []),
+        ({"compression": "zstd,3"}, []),
+    ],
+)
+def test_profile_option_arguments(options, reference):
+    assert arguments(**options) == reference
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"files_cache": "ctime,fast"},
+        {"chunker_params": "huge"},
+        {"checkpoint_interval": "soon"},
+        {"checkpoint_interval": 0},
+        {"one_file_system": "yes"},
+        {"upload_ratelimit": "10M"},
+        {"upload_ratelimit": -1},
+        {"compression": ""},
+        {"unknown_option": 1},
+    ],
+)
+def test_invalid_profile_options_raise(options):
+    with pytest.raises(ValueError, match="Backup profile 'test'"):
+        arguments(**options)
+
+
+def test_profile_keeps_upload_ratelimit():
+    assert BackupProfile("test", {"upload_ratelimit": 2048}).upload_ratelimit == 2048
+
+
+def test_profiles_from_config_section():
+    profiles = BackupProfiles.from_config(
+        {"backup_profiles": {"vm": {"files_cache": "disabled"}}}
+    )
+
+    assert profiles.get("vm").arguments == ["--files-cache", "disabled"]
+
+
+def test_unknown_profile_raises():
+    with pytest.raises(ValueError, match="Unknown backup profile 'vm'"):
+        BackupProfiles({}).get("vm")
@@ -1,11 +1,15 @@
+import datetime
 from unittest.mock import MagicMock
 
 import pytest
 
 from auto_backup import ProgramSetup
+from auto_backup.borg_verify import BorgVerifyCommand
+from auto_backup.rclone_verify import RcloneVerifyCommand
 from auto_backup.tasks import (
     BackupCommand,
     CheckBackupsCommand,
+    CompactCommand,
     PruneBackupsCommand,
     RcloneCommand,
 )
@@ -89,6 +93,9 @@ def test_create_notification(setup):
         ("backup", BackupCommand),
         ("prune", PruneBackupsCommand),
         ("check", CheckBackupsCommand),
+        ("compact", CompactCommand),
+        ("rclone_verify", RcloneVerifyCommand),
+        ("verify", BorgVerifyCommand),
     ],
 )
 def test_default_command_factories(setup, task_config, command_type, target_type):
@@ -123,3 +130,164 @@ def test_create_task_list_from_task_section(
     task_list = setup.task_list
 
     assert list(task_list) == ["task1", "task2"]
+
+
+def test_state_directory_from_general_section(setup, config):
+    config["general"] = {"state_dir": "/my/state"}
+
+    assert setup.state.path == "/my/state"
+
+
+def test_state_directory_has_default(setup):
+    assert setup.state.path.endswith("auto-backup")
+
+
+def test_find_task_by_name(setup, config):
+    config["tasks"] = [
+        {"name": "other", "type": "testfail", "tags": []},
+        {"name": "wanted", "type": "backup", "tags": [], "source": "/src"},
+    ]
+    setup.notify = None
+
+    task = setup.find_task("wanted")
+
+    assert task.command.source == "/src"
+
+
+def test_find_unknown_task_raises(setup):
+    with pytest.raises(KeyError):
+        setup.find_task("unknown")
+
+
+def test_validate_reports_invalid_backup_profile(setup, config):
+    config["backup_profiles"] = {"vm": {"files_cache": "sometimes"}}
+
+    with pytest.raises(ValueError, match="Backup profile 'vm'"):
+        setup.validate()
+
+
+def test_validate_reports_task_with_unknown_profile(setup, config):
+    config["tasks"] = [
+        {"name": "b", "type": "backup", "tags": [], "source": "/", "profile": "vm"}
+    ]
+    setup.notify = None
+
+    with pytest.raises(ValueError, match="Unknown backup profile 'vm'"):
+        setup.validate()
+
+
+def test_no_bandwidth_limiter_without_section(setup):
+    assert setup.bandwidth_limiter is None
+
+
+def test_bandwidth_limiter_splits_cap_between_jobs(setup, config):
+    config["general"] = {"jobs": 2}
+    config["bandwidth"] = {"shared_cap": "4M"}
+
+    assert setup.bandwidth_limiter.rclone_bwlimit() == "2048k"
+
+
+def test_jobs_default_to_one(setup):
+    assert setup.jobs == 1
+
+
+@pytest.mark.parametrize("jobs", [0, "2", True])
+def test_validate_reports_invalid_jobs(setup, config, jobs):
+    config["general"] = {"jobs": jobs}
+
+    with pytest.raises(ValueError, match="jobs"):
+        setup.validate()
+
+
+def test_validate_reports_watched_task_without_source(setup, config):
+    config["tasks"] = [{"name": "p", "type": "prune", "tags": [], "watch": True}]
+    setup.notify = None
+
+    with pytest.raises(ValueError, match="Task 'p' can't be watched"):
+        setup.validate()
+
+
+def test_no_ssh_multiplexer_by_default(setup):
+    assert setup.ssh_multiplexer is None
+
+
+def test_ssh_multiplexer_from_general_section(setup, config):
+    config["general"] = {"ssh_multiplexing": True}
+
+    assert setup.ssh_multiplexer is not None
+
+
+def test_validate_reports_unknown_task_order(setup, config):
+    config["general"] = {"order": "random"}
+
+    with pytest.raises(ValueError, match="Unknown task order"):
+        setup.validate()
+
+
+def test_no_backup_window_without_deadline(setup):
+    assert setup.backup_window is None
+
+
+def test_backup_window_from_general_section(setup, config):
+    config["general"] = {"deadline": "06:00"}
+
+    assert setup.backup_window.end.hour == 6
+
+
+def test_backup_window_length_from_general_section(setup, config):
+    config["general"] = {"deadline": "06:00", "backup_window": "8h"}
+
+    window = setup.backup_window
+
+    assert window.end - window.start == datetime.timedelta(hours=8)
+
+
+def test_each_task_runner_gets_a_fresh_backup_window(setup, config):
+    config["general"] = {"deadline": "06:00"}
+
+    first = setup.create_task_runner().backup_window
+    second = setup.create_task_runner().backup_window
+
+    assert first is not second
+
+
+def test_restore_test_uses_referenced_backup_task(setup, config):
+    config["tasks"] = [
+        {"name": "wanted", "type": "backup", "tags": [], "source": "/src"},
+        {"name": "restore", "type": "restore_test", "tags": [], "backup": "wanted"},
+    ]
+    setup.notify = None
+
+    task = setup.find_task("restore")
+
+    assert task.command.backup_command.source == "/src"
+
+
+def test_tasks_of_one_repository_share_borg_environment(setup, config):
+    config["tasks"] = [
+        {"name": "backup", "type": "backup", "tags": [], "source": "/src"},
+        {"name": "prune", "type": "prune", "tags": []},
+    ]
+    setup.notify = None
+
+    backup = setup.find_task("backup").command
+    prune = setup.find_task("prune").command
+
+    assert backup.subprocess_environment is prune.subprocess_environment
+
+
+def test_run_lock_is_shared_by_default(setup):
+    assert setup.create_run_lock(["nightly"]).name == "run"
+
+
+def test_run_lock_per_tag_set(setup, config):
+    config["general"] = {"lock_per_tags": True}
+
+    assert setup.create_run_lock(["nightly"]).name != "run"
+
+
+def test_validate_reports_unknown_lock_policy(setup, config):
+    config["general"] = {"lock": "ignore"}
+
+    with pytest.raises(ValueError, match="Unknown lock policy"):
+        setup.validate()
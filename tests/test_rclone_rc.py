@@ -0,0 +1,211 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.rclone_rc import (
+    RcloneDaemon,
+    RcloneDaemons,
+    RcloneRcClient,
+    RcloneRcError,
+)
+
+
+class StubRcServer(HTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubRcHandler)
+        self.calls = []
+        self.authorizations = []
+        self.job_status = [{"finished": True, "success": True, "error": ""}]
+        self.stats = {"bytes": 2048, "transfers": 2, "checks": 5, "errors": 0}
+
+    @property
+    def address(self):
+        return f"127.0.0.1:{self.server_address[1]}"
+
+
+class StubRcHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        params = json.loads(self.rfile.read(length))
+        self.server.calls.append((self.path.lstrip("/"), params))
+        self.server.authorizations.append(self.headers.get("Authorization"))
+        status, body = self._respond(self.path.lstrip("/"))
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def _respond(self, method):
+        if method in ("sync/sync", "sync/copy"):
+            return 200, {"jobid": 7}
+        if method == "job/status":
+            statuses = self.server.job_status
+            return 200, statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        if method == "core/stats":
+            return 200, self.server.stats
+        if method in ("rc/noop", "core/quit"):
+            return 200, {}
+        return 404, {"error": "couldn't find method"}
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubRcServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def popen():
+    process = MagicMock()
+    process.poll.return_value = None
+    return MagicMock(return_value=process)
+
+
+@pytest.fixture
+def daemon(server, popen):
+    daemon = RcloneDaemon(
+        "/my/rclone.conf", address=server.address, poll_interval=0, popen=popen
+    )
+    daemon.start()
+    return daemon
+
+
+def methods(server):
+    return [method for method, _ in server.calls]
+
+
+def test_client_sends_credentials(server):
+    RcloneRcClient(f"http://{server.address}", "user", "secret").call("rc/noop")
+
+    assert server.authorizations == ["Basic dXNlcjpzZWNyZXQ="]
+
+
+def test_client_bypasses_http_proxy(server, monkeypatch):
+    monkeypatch.setenv("http_proxy", "http://127.0.0.1:9")
+    monkeypatch.setenv("HTTP_PROXY", "http://127.0.0.1:9")
+    monkeypatch.delenv("no_proxy", raising=False)
+    monkeypatch.delenv("NO_PROXY", raising=False)
+
+    RcloneRcClient(f"http://{server.address}").call("rc/noop")
+
+    assert methods(server) == ["rc/noop"]
+
+
+def test_client_raises_on_error_response(server):
+    client = RcloneRcClient(f"http://{server.address}")
+
+    with pytest.raises(RcloneRcError, match="couldn't find method"):
+        client.call("unknown/method")
+
+
+def test_daemon_starts_rcd_with_config(daemon, server, popen):
+    args = popen.call_args[0][0]
+
+    assert args[:4] == ["rclone", "rcd", "--config", "/my/rclone.conf"]
+    assert args[args.index("--rc-addr") + 1] == server.address
+    assert methods(server) == ["rc/noop"]
+
+
+def test_daemon_passes_rc_password_in_environment(daemon, popen):
+    args = popen.call_args[0][0]
+    env = popen.call_args[1]["env"]
+
+    assert "--rc-pass" not in args
+    assert daemon.password not in args
+    assert env["RCLONE_RC_PASS"] == daemon.password
+    assert args[args.index("--rc-user") + 1] == daemon.user
+
+
+def test_daemon_passes_bandwidth_limit(server, popen):
+    RcloneDaemon("cfg", bwlimit="1M", address=server.address, popen=popen).start()
+
+    args = popen.call_args[0][0]
+    assert args[-2:] == ["--bwlimit", "1M"]
+
+
+def test_sync_submits_async_job(daemon, server):
+    daemon.sync("remote:path", "/local")
+
+    method, params = server.calls[1]
+    assert method == "sync/sync"
+    assert params == {"srcFs": "remote:path", "dstFs": "/local", "_async": True}
+
+
+def test_copy_submits_job_with_max_age_filter(daemon, server):
+    daemon.copy("remote:path", "/local", 3600)
+
+    method, params = server.calls[1]
+    assert method == "sync/copy"
+    assert params["_filter"] == {"MaxAge": "3600s"}
+
+
+def test_sync_polls_until_job_is_finished(daemon, server):
+    server.job_status = [
+        {"finished": False},
+        {"finished": True, "success": True, "error": ""},
+    ]
+
+    daemon.sync("remote:path", "/local")
+
+    assert methods(server)[2:] == ["job/status", "core/stats"] * 2
+    assert server.calls[3][1] == {"group": "job/7"}
+
+
+def test_sync_reports_transfer_stats(daemon, caplog):
+    caplog.set_level("INFO")
+
+    daemon.sync("remote:path", "/local")
+
+    assert "2.05 kB in 2 file(s), 5 check(s), 0 error(s)" in caplog.text
+
+
+def test_failed_job_raises(daemon, server):
+    server.job_status = [{"finished": True, "success": False, "error": "denied"}]
+
+    with pytest.raises(RcloneRcError, match="denied"):
+        daemon.sync("remote:path", "/local")
+
+
+def test_shutdown_quits_daemon(daemon, server, popen):
+    daemon.shutdown()
+
+    assert methods(server)[-1] == "core/quit"
+    assert popen.return_value.wait.call_count == 1
+
+
+def test_daemon_exiting_during_startup_raises(server, popen):
+    popen.return_value.poll.return_value = 1
+    daemon = RcloneDaemon("cfg", address=server.address, popen=popen)
+
+    with pytest.raises(RcloneRcError, match="exited during startup"):
+        daemon.start()
+
+
+def test_one_daemon_per_config_file():
+    factory = MagicMock(side_effect=lambda config_file, bwlimit: MagicMock())
+    daemons = RcloneDaemons(daemon_factory=factory)
+
+    first = daemons.get("a.conf")
+
+    assert daemons.get("a.conf") is first
+    assert daemons.get("b.conf") is not first
+    assert factory.call_count == 2
+
+
+def test_shutdown_stops_all_daemons():
+    daemons = RcloneDaemons(daemon_factory=lambda c, bwlimit: MagicMock())
+    started = [daemons.get("a.conf"), daemons.get("b.conf")]
+
+    daemons.shutdown()
+
+    assert [daemon.shutdown.call_count for daemon in started] == [1, 1]
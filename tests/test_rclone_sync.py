@@ -0,0 +1,36 @@
+import pytest
+
+from auto_backup.rclone_sync import RcloneSyncTracker
+from auto_backup.state import StateDirectory
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return RcloneSyncTracker(StateDirectory(str(tmp_path)), "task", "7d", margin=60)
+
+
+def test_first_run_is_full_sync(tracker):
+    assert tracker.top_up_max_age(1000) is None
+
+
+def test_top_up_covers_time_since_last_sync(tracker):
+    tracker.record(10 * DAY, full=True)
+    tracker.record(11 * DAY, full=False)
+
+    assert tracker.top_up_max_age(12 * DAY) == DAY + 60
+
+
+def test_full_sync_after_cadence_elapsed(tracker):
+    tracker.record(10 * DAY, full=True)
+    tracker.record(16 * DAY, full=False)
+
+    assert tracker.top_up_max_age(17 * DAY) is None
+
+
+def test_state_is_kept_per_task(tmp_path, tracker):
+    tracker.record(10 * DAY, full=True)
+    other = RcloneSyncTracker(StateDirectory(str(tmp_path)), "other", "7d")
+
+    assert other.top_up_max_age(11 * DAY) is None
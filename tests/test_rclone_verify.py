@@ -0,0 +1,158 @@
+import hashlib
+import subprocess
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.rclone_verify import (
+    RcloneVerifyCommand,
+    VerificationSample,
+    parse_hashsum_output,
+)
+from auto_backup.state import StateDirectory
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path / "state"))
+
+
+@pytest.fixture
+def destination(tmp_path):
+    directory = tmp_path / "data"
+    (directory / "sub").mkdir(parents=True)
+    for name in ("a", "b", "sub/c", "sub/d"):
+        (directory / name).write_bytes(name.encode())
+    return directory
+
+
+def md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def hashsum_output(*paths, wrong=()):
+    lines = []
+    for path in paths:
+        data = b"changed" if path in wrong else path.encode()
+        lines.append(f"{md5(data)}  {path}")
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture
+def run_subprocess():
+    run_subprocess = MagicMock()
+    run_subprocess.return_value.stdout = hashsum_output("a", "b", "sub/c", "sub/d")
+    return run_subprocess
+
+
+@pytest.fixture
+def notify():
+    return MagicMock()
+
+
+@pytest.fixture
+def verify(destination, notify, state, run_subprocess):
+    def create_command(**kwargs):
+        return RcloneVerifyCommand(
+            "/my/rclone.conf",
+            "remote:data",
+            str(destination),
+            notify,
+            state=state,
+            run_subprocess=run_subprocess,
+            **kwargs,
+        )
+
+    return create_command
+
+
+def test_parse_hashsum_output():
+    output = "0cc175b9c0f1b6a831c399e269772661  dir/file name\nERROR: failed\n"
+
+    reference = {"dir/file name": "0cc175b9c0f1b6a831c399e269772661"}
+    assert parse_hashsum_output(output) == reference
+
+
+def test_sample_size_is_percentage_of_files():
+    sample = VerificationSample(None, "task", 25)
+
+    assert len(sample.select([str(n) for n in range(10)])) == 3
+
+
+def test_sample_rotates_until_all_files_are_covered(state):
+    paths = [str(n) for n in range(10)]
+    covered = set()
+    for _ in range(4):
+        sample = VerificationSample(state, "task", 25)
+        selected = sample.select(paths)
+        sample.advance(len(selected), len(paths))
+        covered.update(selected)
+
+    assert covered == set(paths)
+
+
+def test_calls_rclone_hashsum_for_sample(verify, run_subprocess):
+    verify(percentage=100).execute()
+
+    args = run_subprocess.call_args[0][0]
+    assert args[:6] == (
+        "rclone",
+        "--config",
+        "/my/rclone.conf",
+        "hashsum",
+        "MD5",
+        "remote:data",
+    )
+    assert args[6] == "--files-from"
+
+
+def test_matching_files_are_not_reported(verify, notify):
+    verify(percentage=100).execute()
+
+    assert notify.message.call_count == 0
+
+
+def test_mismatches_are_reported(verify, notify, run_subprocess):
+    output = hashsum_output("a", "b", "sub/d", wrong=("b",))
+    run_subprocess.return_value.stdout = output
+
+    verify(percentage=100).execute()
+
+    message = notify.message.call_args[0][0]
+    assert "2 of 4 sampled file(s) differ: b, sub/c" in message
+
+
+def test_files_reported_missing_are_compared(verify, notify, run_subprocess):
+    output = hashsum_output("a", "b", "sub/c")
+    stderr = "ERROR : sub/d: error reading source: object not found\n"
+    run_subprocess.side_effect = subprocess.CalledProcessError(
+        1, "rclone", output, stderr
+    )
+
+    verify(percentage=100).execute()
+
+    assert notify.message.call_args[0][0].endswith("differ: sub/d")
+
+
+@pytest.mark.parametrize("output", ["", hashsum_output("a")], ids=["empty", "partial"])
+def test_failing_hashsum_raises_and_keeps_cursor(verify, state, run_subprocess, output):
+    error = subprocess.CalledProcessError(1, "rclone", output, "Failed to hashsum\n")
+    run_subprocess.side_effect = error
+    command = verify(percentage=50)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        command.execute()
+
+    assert state.load(command._create_sample().file_name, {}).get("cursor", 0) == 0
+
+
+def test_exhausted_time_budget_skips_hashing(verify, run_subprocess, notify):
+    verify(percentage=100, time_budget=-1).execute()
+
+    assert run_subprocess.call_count == 0
+    assert notify.message.call_count == 0
+
+
+def test_unsupported_hash_raises(verify):
+    with pytest.raises(ValueError, match="Unsupported hash"):
+        verify(hash="crc32")
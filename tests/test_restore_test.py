@@ -0,0 +1,190 @@
+import contextlib
+import datetime
+import json
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.restore_test import ArchiveItemSampler, RestoreTestCommand
+from auto_backup.state import StateDirectory
+from auto_backup.tasks import BackupCommand
+
+
+@pytest.fixture
+def source(tmp_path):
+    directory = tmp_path / "source"
+    (directory / "docs").mkdir(parents=True)
+    for name in ("a", "docs/b"):
+        (directory / name).write_bytes(name.encode())
+    return directory
+
+
+@pytest.fixture
+def config():
+    return {"repositories": {"repo": {"url": "my-url", "password": "secret"}}}
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path / "state"))
+
+
+@pytest.fixture
+def backup_task(source, config, state):
+    task = MagicMock()
+    task.command = BackupCommand(str(source), "repo", config, state=state)
+    task.command.record_archive("host-2024-01-01")
+    return task
+
+
+def archive_item(source, path, item_type="-"):
+    mtime = os.stat(source / path).st_mtime if item_type == "-" else 0
+    return {
+        "type": item_type,
+        "path": path,
+        "size": 100,
+        "mtime": datetime.datetime.fromtimestamp(mtime).isoformat(),
+    }
+
+
+@pytest.fixture
+def archive():
+    return {"a": b"a", "docs/b": b"docs/b"}
+
+
+@pytest.fixture
+def run_subprocess(archive):
+    def fake_borg(args, **kwargs):
+        result = MagicMock(stdout="host-2024-01-01\n")
+        if args[1] == "extract":
+            for path in args[3:]:
+                target = os.path.join(kwargs["cwd"], path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as restored:
+                    restored.write(archive[path])
+        return result
+
+    return MagicMock(side_effect=fake_borg)
+
+
+@pytest.fixture
+def stream_subprocess(source):
+    items = [
+        archive_item(source, "docs", "d"),
+        archive_item(source, "a"),
+        archive_item(source, "docs/b"),
+    ]
+
+    @contextlib.contextmanager
+    def stream(args, **kwargs):
+        yield iter(json.dumps(item) + "\n" for item in items)
+
+    return MagicMock(side_effect=stream)
+
+
+@pytest.fixture
+def notify():
+    return MagicMock()
+
+
+@pytest.fixture
+def restore_test(backup_task, notify, run_subprocess, stream_subprocess):
+    return RestoreTestCommand(
+        "My backup",
+        notify,
+        lambda name: backup_task,
+        run_subprocess=run_subprocess,
+        stream_subprocess=stream_subprocess,
+    )
+
+
+def called_args(run_subprocess):
+    return [c[0][0] for c in run_subprocess.call_args_list]
+
+
+def test_sampler_keeps_only_regular_files():
+    sampler = ArchiveItemSampler(5)
+    for item_type in ("d", "-", "l", "-"):
+        sampler.add({"type": item_type})
+
+    assert len(sampler.sample) == 2
+
+
+def test_sampler_limits_sample_size():
+    sampler = ArchiveItemSampler(3, seed=1)
+    for number in range(100):
+        sampler.add({"type": "-", "path": str(number)})
+
+    assert len(sampler.sample) == 3
+    assert sampler.seen == 100
+
+
+def test_extracts_sample_from_recorded_archive(restore_test, run_subprocess):
+    restore_test.execute()
+
+    calls = called_args(run_subprocess)
+    assert calls[0][:3] == ["borg", "extract", "my-url::host-2024-01-01"]
+    assert sorted(calls[0][3:]) == ["a", "docs/b"]
+
+
+def test_archive_of_other_task_in_same_repository_is_ignored(
+    restore_test, backup_task, config, state, tmp_path, run_subprocess
+):
+    other = BackupCommand(str(tmp_path / "other"), "repo", config, state=state)
+    other.record_archive("host-2024-01-02")
+
+    restore_test.execute()
+
+    assert called_args(run_subprocess)[0][2] == "my-url::host-2024-01-01"
+
+
+def test_backup_without_recorded_archive_fails(
+    backup_task, config, source, notify, run_subprocess, stream_subprocess
+):
+    backup_task.command = BackupCommand(str(source), "repo", config)
+
+    with pytest.raises(RuntimeError, match="No archive"):
+        RestoreTestCommand(
+            "My backup",
+            notify,
+            lambda name: backup_task,
+            run_subprocess=run_subprocess,
+            stream_subprocess=stream_subprocess,
+        ).execute()
+
+
+def test_matching_restore_is_logged(restore_test, notify, caplog):
+    caplog.set_level("INFO")
+
+    restore_test.execute()
+
+    assert "restored 2 file(s) with 200 B" in caplog.text
+    assert "0 mismatch(es), 0 changed since backup" in caplog.text
+    assert notify.message.call_count == 0
+
+
+def test_mismatch_is_reported(restore_test, archive, notify):
+    archive["docs/b"] = b"corrupted"
+
+    restore_test.execute()
+
+    message = notify.message.call_args[0][0]
+    assert "1 mismatch(es)" in message
+    assert message.endswith("differing files: docs/b")
+
+
+def test_files_changed_since_backup_are_not_compared(restore_test, source, notify):
+    (source / "a").write_bytes(b"new content")
+    os.utime(source / "a", (0, 0))
+
+    restore_test.execute()
+
+    assert notify.message.call_count == 0
+
+
+def test_referenced_task_must_be_backup(notify):
+    other_task = MagicMock()
+
+    with pytest.raises(ValueError, match="'Sync' is not a backup task"):
+        RestoreTestCommand("Sync", notify, lambda name: other_task)
@@ -0,0 +1,97 @@
+import json
+import threading
+
+import pytest
+
+from auto_backup import run_lock
+from auto_backup.run_lock import RunLock
+from auto_backup.state import StateDirectory
+
+requires_fcntl = pytest.mark.skipif(
+    run_lock.fcntl is None, reason="fcntl is not available"
+)
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path))
+
+
+@pytest.fixture
+def held_lock(state):
+    lock = RunLock(state, "skip")
+    assert lock.acquire()
+    yield lock
+    lock.release()
+
+
+def recorded_outcome(state, name="run"):
+    return json.loads(open(state.file_path("run_lock.json")).read())[name]
+
+
+@requires_fcntl
+def test_acquires_free_lock(state):
+    lock = RunLock(state, "skip")
+
+    assert lock.acquire()
+    lock.release()
+    assert recorded_outcome(state)["outcome"] == "acquired"
+
+
+@requires_fcntl
+def test_skip_policy_gives_up_immediately(state, held_lock):
+    assert not RunLock(state, "skip").acquire()
+    assert recorded_outcome(state)["outcome"] == "skipped"
+
+
+@requires_fcntl
+def test_wait_policy_gives_up_after_timeout(state, held_lock):
+    lock = RunLock(state, "wait", timeout=0.2, poll_interval=0.05)
+
+    assert not lock.acquire()
+    assert recorded_outcome(state)["waited"] >= 0.2
+
+
+@requires_fcntl
+def test_wait_policy_acquires_released_lock(state, held_lock):
+    threading.Timer(0.1, held_lock.release).start()
+    lock = RunLock(state, "wait", timeout=5, poll_interval=0.05)
+
+    assert lock.acquire()
+    lock.release()
+
+
+@requires_fcntl
+def test_queue_policy_waits_for_release(state, held_lock):
+    threading.Timer(0.1, held_lock.release).start()
+    lock = RunLock(state, "queue")
+
+    assert lock.acquire()
+    lock.release()
+
+
+@requires_fcntl
+def test_none_policy_never_locks(state, held_lock):
+    assert RunLock(state, "none").acquire()
+
+
+@requires_fcntl
+def test_lock_per_tag_set(state, held_lock):
+    lock = RunLock(state, "skip", tags=["b", "a"])
+
+    assert lock.acquire()
+    assert RunLock(state, "skip", tags=["a", "b"]).acquire() is False
+    lock.release()
+
+
+def test_unknown_policy_raises(state):
+    with pytest.raises(ValueError, match="Unknown lock policy"):
+        RunLock(state, "ignore")
+
+
+def test_missing_fcntl_runs_without_lock(state, monkeypatch, caplog):
+    monkeypatch.setattr(run_lock, "fcntl", None)
+
+    assert RunLock(state, "skip").acquire()
+    assert "File locking is not available" in caplog.text
+    assert not state.exists("run_lock.json")
@@ -0,0 +1,106 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.runner import TaskRunner
+
+
+def make_task(name, result=0):
+    task = MagicMock()
+    task.name = name
+    task.members.return_value = [task]
+    task.failed_members.return_value = [task]
+    task.__str__.return_value = name
+    task.safe_execute.return_value = result
+    return task
+
+
+@pytest.fixture
+def tasks():
+    return [make_task("first"), make_task("second", result=1)]
+
+
+@pytest.fixture
+def history():
+    history = MagicMock()
+    history.estimate.side_effect = {"first": 3600, "second": 60}.get
+    return history
+
+
+def test_runs_all_tasks(tasks):
+    assert TaskRunner().run(tasks) == [0, 1]
+
+
+def test_runs_all_tasks_with_parallel_jobs(tasks):
+    assert TaskRunner(jobs=2).run(tasks) == [0, 1]
+
+
+def test_records_duration_of_successful_tasks(tasks, history):
+    TaskRunner(history=history).run(tasks)
+
+    assert [c[0][0] for c in history.record.call_args_list] == ["first"]
+
+
+def test_defers_tasks_not_finishing_in_backup_window(tasks, history):
+    window = MagicMock(deadline="06:00")
+    window.leaves_time_for.side_effect = lambda estimate: estimate < 600
+
+    results = TaskRunner(history=history, backup_window=window).run(tasks)
+
+    assert results == [None, 1]
+    assert tasks[0].safe_execute.call_count == 0
+    message = tasks[0].notify.message.call_args[0][0]
+    assert message == "Deferred to finish by 06:00: first"
+
+
+def test_no_deferral_report_if_everything_fits(tasks, history):
+    window = MagicMock(deadline="06:00")
+    window.leaves_time_for.return_value = True
+
+    TaskRunner(history=history, backup_window=window).run(tasks)
+
+    assert tasks[0].notify.message.call_count == 0
+
+
+def test_logs_task_phases(tasks, caplog):
+    caplog.set_level("INFO")
+
+    TaskRunner().run(tasks[:1])
+
+    start, end = caplog.records
+    assert start.phase == "start"
+    assert (end.phase, end.result) == ("end", 0)
+
+
+def test_records_outcome_of_each_task(tasks):
+    outcomes = MagicMock()
+
+    TaskRunner(outcomes=outcomes).run(tasks)
+
+    outcomes.start.assert_called_once_with(["first", "second"])
+    recorded = [c[0] for c in outcomes.record.call_args_list]
+    assert recorded == [
+        ("first", "running"),
+        ("first", "succeeded"),
+        ("second", "running"),
+        ("second", "failed"),
+    ]
+
+
+def test_records_deferred_tasks(tasks, history):
+    outcomes = MagicMock()
+    window = MagicMock(deadline="06:00")
+    window.leaves_time_for.return_value = False
+
+    TaskRunner(history=history, backup_window=window, outcomes=outcomes).run(tasks)
+
+    recorded = [c[0] for c in outcomes.record.call_args_list]
+    assert recorded == [("first", "deferred"), ("second", "deferred")]
+
+
+def test_scan_is_committed_only_after_success(tasks):
+    prescan = MagicMock()
+
+    TaskRunner(prescan=prescan).run(tasks)
+
+    assert prescan.commit.call_args_list == [((tasks[0],),)]
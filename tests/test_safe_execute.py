@@ -49,3 +49,10 @@ def test_failure_sends_exactly_one_notification(failing_task, notify):
     failing_task.safe_execute()
 
     assert notify.task_failed.call_count == 1
+
+
+def test_failure_is_logged_with_traceback(failing_task, caplog):
+    failing_task.safe_execute()
+
+    assert caplog.records[-1].getMessage() == "Task failing failed"
+    assert caplog.records[-1].exc_info is not None
@@ -0,0 +1,116 @@
+import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.scheduling import BackupWindow, TaskOrdering
+
+NOW = datetime.datetime(2024, 1, 1, 22, 0)
+
+
+class FakeTask(object):
+    def __init__(self, name, priority=0):
+        self.name = name
+        self.priority = priority
+
+
+@pytest.fixture
+def history():
+    history = MagicMock()
+    history.estimate.side_effect = {"a": 10, "b": 300, "c": 60}.get
+    return history
+
+
+@pytest.fixture
+def tasks():
+    return [FakeTask("a"), FakeTask("new", 5), FakeTask("b", 1), FakeTask("c")]
+
+
+def ordered_names(policy, history, tasks):
+    return [t.name for t in TaskOrdering(policy, history).order(tasks)]
+
+
+@pytest.mark.parametrize(
+    "policy,reference",
+    [
+        ("file", ["a", "new", "b", "c"]),
+        ("longest-first", ["new", "b", "c", "a"]),
+        ("shortest-first", ["a", "c", "b", "new"]),
+        ("priority", ["new", "b", "a", "c"]),
+    ],
+)
+def test_order_policies(policy, reference, history, tasks):
+    assert ordered_names(policy, history, tasks) == reference
+
+
+def test_most_changed_first_uses_prescan(history, tasks):
+    changed = {"a": 10, "new": 100, "b": 500, "c": 0}
+
+    def scan(tasks):
+        for task in tasks:
+            task.scan = MagicMock(changed_bytes=changed[task.name])
+
+    prescan = MagicMock()
+    prescan.run.side_effect = scan
+
+    ordering = TaskOrdering("most-changed-first", history, prescan)
+
+    assert [t.name for t in ordering.order(tasks)] == ["b", "new", "a", "c"]
+
+
+def test_most_changed_first_requires_prescan(history):
+    with pytest.raises(ValueError, match="requires prescan"):
+        TaskOrdering("most-changed-first", history)
+
+
+def test_unknown_order_policy_raises(history):
+    with pytest.raises(ValueError, match="Unknown task order 'random'"):
+        TaskOrdering("random", history)
+
+
+def test_backup_window_ends_at_next_deadline():
+    assert BackupWindow("06:00", NOW).end == datetime.datetime(2024, 1, 2, 6, 0)
+    assert BackupWindow("23:30", NOW).end == datetime.datetime(2024, 1, 1, 23, 30)
+
+
+def test_backup_window_leaves_time_for_estimates():
+    window = BackupWindow("23:00", NOW)
+
+    assert window.leaves_time_for(3600, now=NOW)
+    assert not window.leaves_time_for(3000, offset=1200, now=NOW)
+    assert window.leaves_time_for(None, now=NOW)
+
+
+def test_backup_window_starts_window_length_before_deadline():
+    window = BackupWindow("06:00", NOW, length="8h")
+
+    assert window.start == datetime.datetime(2024, 1, 1, 22, 0)
+    assert window.contains(NOW)
+    assert not window.contains(NOW - datetime.timedelta(minutes=1))
+
+
+def test_run_after_deadline_is_outside_backup_window():
+    window = BackupWindow("21:00", NOW)
+
+    assert window.end == datetime.datetime(2024, 1, 2, 21, 0)
+    assert not window.contains(NOW)
+    assert not window.leaves_time_for(None, now=NOW)
+    assert not window.leaves_time_for(60, now=NOW)
+
+
+def test_backup_window_is_left_at_deadline():
+    window = BackupWindow("23:00", NOW)
+
+    assert not window.leaves_time_for(None, now=window.end)
+
+
+@pytest.mark.parametrize("length", ["0s", "25h", "long"])
+def test_invalid_backup_window_length_raises(length):
+    with pytest.raises(ValueError, match="Invalid"):
+        BackupWindow("06:00", NOW, length=length)
+
+
+@pytest.mark.parametrize("deadline", ["6", "24:00", "06:60", "morning"])
+def test_invalid_deadline_raises(deadline):
+    with pytest.raises(ValueError, match="Invalid deadline"):
+        BackupWindow(deadline, NOW)
@@ -0,0 +1,164 @@
+import os
+import subprocess
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.ssh import SshDestination, SshMultiplexer
+from auto_backup.structured_log import task_context
+
+
+@pytest.fixture
+def run_subprocess():
+    return MagicMock()
+
+
+@pytest.fixture
+def multiplexer(run_subprocess):
+    multiplexer = SshMultiplexer(run_subprocess=run_subprocess)
+    yield multiplexer
+    multiplexer.shutdown()
+
+
+def called_args(run_subprocess):
+    return [c[0][0] for c in run_subprocess.call_args_list]
+
+
+@pytest.mark.parametrize(
+    "url,reference",
+    [
+        ("ssh://user@host:2222/./repo", ["-p", "2222", "user@host"]),
+        ("ssh://host/repo", ["host"]),
+        ("user@host:repo", ["user@host"]),
+        ("host:/srv/repo", ["host"]),
+    ],
+)
+def test_destination_from_remote_url(url, reference):
+    assert SshDestination.from_repository_url(url).arguments() == reference
+
+
+@pytest.mark.parametrize("url", ["/local/repo", "relative/repo", "file:///repo"])
+def test_local_urls_have_no_destination(url):
+    assert SshDestination.from_repository_url(url) is None
+
+
+def test_local_repository_keeps_ssh_command(multiplexer, run_subprocess):
+    assert multiplexer.rsh_command("/local/repo", "my-ssh") == "my-ssh"
+    assert run_subprocess.call_count == 0
+
+
+def test_starts_master_once_per_host(multiplexer, run_subprocess):
+    multiplexer.rsh_command("ssh://user@host/repo1", None)
+    multiplexer.rsh_command("ssh://user@host/repo2", None)
+    multiplexer.rsh_command("ssh://user@other/repo", None)
+
+    masters = called_args(run_subprocess)
+    assert [args[-1] for args in masters] == ["user@host", "user@other"]
+    assert all("ControlMaster=yes" in args for args in masters)
+
+
+def test_master_persists_for_a_bounded_time(multiplexer, run_subprocess):
+    multiplexer.rsh_command("host:repo", None)
+
+    assert "ControlPersist=10m" in called_args(run_subprocess)[0]
+
+
+def test_setup_time_is_attributed_to_opening_task(multiplexer, caplog):
+    caplog.set_level("INFO")
+    task = MagicMock(tags=[])
+    task.__str__.return_value = "Backup documents"
+
+    with task_context(task):
+        multiplexer.rsh_command("host:repo", None)
+    multiplexer.rsh_command("host:other-repo", None)
+
+    setups = [r for r in caplog.records if getattr(r, "phase", None) == "ssh_setup"]
+    assert len(setups) == 1
+    assert setups[0].getMessage().endswith("by Backup documents")
+    assert setups[0].duration >= 0
+
+
+def start_in_thread(multiplexer, url):
+    thread = threading.Thread(target=multiplexer.rsh_command, args=(url, None))
+    thread.start()
+    return thread
+
+
+def test_slow_master_does_not_block_other_hosts(multiplexer, run_subprocess):
+    slow_started = threading.Event()
+    release_slow = threading.Event()
+
+    def start_master(args, **kwargs):
+        if args[-1] == "slow":
+            slow_started.set()
+            assert release_slow.wait(5)
+
+    run_subprocess.side_effect = start_master
+    slow = start_in_thread(multiplexer, "slow:repo")
+    try:
+        assert slow_started.wait(5)
+        fast = start_in_thread(multiplexer, "fast:repo")
+        fast.join(5)
+        assert not fast.is_alive()
+    finally:
+        release_slow.set()
+        slow.join(5)
+
+    assert [args[-1] for args in called_args(run_subprocess)] == ["slow", "fast"]
+
+
+def test_waiting_for_master_of_same_host_is_logged(multiplexer, run_subprocess, caplog):
+    caplog.set_level("INFO")
+    first_started = threading.Event()
+    release_first = threading.Event()
+
+    def start_master(args, **kwargs):
+        first_started.set()
+        assert release_first.wait(5)
+
+    run_subprocess.side_effect = start_master
+    first = start_in_thread(multiplexer, "host:repo1")
+    assert first_started.wait(5)
+    second = start_in_thread(multiplexer, "host:repo2")
+    threading.Timer(0.5, release_first.set).start()
+    first.join(5)
+    second.join(5)
+
+    waits = [r for r in caplog.records if getattr(r, "phase", None) == "ssh_wait"]
+    assert run_subprocess.call_count == 1
+    assert len(waits) == 1
+    assert waits[0].duration > 0
+
+
+def test_master_uses_configured_ssh_command(multiplexer, run_subprocess):
+    multiplexer.rsh_command("host:repo", "ssh -i /my/key")
+
+    assert called_args(run_subprocess)[0][:3] == ["ssh", "-i", "/my/key"]
+
+
+def test_rsh_command_uses_control_path(multiplexer):
+    rsh_command = multiplexer.rsh_command("host:repo", "ssh -i /my/key")
+
+    control_path = os.path.join(multiplexer.control_dir, "%C")
+    reference = f"ssh -i /my/key -o ControlPath={control_path} -o ControlMaster=no"
+    assert rsh_command == reference
+
+
+def test_failing_master_falls_back_to_plain_ssh(multiplexer, run_subprocess):
+    run_subprocess.side_effect = subprocess.CalledProcessError(255, "ssh")
+
+    assert multiplexer.rsh_command("host:repo", "my-ssh") == "my-ssh"
+    assert multiplexer.rsh_command("host:repo", "my-ssh") == "my-ssh"
+    assert run_subprocess.call_count == 1
+
+
+def test_shutdown_closes_masters_and_removes_control_dir(multiplexer, run_subprocess):
+    multiplexer.rsh_command("ssh://host:2222/repo", None)
+    control_dir = multiplexer.control_dir
+
+    multiplexer.shutdown()
+
+    exit_call = called_args(run_subprocess)[-1]
+    assert exit_call[-5:] == ["-O", "exit", "-p", "2222", "host"]
+    assert not os.path.exists(control_dir)
@@ -0,0 +1,39 @@
+import pytest
+
+from auto_backup.state import StateDirectory
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDirectory(str(tmp_path / "state"))
+
+
+def test_load_missing_file_returns_default(state):
+    assert state.load("missing.json", {"default": True}) == {"default": True}
+
+
+def test_saved_value_can_be_loaded(state):
+    state.save("nested/value.json", {"key": [1, 2]})
+
+    assert state.load("nested/value.json") == {"key": [1, 2]}
+
+
+def test_failed_write_keeps_previous_content(state):
+    state.save("value.json", "old")
+
+    with pytest.raises(RuntimeError):
+        with state.open_for_writing("value.json") as state_file:
+            state_file.write("partial")
+            raise RuntimeError()
+
+    assert state.load("value.json") == "old"
+
+
+def test_failed_write_leaves_no_temporary_files(state, tmp_path):
+    state.save("value.json", "old")
+
+    with pytest.raises(RuntimeError):
+        with state.open_for_writing("value.json"):
+            raise RuntimeError()
+
+    assert [p.name for p in (tmp_path / "state").iterdir()] == ["value.json"]
@@ -0,0 +1,66 @@
+import subprocess
+import sys
+
+import pytest
+
+from auto_backup.json_stream import JsonStreamReader
+from auto_backup.tasks import stream_checked_subprocess
+
+
+def python_call(code):
+    return (sys.executable, "-c", code)
+
+
+def test_yields_stdout_of_child_process():
+    with stream_checked_subprocess(python_call("print('streamed')")) as output:
+        assert output.read() == "streamed\n"
+
+
+def test_yields_stderr_while_stdout_goes_elsewhere(tmp_path):
+    code = "import sys; print('result'); print('progress', file=sys.stderr)"
+
+    with open(tmp_path / "stdout", "w") as stdout:
+        with stream_checked_subprocess(
+            python_call(code), stream="stderr", stdout=stdout
+        ) as output:
+            assert output.read() == "progress\n"
+
+    assert (tmp_path / "stdout").read_text() == "result\n"
+
+
+def test_non_zero_exit_status_raises():
+    with pytest.raises(subprocess.CalledProcessError):
+        with stream_checked_subprocess(python_call("raise SystemExit(3)")) as output:
+            output.read()
+
+
+def test_child_exceeding_timeout_is_killed():
+    call = python_call("import time; time.sleep(30)")
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        with stream_checked_subprocess(call, timeout=0.5) as output:
+            output.read()
+
+
+def test_failing_child_is_reported_instead_of_parse_error():
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        with stream_checked_subprocess(python_call("raise SystemExit(2)")) as output:
+            JsonStreamReader(output).read_object({})
+
+    assert error.value.returncode == 2
+    assert isinstance(error.value.__cause__, ValueError)
+
+
+def test_parse_error_of_successful_child_is_raised():
+    with pytest.raises(ValueError):
+        with stream_checked_subprocess(python_call("print('no json')")) as output:
+            JsonStreamReader(output).read_object({})
+
+
+def test_running_child_is_killed_when_reading_fails():
+    call = python_call("import time; print('x', flush=True); time.sleep(30)")
+
+    with pytest.raises(RuntimeError):
+        with stream_checked_subprocess(call) as output:
+            output.readline()
+            raise RuntimeError()
@@ -0,0 +1,122 @@
+import gzip
+import io
+import json
+import logging
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup.structured_log import (
+    JsonLinesFormatter,
+    RunContextFilter,
+    create_json_log_handler,
+    log_borg_json_output,
+    set_run_id,
+    task_context,
+)
+
+
+class FakeCommand(object):
+    pass
+
+
+@pytest.fixture
+def task():
+    task = MagicMock()
+    task.__str__.return_value = "Backup home"
+    task.command = FakeCommand()
+    task.tags = {"nightly", "home"}
+    return task
+
+
+def make_record(message="hello", **extra):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, message, (), None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def format_record(record):
+    RunContextFilter().filter(record)
+    return json.loads(JsonLinesFormatter().format(record))
+
+
+def test_formats_record_as_json_line():
+    entry = format_record(make_record(phase="end", duration=1.5, exit_code=0))
+
+    assert entry["message"] == "hello"
+    assert entry["level"] == "INFO"
+    assert (entry["phase"], entry["duration"], entry["exit_code"]) == ("end", 1.5, 0)
+
+
+def test_adds_run_id_and_task_context(task):
+    set_run_id("run-1")
+
+    with task_context(task):
+        entry = format_record(make_record())
+
+    assert entry["run_id"] == "run-1"
+    assert entry["task"] == "Backup home"
+    assert entry["type"] == "FakeCommand"
+    assert entry["tags"] == ["home", "nightly"]
+
+
+def test_task_context_ends_with_block(task):
+    with task_context(task):
+        pass
+
+    assert "task" not in format_record(make_record())
+
+
+def test_exception_is_included():
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logging.LogRecord(
+            "test",
+            logging.ERROR,
+            __file__,
+            1,
+            "failed",
+            (),
+            sys.exc_info(),
+        )
+
+    assert "RuntimeError: boom" in format_record(record)["exception"]
+
+
+def test_log_file_is_rotated_and_compressed(tmp_path):
+    path = tmp_path / "logs" / "run.jsonl"
+    handler = create_json_log_handler(str(path), max_bytes=200, backup_count=2)
+    test_logger = logging.getLogger("test_rotation")
+    test_logger.addHandler(handler)
+    try:
+        for number in range(10):
+            test_logger.warning("message %d", number)
+    finally:
+        test_logger.removeHandler(handler)
+        handler.close()
+
+    with gzip.open(str(path) + ".1.gz", "rt") as rotated:
+        assert json.loads(rotated.readline())["logger"] == "test_rotation"
+    assert not (tmp_path / "logs" / "run.jsonl.3.gz").exists()
+
+
+def test_borg_log_messages_are_logged(caplog):
+    caplog.set_level(logging.INFO)
+    output = "\n".join(
+        [
+            json.dumps(
+                {"type": "log_message", "levelname": "WARNING", "message": "skipped"}
+            ),
+            "not json",
+        ]
+    )
+
+    log_borg_json_output(io.StringIO(output))
+
+    warning, plain = caplog.records
+    assert (warning.levelname, warning.getMessage()) == ("WARNING", "skipped")
+    assert warning.borg["type"] == "log_message"
+    assert plain.getMessage() == "not json"
@@ -49,3 +49,21 @@ def test_key_in_task_config_but_not_in_section(merger, task_config):
     config = merger.merge_with_task_config("test-task", task_config)
 
     assert config["task-key-3"] == "task-value-3"
+
+
+def test_accumulated_keys_are_merged_without_duplicates(config):
+    config["test-task"]["excludes"] = ["*.tmp", "*.log"]
+    merger = TaskConfigMerger(config, accumulated_keys=("excludes",))
+
+    merged = merger.merge_with_task_config("test-task", {"excludes": ["*.log", "x"]})
+
+    assert merged["excludes"] == ["*.tmp", "*.log", "x"]
+
+
+def test_accumulated_keys_accept_single_values(config):
+    config["test-task"]["excludes"] = "*.tmp"
+    merger = TaskConfigMerger(config, accumulated_keys=("excludes",))
+
+    merged = merger.merge_with_task_config("test-task", {"excludes": "*.log"})
+
+    assert merged["excludes"] == ["*.tmp", "*.log"]
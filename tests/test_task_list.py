@@ -6,6 +6,10 @@ from auto_backup.config import TaskList
 
 
 class MockTask(str):
+    @property
+    def name(self):
+        return str(self)
+
     def is_active(self, tags):
         return self in tags
 
@@ -42,3 +46,23 @@ def test_filter_by_tags(task_list):
     task_list.filter_by_tags(["task-1"])
 
     assert list(task_list) == ["task-1"]
+
+
+def test_select_by_names(task_list):
+    task_list.select_by_names(["task-2", "task-3"])
+
+    assert list(task_list) == ["task-2"]
+
+
+def test_combine_tasks_after_filtering(task_list):
+    task_list.filter_by_tags(["task-1", "task-2"])
+    task_list.combine_tasks_with(lambda tasks: ["+".join(tasks)])
+
+    assert list(task_list) == ["task-1+task-2"]
+
+
+def test_order_tasks_after_combining(task_list):
+    task_list.combine_tasks_with(lambda tasks: ["+".join(tasks)] + ["task-0"])
+    task_list.order_tasks_with(sorted)
+
+    assert list(task_list) == ["task-0", "task-1+task-2"]
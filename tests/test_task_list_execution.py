@@ -2,7 +2,7 @@ from unittest.mock import MagicMock, call
 
 import pytest
 
-from auto_backup import execute_tasks
+from auto_backup import execute_tasks, plan_tasks
 
 
 @pytest.fixture
@@ -43,3 +43,41 @@ def test_calls_filter_if_tags_given(task_list):
     execute_tasks(task_list, tags)
 
     assert task_list.filter_by_tags.call_args == call(tags)
+
+
+def test_cache_prewarm_starts_before_tasks_and_is_shut_down(task_list, empty_tags):
+    prewarmer = MagicMock()
+    tasks = list(task_list)
+
+    execute_tasks(task_list, empty_tags, prewarmer)
+
+    assert prewarmer.start.call_args == call(tasks)
+    assert prewarmer.shutdown.call_count == 1
+
+
+def test_uses_given_runner(task_list, empty_tags):
+    runner = MagicMock()
+
+    execute_tasks(task_list, empty_tags, runner=runner)
+
+    assert runner.run.call_args == call(list(task_list))
+
+
+def test_prescan_runs_before_tasks(task_list, empty_tags):
+    manager = MagicMock()
+
+    execute_tasks(task_list, empty_tags, runner=manager.runner, prescan=manager.prescan)
+
+    tasks = list(task_list)
+    calls = [c for c in manager.mock_calls if c[0].endswith(".run")]
+    assert calls == [call.prescan.run(tasks), call.runner.run(tasks)]
+
+
+def test_plan_does_not_execute_tasks(task_list, empty_tags, capsys):
+    history = MagicMock()
+    history.estimate.return_value = None
+
+    plan_tasks(task_list, empty_tags, history)
+
+    assert get_execute_counts(task_list) == [0, 0]
+    assert "Estimated total" in capsys.readouterr().out
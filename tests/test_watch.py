@@ -0,0 +1,237 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from auto_backup import _run_watched_tasks, watch_tasks
+from auto_backup.watch import ChangeWatcher, DebouncedTrigger, Inotify, _load_libc
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeInotify(object):
+    def __init__(self, clock):
+        self.clock = clock
+        self.watched = []
+        self.changes = []
+
+    def add_tree(self, root):
+        self.watched.append(root)
+
+    def read_changed_paths(self, timeout):
+        self.clock.now += timeout
+        changes, self.changes = self.changes, []
+        return changes
+
+    def close(self):
+        pass
+
+
+def make_command(source, excludes=(), markers=()):
+    command = MagicMock(source=source, exclude_if_present=list(markers))
+    command.exclude_patterns.return_value = list(excludes)
+    return command
+
+
+def make_task(*sources):
+    task = MagicMock()
+    task.command.commands = [make_command(source) for source in sources]
+    return task
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def inotify(clock):
+    return FakeInotify(clock)
+
+
+@pytest.fixture
+def tasks():
+    return [make_task("/data/docs"), make_task("/data/photos", "/data/music")]
+
+
+@pytest.fixture
+def watcher(tasks, inotify, clock):
+    return ChangeWatcher(tasks, 10, 300, lambda: inotify, clock)
+
+
+def test_trigger_waits_for_quiet_period():
+    trigger = DebouncedTrigger(debounce=10, min_interval=0)
+    trigger.record("task", 100)
+    trigger.record("task", 105)
+
+    assert trigger.due(114) == []
+    assert trigger.due(115) == ["task"]
+
+
+def test_trigger_respects_minimum_interval_between_runs():
+    trigger = DebouncedTrigger(debounce=10, min_interval=300)
+    trigger.mark_run(["task"], 100)
+    trigger.record("task", 120)
+
+    assert trigger.due(350) == []
+    assert trigger.seconds_until_due(350) == 50
+    assert trigger.due(400) == ["task"]
+
+
+def test_trigger_without_events_has_nothing_due():
+    trigger = DebouncedTrigger(debounce=10, min_interval=300)
+
+    assert trigger.seconds_until_due(0) is None
+
+
+def test_watches_all_sources(watcher, inotify):
+    assert sorted(inotify.watched) == ["/data/docs", "/data/music", "/data/photos"]
+
+
+def test_burst_of_changes_triggers_task_once(watcher, inotify, tasks):
+    inotify.changes = ["/data/music/a", "/data/photos/b", "/data/photos/c"]
+
+    assert next(watcher.batches()) == [tasks[1]]
+
+
+def test_changes_outside_sources_are_ignored(watcher, inotify, tasks):
+    inotify.changes = ["/data/docs-old/a", "/data/docs/b"]
+
+    assert next(watcher.batches()) == [tasks[0]]
+
+
+def test_changes_to_excluded_paths_are_ignored(inotify, clock):
+    task = MagicMock()
+    task.command.commands = [make_command("/data/docs", ["*.tmp", "sh:**/cache"])]
+    watcher = ChangeWatcher([task], 10, 300, lambda: inotify, clock)
+    inotify.changes = ["/data/docs/a.tmp", "/data/docs/x/cache/b"]
+    watcher._wait_for_changes()
+
+    assert watcher.trigger.last_event == {}
+    inotify.changes = ["/data/docs/a.txt"]
+
+    assert next(watcher.batches()) == [task]
+
+
+def test_changes_below_marker_directories_are_ignored(inotify, clock, tmp_path):
+    (tmp_path / "skip" / "sub").mkdir(parents=True)
+    (tmp_path / "skip" / "CACHEDIR.TAG").write_text("")
+    task = MagicMock()
+    task.command.commands = [make_command(str(tmp_path), markers=["CACHEDIR.TAG"])]
+    watcher = ChangeWatcher([task], 10, 300, lambda: inotify, clock)
+    inotify.changes = [str(tmp_path / "skip" / "sub" / "file")]
+    watcher._wait_for_changes()
+
+    assert watcher.trigger.last_event == {}
+    inotify.changes = [str(tmp_path / "file")]
+
+    assert next(watcher.batches()) == [task]
+
+
+def test_queue_overflow_triggers_all_tasks(watcher, inotify, tasks):
+    inotify.changes = [None]
+
+    assert next(watcher.batches()) == tasks
+
+
+def test_run_tasks_are_not_triggered_again_without_changes(watcher, inotify, tasks):
+    inotify.changes = ["/data/docs/a"]
+    batches = watcher.batches()
+    watcher.mark_run(next(batches))
+    inotify.changes = ["/data/music/a"]
+
+    assert next(batches) == [tasks[1]]
+
+
+def test_watch_requires_watched_tasks():
+    setup = MagicMock()
+    setup.task_list = [MagicMock(watch=False)]
+
+    with pytest.raises(ValueError):
+        watch_tasks(setup, [])
+
+
+def test_batch_is_postponed_while_run_lock_is_held(watcher, clock, tasks):
+    setup = MagicMock()
+    setup.create_run_lock.return_value.acquire.return_value = False
+
+    _run_watched_tasks(setup, [], watcher, tasks[:1])
+
+    setup.create_task_runner.assert_not_called()
+    assert watcher.trigger.due(clock.now + 10) == tasks[:1]
+
+
+def test_batch_runs_under_run_lock(watcher, tasks):
+    setup = MagicMock()
+
+    _run_watched_tasks(setup, [], watcher, tasks[:1])
+
+    setup.create_task_runner.return_value.run.assert_called_once_with(tasks[:1])
+    setup.create_run_lock.return_value.release.assert_called_once()
+
+
+def test_deferred_tasks_are_retried_after_minimum_interval(watcher, clock, tasks):
+    setup = MagicMock()
+    setup.create_task_runner.return_value.run.return_value = [0, None]
+    for task in tasks:
+        watcher.trigger.record(task, clock.now)
+
+    _run_watched_tasks(setup, [], watcher, tasks)
+
+    assert watcher.trigger.due(clock.now + 10) == []
+    assert watcher.trigger.due(clock.now + 300) == tasks[1:]
+
+
+@pytest.mark.skipif(_load_libc() is None, reason="inotify is not available")
+def test_inotify_reports_changes_in_new_directories(tmp_path):
+    inotify = Inotify()
+    try:
+        inotify.add_tree(str(tmp_path))
+        os.mkdir(tmp_path / "new")
+        inotify.read_changed_paths(1)
+        (tmp_path / "new" / "file").write_text("content")
+
+        changed = inotify.read_changed_paths(1)
+    finally:
+        inotify.close()
+
+    assert str(tmp_path / "new" / "file") in changed
+
+
+@pytest.mark.skipif(_load_libc() is None, reason="inotify is not available")
+def test_inotify_watches_directories_moved_into_tree(tmp_path):
+    (tmp_path / "watched").mkdir()
+    (tmp_path / "outside" / "sub").mkdir(parents=True)
+    inotify = Inotify()
+    try:
+        inotify.add_tree(str(tmp_path / "watched"))
+        os.rename(tmp_path / "outside", tmp_path / "watched" / "moved")
+        inotify.read_changed_paths(1)
+        (tmp_path / "watched" / "moved" / "sub" / "file").write_text("content")
+
+        changed = inotify.read_changed_paths(1)
+    finally:
+        inotify.close()
+
+    assert str(tmp_path / "watched" / "moved" / "sub" / "file") in changed
+
+
+@pytest.mark.skipif(_load_libc() is None, reason="inotify is not available")
+def test_inotify_forgets_watches_of_deleted_directories(tmp_path):
+    (tmp_path / "gone").mkdir()
+    inotify = Inotify()
+    try:
+        inotify.add_tree(str(tmp_path))
+        os.rmdir(tmp_path / "gone")
+
+        inotify.read_changed_paths(1)
+    finally:
+        inotify.close()
+
+    assert list(inotify.paths.values()) == [str(tmp_path)]